@@ -0,0 +1,490 @@
+import gzip
+import os
+import shutil
+import string
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from disponibilidad import IndiceDisponibilidad
+import metricas
+
+try:
+    import fcntl
+
+    def _bloquear(archivo):
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+
+    def _intentar_bloquear(archivo):
+        try:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+except ImportError:
+    import msvcrt
+
+    def _bloquear(archivo):
+        archivo.seek(0)
+        msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _intentar_bloquear(archivo):
+        archivo.seek(0)
+        try:
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+RAIZ = os.getenv("ALMACEN_RAIZ", "uploads/documentos")
+# Nivel frío: documentos antiguos que movió el archivador (archivado.py), con gzip si así
+# ocupan menos. Puede estar en un disco más lento y barato.
+RAIZ_FRIO = os.getenv("ALMACEN_FRIO_RAIZ", "uploads/archivo")
+NIVEL_COMPRESION = int(os.getenv("ALMACEN_FRIO_NIVEL", "6"))  # 0: sin comprimir
+# Copias descomprimidas de documentos fríos que se consultaron, en el disco rápido
+RESTAURADOS_MAX = int(os.getenv("ALMACEN_RESTAURADOS_MAX", str(2 * 1024 ** 3)))  # bytes
+DIRECTORIO_RESTAURADOS = "restaurados"
+
+lecturas = metricas.Contador(
+    "sea_almacen_lecturas_total",
+    "Documentos servidos por nivel: caliente, restaurado (copia ya descomprimida) o frio (hubo que restaurarlo)",
+    ("nivel",),
+)
+
+def _es_sha256(texto):
+    return len(texto) == 64 and all(c in string.hexdigits for c in texto)
+
+def _eliminar(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+# Interfaz de almacenamiento de documentos; las rutas que se guardan en
+# sea.Documentos.RutaArchivo son las que devuelve guardar()
+class Almacen:
+    # Mueve un archivo temporal ya escrito al almacén y devuelve su ruta definitiva
+    def guardar(self, temporal, sha256, extension):
+        raise NotImplementedError
+
+    # Quita una referencia al documento; se elimina cuando no queda ninguna
+    def liberar(self, ruta):
+        raise NotImplementedError
+
+    # Ruta en disco del documento o None si no existe
+    def resolver(self, ruta):
+        raise NotImplementedError
+
+    def existe(self, ruta):
+        return self.resolver(ruta) is not None
+
+    # Directorio para archivos temporales (en el mismo disco para poder renombrar)
+    def directorio_temporal(self):
+        raise NotImplementedError
+
+# Copias restauradas de documentos fríos, limitadas a un total de bytes: al pasarse se
+# eliminan las usadas hace más tiempo. Cada worker lleva la cuenta de lo que ve en el
+# directorio; una copia que restauró otro worker se adopta al encontrarla.
+class CacheRestaurados:
+    def __init__(self, directorio, maximo=RESTAURADOS_MAX):
+        self.directorio = directorio
+        self.maximo = maximo
+        self._archivos = None  # ruta -> tamaño, del menos al más usado
+        self._total = 0
+        self._candado = threading.Lock()
+        self._restaurando = {}  # ruta -> candado, para restaurar cada documento una sola vez
+        self.descartados = 0
+
+    def _cargar(self):
+        # Al primer uso: las copias que quedaron de ejecuciones anteriores, por antigüedad
+        encontrados = []
+        if os.path.isdir(self.directorio):
+            with os.scandir(self.directorio) as entradas:
+                for entrada in entradas:
+                    if entrada.is_file() and not entrada.name.endswith(".part"):
+                        estado = entrada.stat()
+                        encontrados.append((estado.st_mtime, entrada.path, estado.st_size))
+        self._archivos = OrderedDict((ruta, tamano) for _, ruta, tamano in sorted(encontrados))
+        self._total = sum(self._archivos.values())
+
+    def ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def buscar(self, ruta):
+        with self._candado:
+            if self._archivos is None:
+                self._cargar()
+            if not os.path.isfile(ruta):
+                if ruta in self._archivos:
+                    self._total -= self._archivos.pop(ruta)
+                return False
+            if ruta in self._archivos:
+                self._archivos.move_to_end(ruta)
+                return True
+        self.agregar(ruta, os.path.getsize(ruta))
+        return True
+
+    def agregar(self, ruta, tamano):
+        with self._candado:
+            if self._archivos is None:
+                self._cargar()
+            self._total += tamano - self._archivos.pop(ruta, 0)
+            self._archivos[ruta] = tamano
+            while self._total > self.maximo and len(self._archivos) > 1:
+                antigua, tamano_antigua = self._archivos.popitem(last=False)
+                self._total -= tamano_antigua
+                self.descartados += 1
+                # En Linux una descarga en curso sigue leyendo el archivo ya eliminado
+                try:
+                    os.remove(antigua)
+                except OSError:
+                    pass
+
+    def quitar(self, ruta):
+        with self._candado:
+            if self._archivos is not None and ruta in self._archivos:
+                self._total -= self._archivos.pop(ruta)
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    @contextmanager
+    def restaurando(self, ruta):
+        with self._candado:
+            candado = self._restaurando.setdefault(ruta, threading.Lock())
+        with candado:
+            yield
+        with self._candado:
+            if self._restaurando.get(ruta) is candado and not candado.locked():
+                del self._restaurando[ruta]
+
+    def estadisticas(self):
+        with self._candado:
+            return {
+                "archivos": len(self._archivos) if self._archivos is not None else None,
+                "bytes": self._total,
+                "maximo": self.maximo,
+                "descartados": self.descartados,
+            }
+
+# Almacén local direccionado por contenido: cada documento se guarda una sola vez con su
+# SHA-256 como nombre en subdirectorios ab/cd/, y un archivo .refs lleva la cuenta de
+# referencias. El .refs también sirve de candado entre procesos (varios workers).
+# Los documentos archivados pasan a la misma estructura bajo raiz_frio (con .gz si se
+# comprimieron) y se sirven desde una copia restaurada en raiz/restaurados. Los anteriores
+# al almacén por contenido (nombre UUID, sin .refs) también se archivan, sin referencias.
+class AlmacenLocal(Almacen):
+    def __init__(self, raiz=RAIZ, raiz_frio=RAIZ_FRIO):
+        self.raiz = raiz
+        self.raiz_frio = raiz_frio
+        # Reentrante: archivar() ajusta las referencias frías dentro del ajuste de las calientes
+        self._candado = threading.RLock()
+        self.disponibles = IndiceDisponibilidad(raiz, ignorar=("tmp", DIRECTORIO_RESTAURADOS))
+        self.disponibles_frio = IndiceDisponibilidad(raiz_frio)
+        self.restaurados = CacheRestaurados(os.path.join(raiz, DIRECTORIO_RESTAURADOS))
+
+    def ruta_contenido(self, sha256, extension):
+        return os.path.join(self.raiz, sha256[:2], sha256[2:4], f"{sha256}{extension.lower()}")
+
+    def ruta_fria(self, nombre, comprimido):
+        return os.path.join(self.raiz_frio, nombre[:2], nombre[2:4], f"{nombre}.gz" if comprimido else nombre)
+
+    def es_fria(self, ruta):
+        raiz = os.path.normcase(os.path.abspath(self.raiz_frio))
+        try:
+            return os.path.commonpath([raiz, os.path.normcase(os.path.abspath(ruta))]) == raiz
+        except ValueError:
+            return False
+
+    # Versión archivada de una ruta del nivel caliente, si existe. Sirve cuando la ruta viene
+    # de antes del archivado (cache de metadatos de otro worker, o un alumno que se estaba
+    # registrando mientras se archivaba el mismo contenido). Los nombres UUID también son
+    # únicos, así que la contraparte es el mismo documento.
+    def _contraparte_fria(self, ruta):
+        nombre = os.path.basename(ruta)
+        for comprimido in (True, False):
+            fria = self.ruta_fria(nombre, comprimido)
+            if self.disponibles_frio.contiene(fria):
+                return fria
+        return None
+
+    def directorio_temporal(self):
+        directorio = os.path.join(self.raiz, "tmp")
+        os.makedirs(directorio, exist_ok=True)
+        return directorio
+
+    def _ajustar_referencias(self, ruta, accion):
+        with self._candado, open(f"{ruta}.refs", "a+b") as refs:
+            _bloquear(refs)
+            refs.seek(0)
+            contenido = refs.read().strip()
+            cuenta = int(contenido) if contenido else 0
+            cuenta = accion(cuenta)
+            refs.seek(0)
+            refs.truncate()
+            refs.write(str(cuenta).encode())
+            refs.flush()
+            return cuenta
+
+    def guardar(self, temporal, sha256, extension):
+        ruta = self.ruta_contenido(sha256, extension)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+        def agregar(cuenta):
+            if os.path.exists(ruta):
+                # Ya teníamos este contenido: se descarta la copia nueva
+                os.remove(temporal)
+            else:
+                os.replace(temporal, ruta)
+            return max(cuenta, 0) + 1
+
+        self._ajustar_referencias(ruta, agregar)
+        self.disponibles.marcar(ruta)
+        return ruta
+
+    def liberar(self, ruta):
+        fria = self.es_fria(ruta)
+        if not fria and not os.path.exists(ruta):
+            # Ruta anterior al archivado: la referencia ahora está en el nivel frío
+            contraparte = self._contraparte_fria(ruta)
+            if contraparte:
+                return self.liberar(contraparte)
+
+        indice = self.disponibles_frio if fria else self.disponibles
+        if not os.path.exists(f"{ruta}.refs"):
+            # Documentos anteriores al almacén por contenido (nombre UUID, sin referencias)
+            with self._candado:
+                _eliminar(ruta)
+            indice.desmarcar(ruta)
+            if fria:
+                self.restaurados.quitar(self.restaurados.ruta(self._nombre_restaurado(ruta)))
+            return
+
+        def quitar(cuenta):
+            cuenta -= 1
+            if cuenta <= 0 and os.path.exists(ruta):
+                os.remove(ruta)
+            return max(cuenta, 0)
+
+        if self._ajustar_referencias(ruta, quitar) == 0:
+            indice.desmarcar(ruta)
+            if fria:
+                self.restaurados.quitar(self.restaurados.ruta(self._nombre_restaurado(ruta)))
+
+    def _nombre_restaurado(self, ruta_fria):
+        nombre = os.path.basename(ruta_fria)
+        return nombre[:-3] if nombre.endswith(".gz") else nombre
+
+    # Copia descomprimida de un documento frío (se restaura una sola vez aunque lleguen
+    # varias peticiones a la vez)
+    def _restaurar(self, ruta_fria):
+        destino = self.restaurados.ruta(self._nombre_restaurado(ruta_fria))
+        if self.restaurados.buscar(destino):
+            lecturas.incrementar(nivel="restaurado")
+            return destino
+
+        with self.restaurados.restaurando(destino):
+            if self.restaurados.buscar(destino):
+                lecturas.incrementar(nivel="restaurado")
+                return destino
+            if not os.path.isfile(ruta_fria):
+                return None
+
+            with metricas.etapa("restaurar_archivo"):
+                os.makedirs(self.restaurados.directorio, exist_ok=True)
+                temporal = os.path.join(self.directorio_temporal(), f"{uuid.uuid4()}.part")
+                abrir = gzip.open if ruta_fria.endswith(".gz") else open
+                try:
+                    with abrir(ruta_fria, "rb") as origen, open(temporal, "wb") as copia:
+                        shutil.copyfileobj(origen, copia, 1024 * 1024)
+                    os.replace(temporal, destino)
+                except BaseException:
+                    _eliminar(temporal)
+                    raise
+            self.restaurados.agregar(destino, os.path.getsize(destino))
+
+        lecturas.incrementar(nivel="frio")
+        return destino
+
+    def resolver(self, ruta):
+        if not ruta:
+            return None
+        if self.es_fria(ruta):
+            return self._restaurar(ruta)
+        if os.path.isfile(ruta):
+            lecturas.incrementar(nivel="caliente")
+            return ruta
+        contraparte = self._contraparte_fria(ruta)
+        return self._restaurar(contraparte) if contraparte else None
+
+    # Se responde desde los índices en memoria, sin ir al disco
+    def existe(self, ruta):
+        if not ruta:
+            return False
+        if self.es_fria(ruta):
+            return self.disponibles_frio.contiene(ruta)
+        return self.disponibles.contiene(ruta) or self._contraparte_fria(ruta) is not None
+
+    # Documentos del nivel caliente sin subidas ni referencias nuevas desde hace más de
+    # `antiguedad` segundos. Los anteriores al almacén por contenido (nombre UUID) cuentan
+    # desde que se subieron.
+    def antiguos(self, antiguedad, limite):
+        hasta = time.time() - antiguedad
+        encontrados = []
+        for directorio, subdirectorios, archivos in os.walk(self.raiz):
+            subdirectorios[:] = [d for d in subdirectorios if d not in ("tmp", DIRECTORIO_RESTAURADOS)]
+            for nombre in archivos:
+                if nombre.endswith((".refs", ".part")):
+                    continue
+                ruta = os.path.join(directorio, nombre)
+                try:
+                    modificado = os.path.getmtime(ruta)
+                    if _es_sha256(nombre.split(".")[0]):
+                        modificado = max(modificado, os.path.getmtime(f"{ruta}.refs"))
+                except OSError:
+                    continue
+                if modificado < hasta:
+                    encontrados.append(ruta)
+                    if len(encontrados) >= limite:
+                        return encontrados
+        return encontrados
+
+    # Copia un documento en un temporal del nivel frío y devuelve (temporal, comprimido). Si
+    # gzip no ahorra al menos un 5 % (PDF ya comprimidos) se guarda tal cual.
+    def _copia_fria(self, ruta, tamano):
+        directorio_temporal = os.path.join(self.raiz_frio, "tmp")
+        os.makedirs(directorio_temporal, exist_ok=True)
+        temporal = os.path.join(directorio_temporal, f"{uuid.uuid4()}.part")
+        comprimido = False
+        try:
+            if NIVEL_COMPRESION > 0:
+                with open(ruta, "rb") as origen, gzip.open(temporal, "wb", compresslevel=NIVEL_COMPRESION) as destino:
+                    shutil.copyfileobj(origen, destino, 1024 * 1024)
+                comprimido = os.path.getsize(temporal) < tamano * 0.95
+            if not comprimido:
+                shutil.copyfile(ruta, temporal)
+            with open(temporal, "rb+") as copia:
+                os.fsync(copia.fileno())
+        except BaseException:
+            _eliminar(temporal)
+            raise
+        return temporal, comprimido
+
+    # Mueve un documento al nivel frío. actualizar(anterior, nueva) cambia RutaArchivo en la
+    # base de datos; si falla, las referencias vuelven al nivel caliente y se propaga el error.
+    # Devuelve (nueva ruta, bytes en caliente, bytes en frío) o None si ya no tenía referencias.
+    def archivar(self, ruta, actualizar):
+        if not _es_sha256(os.path.basename(ruta).split(".")[0]):
+            return self._archivar_unico(ruta, actualizar)
+        tamano = os.path.getsize(ruta)
+
+        # 1. Copia en el nivel frío, sin candados (el contenido no cambia)
+        temporal, comprimido = self._copia_fria(ruta, tamano)
+        nueva = self.ruta_fria(os.path.basename(ruta), comprimido)
+        os.makedirs(os.path.dirname(nueva), exist_ok=True)
+
+        # 2. Las referencias pasan al nivel frío; el archivo caliente se queda (con 0
+        # referencias) hasta que la base de datos apunte a la nueva ruta
+        transferidas = 0
+
+        def transferir(cuenta):
+            nonlocal transferidas
+            if cuenta <= 0 or not os.path.exists(ruta):
+                return cuenta
+
+            def agregar(cuenta_fria):
+                if os.path.exists(nueva):
+                    os.remove(temporal)
+                else:
+                    os.replace(temporal, nueva)
+                return max(cuenta_fria, 0) + cuenta
+
+            self._ajustar_referencias(nueva, agregar)
+            transferidas = cuenta
+            return 0
+
+        try:
+            self._ajustar_referencias(ruta, transferir)
+        finally:
+            _eliminar(temporal)
+        if not transferidas:
+            return None
+        self.disponibles_frio.marcar(nueva)
+
+        # 3. Base de datos, fuera de los candados
+        try:
+            actualizar(ruta, nueva)
+        except BaseException:
+            def devolver_fria(cuenta_fria):
+                cuenta_fria -= transferidas
+                if cuenta_fria <= 0 and os.path.exists(nueva):
+                    os.remove(nueva)
+                return max(cuenta_fria, 0)
+
+            self._ajustar_referencias(ruta, lambda cuenta: cuenta + transferidas)
+            if self._ajustar_referencias(nueva, devolver_fria) == 0:
+                self.disponibles_frio.desmarcar(nueva)
+            raise
+
+        # 4. Se elimina la copia caliente si nadie volvió a subir el mismo contenido mientras
+        # tanto (en ese caso se queda, con sus propias referencias). El .refs en 0 se deja:
+        # otro proceso puede estar esperando su candado.
+        eliminado = False
+
+        def eliminar_caliente(cuenta):
+            nonlocal eliminado
+            if cuenta <= 0 and os.path.exists(ruta):
+                os.remove(ruta)
+                eliminado = True
+            return cuenta
+
+        self._ajustar_referencias(ruta, eliminar_caliente)
+        if eliminado:
+            self.disponibles.desmarcar(ruta)
+        return nueva, tamano, os.path.getsize(nueva)
+
+    # Documento anterior al almacén por contenido (nombre UUID): su ruta es de una sola fila,
+    # así que no hay referencias que pasar. Si se liberó mientras se copiaba, no se mueve.
+    def _archivar_unico(self, ruta, actualizar):
+        tamano = os.path.getsize(ruta)
+        temporal, comprimido = self._copia_fria(ruta, tamano)
+        nueva = self.ruta_fria(os.path.basename(ruta), comprimido)
+        os.makedirs(os.path.dirname(nueva), exist_ok=True)
+        with self._candado:
+            if not os.path.exists(ruta):
+                _eliminar(temporal)
+                return None
+            os.replace(temporal, nueva)
+        self.disponibles_frio.marcar(nueva)
+
+        try:
+            actualizar(ruta, nueva)
+        except BaseException:
+            _eliminar(nueva)
+            self.disponibles_frio.desmarcar(nueva)
+            raise
+
+        with self._candado:
+            _eliminar(ruta)
+        self.disponibles.desmarcar(ruta)
+        return nueva, tamano, os.path.getsize(nueva)
+
+    # Candado entre procesos para que un solo worker archive a la vez; produce False si ya
+    # hay otro archivando
+    @contextmanager
+    def turno_archivador(self):
+        directorio = os.path.join(self.raiz_frio, "tmp")
+        os.makedirs(directorio, exist_ok=True)
+        with open(os.path.join(directorio, "archivador.lock"), "a+b") as candado:
+            yield _intentar_bloquear(candado)
+
+    def estadisticas_frio(self):
+        return {
+            "indice": self.disponibles_frio.estadisticas(),
+            "restaurados": self.restaurados.estadisticas(),
+            "compresion": NIVEL_COMPRESION,
+        }
+
+almacen = AlmacenLocal()
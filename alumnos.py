@@ -0,0 +1,176 @@
+import logging
+import os
+from cache import CacheTTL
+from db import conexion_lectura
+import metricas
+import resultados
+
+log = logging.getLogger(__name__)
+
+try:
+    import redis
+    ErrorRedis = redis.RedisError
+except ImportError:
+    redis = None
+    # Sin el paquete, solo un cliente simulado puede lanzarla (benchmarks/redis_simulado.py)
+    class ErrorRedis(Exception):
+        pass
+
+# Cache de lectura de alumnos para /alumnos/{matricula}, /alumnos/curp/{curp} y
+# /alumnos/matricula/{matricula}: guarda el JSON ya codificado de la fila durante un TTL
+# corto. Insertar, actualizar e importar alumnos invalidan sus entradas por Id, CURP y
+# matrícula. Con ALUMNOS_REDIS_URL el cache vive en Redis y lo comparten todos los
+# workers (una escritura en uno invalida para todos); sin ella, cada proceso tiene el suyo.
+# No se guardan los "no encontrado", para que un alumno recién registrado aparezca de inmediato.
+TTL = float(os.getenv("ALUMNOS_TTL", "30"))
+MAXIMO = int(os.getenv("ALUMNOS_MAX", "5000"))
+REDIS_URL = os.getenv("ALUMNOS_REDIS_URL")
+
+# Id, CURP y matrícula de una fila, para invalidar todas las búsquedas que la devolvieron
+def identidad(id_alumno=None, curp=None, matricula=None):
+    return frozenset(
+        (campo, str(valor).strip().lower())
+        for campo, valor in (("id", id_alumno), ("curp", curp), ("matricula", matricula))
+        if valor is not None and str(valor).strip()
+    )
+
+def _identidad_fila(fila):
+    campos = {columna.lower(): valor for columna, valor in fila.items()}
+    return identidad(campos.get("id", campos.get("idalumno")), campos.get("curp"), campos.get("matricula"))
+
+# Cache por proceso: las entradas son (identidad, JSON)
+class CacheLocal:
+    def __init__(self, ttl, maximo):
+        self.cache = CacheTTL(ttl=ttl, maximo=maximo, nombre="alumnos")
+
+    def buscar(self, clave):
+        encontrado, entrada = self.cache.buscar(clave)
+        return encontrado, entrada[1] if encontrado else None
+
+    def guardar(self, clave, identidad_fila, cuerpo):
+        self.cache.guardar(clave, (identidad_fila, cuerpo))
+
+    def invalidar(self, identidad_alumno):
+        self.cache.invalidar_si(lambda entrada: not entrada[0].isdisjoint(identidad_alumno))
+
+    def estadisticas(self):
+        return dict(self.cache.estadisticas(), backend="local")
+
+# Cache compartido en Redis. Cada Id/CURP/matrícula tiene un conjunto con las claves de las
+# búsquedas que devolvieron a ese alumno, para invalidarlas juntas. Si Redis no responde
+# se consulta la base de datos como en un fallo.
+class CacheRedis:
+    def __init__(self, cliente, ttl, prefijo="sea:alumnos:"):
+        self.cliente = cliente
+        self.ttl = ttl
+        self.prefijo = prefijo
+        self.aciertos = 0
+        self.fallos = 0
+        self.errores = 0
+        metricas.registrar_cache("alumnos", self)
+
+    def _indice(self, campo, valor):
+        return f"{self.prefijo}indice:{campo}:{valor}"
+
+    def _error(self, operacion, error):
+        self.errores += 1
+        log.warning("Cache de alumnos en Redis no disponible (%s): %s", operacion, error)
+
+    def buscar(self, clave):
+        try:
+            cuerpo = self.cliente.get(self.prefijo + clave)
+        except ErrorRedis as e:
+            self._error("buscar", e)
+            cuerpo = None
+        if cuerpo is None:
+            self.fallos += 1
+            return False, None
+        self.aciertos += 1
+        return True, cuerpo
+
+    def guardar(self, clave, identidad_fila, cuerpo):
+        try:
+            tuberia = self.cliente.pipeline()
+            tuberia.set(self.prefijo + clave, cuerpo, ex=max(int(self.ttl), 1))
+            for campo, valor in identidad_fila:
+                indice = self._indice(campo, valor)
+                tuberia.sadd(indice, clave)
+                tuberia.expire(indice, max(int(self.ttl), 1))
+            tuberia.execute()
+        except ErrorRedis as e:
+            self._error("guardar", e)
+
+    def invalidar(self, identidad_alumno):
+        indices = [self._indice(campo, valor) for campo, valor in identidad_alumno]
+        if not indices:
+            return
+        try:
+            claves = set()
+            for indice in indices:
+                claves.update(self.cliente.smembers(indice))
+            claves = [self.prefijo + (clave.decode() if isinstance(clave, bytes) else clave) for clave in claves]
+            self.cliente.delete(*claves, *indices)
+        except ErrorRedis as e:
+            self._error("invalidar", e)
+
+    def estadisticas(self):
+        return {"backend": "redis", "ttl": self.ttl, "aciertos": self.aciertos,
+                "fallos": self.fallos, "errores": self.errores}
+
+def _crear_cache():
+    if REDIS_URL:
+        if redis is not None:
+            return CacheRedis(redis.Redis.from_url(REDIS_URL), TTL)
+        log.warning("ALUMNOS_REDIS_URL está definida pero el paquete redis no está instalado; se usa el cache local")
+    return CacheLocal(TTL, MAXIMO)
+
+cache_alumnos = _crear_cache()
+
+# Ejecuta el procedimiento (en caso de fallo del cache) y devuelve el JSON de la fila o None
+def _consultar(clave, procedimiento, sql, *parametros):
+    encontrado, cuerpo = cache_alumnos.buscar(clave)
+    if encontrado:
+        return cuerpo
+
+    with conexion_lectura() as conexion:
+        cursor = conexion.cursor()
+        try:
+            with metricas.etapa("procedimiento", procedimiento):
+                cursor.execute(sql, *parametros)
+                row = cursor.fetchone()
+            if row is None:
+                return None
+            with metricas.etapa("convertir_filas", procedimiento):
+                fila = resultados.fila(cursor, procedimiento, row)
+                cuerpo = resultados.codificar(fila)
+        finally:
+            cursor.close()
+
+    cache_alumnos.guardar(clave, _identidad_fila(fila), cuerpo)
+    return cuerpo
+
+# Alumno por matrícula en la nueva base de datos
+def por_matricula(matricula):
+    return _consultar(f"nueva:matricula:{matricula.lower()}", "AlumnoConMatricula",
+                      "exec AlumnoConMatricula ?", matricula)
+
+# Alumno por matrícula o CURP en la base de datos SIA
+def por_matricula_sia(matricula):
+    return _consultar(f"sia:matricula:{matricula.lower()}", "AlumnoConCurpOMatricula",
+                      "EXEC AlumnoConCurpOMatricula @Matricula = ?, @CURP = NULL", matricula)
+
+def por_curp_sia(curp):
+    return _consultar(f"sia:curp:{curp.lower()}", "AlumnoConCurpOMatricula",
+                      "EXEC AlumnoConCurpOMatricula @Matricula = NULL, @CURP = ?", curp)
+
+# Después de InsertarAlumno/ActualizarAlumno (e importar): quita las búsquedas que devolvieron
+# a este alumno, por los datos enviados y por la fila devuelta. Con Redis hace E/S de red
+# bloqueante: desde código async se llama con run_in_threadpool
+def invalidar_escritura(alumno, resultado):
+    identidad_alumno = identidad(alumno.id, alumno.curp, alumno.matricula)
+    if resultado:
+        identidad_alumno |= _identidad_fila(resultado)
+    cache_alumnos.invalidar(identidad_alumno)
+
+def estadisticas():
+    return cache_alumnos.estadisticas()
@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+import time
+import pyodbc
+from almacenamiento import almacen
+from db import pool
+import documentos as metadatos_documentos
+import metricas
+
+log = logging.getLogger(__name__)
+
+# Archivador: mueve al nivel frío (ver almacenamiento.py) los documentos sin subidas ni
+# referencias nuevas en ARCHIVADO_DIAS días y actualiza sea.Documentos.RutaArchivo. Corre
+# en segundo plano cada ARCHIVADO_INTERVALO segundos, un lote a la vez, y solo en un worker
+# (los demás encuentran el candado tomado). Con ARCHIVADO_DIAS=0 no se archiva nada.
+DIAS = float(os.getenv("ARCHIVADO_DIAS", "0"))
+INTERVALO = float(os.getenv("ARCHIVADO_INTERVALO", "3600"))
+LOTE = int(os.getenv("ARCHIVADO_LOTE", "200"))
+
+ACTUALIZAR_RUTA = "UPDATE sea.Documentos SET RutaArchivo = ? WHERE RutaArchivo = ?"
+
+archivados = metricas.Contador("sea_archivados_total", "Documentos movidos al nivel frío")
+bytes_liberados = metricas.Contador("sea_archivado_bytes_liberados_total", "Bytes liberados en el nivel caliente")
+bytes_frio = metricas.Contador("sea_archivado_bytes_frio_total", "Bytes escritos en el nivel frío")
+
+_detener = threading.Event()
+_ultima = None
+
+# Todas las filas que apuntan al contenido (varios alumnos pueden compartirlo) cambian juntas
+def actualizar_ruta(anterior, nueva):
+    conexion = pool.obtener()
+    try:
+        cursor = conexion.cursor()
+        try:
+            cursor.execute(ACTUALIZAR_RUTA, nueva, anterior)
+            conexion.commit()
+        except pyodbc.Error:
+            conexion.rollback()
+            raise
+        finally:
+            cursor.close()
+    finally:
+        pool.devolver(conexion)
+    metadatos_documentos.invalidar_ruta(anterior)
+
+# Una pasada: archiva hasta `limite` documentos y devuelve el resumen
+def archivar_antiguos(dias=DIAS, limite=LOTE):
+    global _ultima
+    resumen = {"inicio": time.time(), "archivados": 0, "bytes_liberados": 0, "bytes_frio": 0, "errores": 0}
+    with almacen.turno_archivador() as propio:
+        if not propio:
+            resumen["omitido"] = "Otro proceso está archivando"
+            return resumen
+        for ruta in almacen.antiguos(dias * 86400, limite):
+            try:
+                resultado = almacen.archivar(ruta, actualizar_ruta)
+            except pyodbc.Error as e:
+                metricas.errores_bd.incrementar(operacion="archivado")
+                resumen["errores"] += 1
+                log.warning("No se pudo archivar %s: %s", ruta, e)
+                continue
+            except OSError as e:
+                resumen["errores"] += 1
+                log.warning("No se pudo archivar %s: %s", ruta, e)
+                continue
+            if resultado is None:
+                continue
+            _, tamano, tamano_frio = resultado
+            archivados.incrementar()
+            bytes_liberados.incrementar(tamano)
+            bytes_frio.incrementar(tamano_frio)
+            resumen["archivados"] += 1
+            resumen["bytes_liberados"] += tamano
+            resumen["bytes_frio"] += tamano_frio
+    resumen["duracion"] = time.time() - resumen["inicio"]
+    _ultima = resumen
+    return resumen
+
+def _ciclo(intervalo):
+    while not _detener.wait(intervalo):
+        try:
+            archivar_antiguos()
+        except Exception:
+            log.exception("Falló el archivado de documentos")
+
+def iniciar(intervalo=INTERVALO):
+    _detener.clear()
+    if DIAS > 0:
+        threading.Thread(target=_ciclo, args=(intervalo,), daemon=True).start()
+
+def detener():
+    _detener.set()
+
+def estadisticas():
+    return {
+        "dias": DIAS,
+        "intervalo": INTERVALO,
+        "lote": LOTE,
+        "ultima": _ultima,
+        "almacen": almacen.estadisticas_frio(),
+    }
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import string
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, Response
+from almacenamiento import almacen
+import metricas
+
+# Los documentos no cambian una vez subidos (uno nuevo tiene otro Id)
+CACHE_CONTROL = os.getenv("ARCHIVOS_CACHE_CONTROL", "private, max-age=86400")
+
+def _es_sha256(texto):
+    return len(texto) == 64 and all(c in string.hexdigits for c in texto)
+
+# ETag fuerte a partir de los metadatos guardados: el SHA-256 del contenido si el documento
+# está en el almacén por contenido (también archivado, con .gz), o un hash de Id/ruta/tamaño/fecha para los anteriores
+def etag(documento_id, ruta_archivo, tamano_archivo, fecha_subida):
+    nombre = os.path.basename(ruta_archivo).split(".")[0]
+    if _es_sha256(nombre):
+        return f'"{nombre}"'
+    base = f"{documento_id}:{ruta_archivo}:{tamano_archivo}:{fecha_subida.isoformat() if fecha_subida else ''}"
+    return f'"{hashlib.sha256(base.encode()).hexdigest()}"'
+
+def _utc(fecha):
+    # FechaSubida se guarda como hora local sin zona
+    return fecha.astimezone(timezone.utc).replace(microsecond=0)
+
+def _etiquetas(valor):
+    etiquetas = []
+    for etiqueta in valor.split(","):
+        etiqueta = etiqueta.strip()
+        if etiqueta.startswith("W/"):
+            etiqueta = etiqueta[2:]
+        etiquetas.append(etiqueta)
+    return etiquetas
+
+# If-None-Match tiene prioridad; If-Modified-Since solo se usa si no viene
+def no_modificado(request, etiqueta, fecha_subida):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etiquetas = _etiquetas(if_none_match)
+        return "*" in etiquetas or etiqueta in etiquetas
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and fecha_subida:
+        try:
+            desde = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if desde.tzinfo is None:
+            desde = desde.replace(tzinfo=timezone.utc)
+        return _utc(fecha_subida) <= desde
+    return False
+
+# FileResponse que mide el envío completo del archivo (lectura del disco y escritura al cliente)
+class RespuestaArchivo(FileResponse):
+    async def __call__(self, scope, receive, send):
+        with metricas.etapa("servir_archivo"):
+            await super().__call__(scope, receive, send)
+
+# Respuesta para un documento: 304 sin tocar el disco si el cliente ya lo tiene;
+# si no, FileResponse (que atiende Range/If-Range para la visualización progresiva)
+def respuesta(request, documento_id, nombre_archivo, ruta_archivo, tamano_archivo, fecha_subida,
+              disposicion="attachment"):
+    etiqueta = etag(documento_id, ruta_archivo, tamano_archivo, fecha_subida)
+    headers = {"ETag": etiqueta, "Cache-Control": CACHE_CONTROL}
+    if fecha_subida:
+        headers["Last-Modified"] = format_datetime(_utc(fecha_subida), usegmt=True)
+
+    if no_modificado(request, etiqueta, fecha_subida):
+        return Response(status_code=304, headers=headers)
+
+    # Resolver el archivo en el almacén
+    ruta = almacen.resolver(ruta_archivo)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado en el sistema")
+
+    return RespuestaArchivo(
+        path=ruta,
+        filename=nombre_archivo,
+        media_type='application/pdf',
+        headers=headers,
+        content_disposition_type=disposicion,
+    )
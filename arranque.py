@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import time
+from starlette.concurrency import run_in_threadpool
+import metricas
+
+log = logging.getLogger(__name__)
+
+# Preparación del worker al arrancar. Importar la aplicación no abre conexiones; al iniciar,
+# los pasos registrados (llenar el pool, precargar catálogos) corren a la vez en segundo
+# plano, así que el worker acepta peticiones de inmediato y /health/ready responde 503
+# hasta que terminan. Un paso que falla (p. ej. SQL Server no disponible) se reintenta con
+# espera creciente en lugar de tumbar el worker.
+PRESUPUESTO = float(os.getenv("ARRANQUE_PRESUPUESTO", "5"))
+REINTENTO = float(os.getenv("ARRANQUE_REINTENTO", "2"))
+REINTENTO_MAXIMO = float(os.getenv("ARRANQUE_REINTENTO_MAXIMO", "60"))
+
+IMPORTADO = time.monotonic()  # referencia del tiempo de arranque
+
+class Paso:
+    def __init__(self, nombre, funcion):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.listo = False
+        self.intentos = 0
+        self.duracion = None
+        self.error = None
+
+    def estado(self):
+        return {
+            "listo": self.listo,
+            "intentos": self.intentos,
+            "duracion": self.duracion,
+            "error": self.error,
+        }
+
+_pasos = {}
+_tarea = None
+_listo_en = None
+_cerrando = False
+
+def registrar_paso(nombre, funcion):
+    _pasos[nombre] = Paso(nombre, funcion)
+
+async def _correr(paso):
+    espera = REINTENTO
+    while True:
+        paso.intentos += 1
+        inicio = time.monotonic()
+        try:
+            await run_in_threadpool(paso.funcion)
+        except Exception as e:
+            paso.error = f"{type(e).__name__}: {e}"
+            log.warning("Arranque: falló %s (intento %d), se reintenta en %.1f s: %s", paso.nombre, paso.intentos, espera, e)
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, REINTENTO_MAXIMO)
+        else:
+            paso.listo = True
+            paso.duracion = time.monotonic() - inicio
+            paso.error = None
+            return
+
+async def _preparar():
+    global _listo_en
+    await asyncio.gather(*(_correr(paso) for paso in _pasos.values()))
+    _listo_en = time.monotonic()
+    if _listo_en - IMPORTADO > PRESUPUESTO:
+        log.warning("Arranque: listo en %.2f s, por encima del presupuesto de %.2f s", _listo_en - IMPORTADO, PRESUPUESTO)
+
+# Se llama desde el lifespan de la aplicación (con el event loop corriendo)
+def iniciar():
+    global _tarea, _listo_en, _cerrando
+    _listo_en = None
+    _cerrando = False
+    for paso in _pasos.values():
+        paso.listo = False
+        paso.intentos = 0
+    _tarea = asyncio.get_running_loop().create_task(_preparar())
+
+async def detener():
+    global _cerrando
+    _cerrando = True
+    if _tarea is not None and not _tarea.done():
+        _tarea.cancel()
+        try:
+            await _tarea
+        except asyncio.CancelledError:
+            pass
+
+# Listo para recibir tráfico: terminó la preparación y no se está cerrando
+def listo():
+    return _listo_en is not None and not _cerrando
+
+def estado():
+    return {
+        "listo": listo(),
+        "cerrando": _cerrando,
+        "segundos_desde_importar": round(time.monotonic() - IMPORTADO, 3),
+        "arranque": round(_listo_en - IMPORTADO, 3) if _listo_en is not None else None,
+        "presupuesto": PRESUPUESTO,
+        "pasos": {nombre: paso.estado() for nombre, paso in _pasos.items()},
+    }
+
+metricas.Recolector("sea_listo", "1 si el worker terminó de prepararse y acepta tráfico", lambda: int(listo()))
+metricas.Recolector("sea_arranque_segundos", "Segundos desde importar la aplicación hasta estar listo",
+                    lambda: _listo_en - IMPORTADO if _listo_en is not None else None)
@@ -0,0 +1,93 @@
+# Arranque en frío de un worker contra el SQL Server simulado: cada medición corre en un
+# proceso nuevo que importa main, inicia el lifespan y espera a que /health/ready responda
+# 200. Reporta la mediana y el máximo de cada tramo y sale con 1 si el tiempo total
+# (desde lanzar el proceso hasta estar listo) supera --presupuesto.
+#
+# Uso:
+#   python benchmarks/arranque.py
+#   python benchmarks/arranque.py --repeticiones 10 --latencia 20 --presupuesto 3
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+TRAMOS = ("simulado", "importar", "listo", "total")
+
+# En el proceso hijo: tiempos de cada tramo, en segundos
+def medir(args):
+    import servidor_simulado
+
+    inicio = time.perf_counter()
+    servidor_simulado.instalar(latencia=args.latencia / 1000, localidades_cantidad=args.localidades)
+    simulado = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    import main
+    importar = time.perf_counter() - inicio
+
+    async def arrancar():
+        import httpx
+        from carga import ciclo_de_vida, esperar_listo
+
+        inicio = time.perf_counter()
+        async with ciclo_de_vida(main.api):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.api), base_url="http://arranque") as cliente:
+                await esperar_listo(cliente)
+                return time.perf_counter() - inicio
+
+    listo = asyncio.run(arrancar())
+    print(json.dumps({"simulado": simulado, "importar": importar, "listo": listo}))
+
+def medir_en_proceso_nuevo(args):
+    directorio = tempfile.mkdtemp(prefix="sea-arranque-")
+    entorno = dict(os.environ, ALMACEN_RAIZ=os.path.join(directorio, "documentos"))
+    comando = [sys.executable, __file__, "--hijo", "--latencia", str(args.latencia), "--localidades", str(args.localidades)]
+    try:
+        inicio = time.perf_counter()
+        salida = subprocess.run(comando, env=entorno, capture_output=True, text=True, check=True).stdout
+        total = time.perf_counter() - inicio
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+    tiempos = json.loads(salida.strip().splitlines()[-1])
+    tiempos["total"] = total
+    return tiempos
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--latencia", type=float, default=2, help="ms por viaje al servidor simulado")
+    parser.add_argument("--localidades", type=int, default=20000)
+    parser.add_argument("--presupuesto", type=float, default=float(os.getenv("ARRANQUE_PRESUPUESTO", "5")),
+                        help="segundos máximos desde lanzar el proceso hasta estar listo")
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        medir(args)
+        return
+
+    mediciones = [medir_en_proceso_nuevo(args) for _ in range(args.repeticiones)]
+
+    print("simulado: crear la base simulada; importar: import main; listo: lifespan hasta /health/ready 200;")
+    print("total: desde lanzar el proceso (incluye el intérprete)\n")
+    print(f"{'tramo':<10} {'mediana s':>10} {'máximo s':>10}")
+    for tramo in TRAMOS:
+        valores = [medicion[tramo] for medicion in mediciones]
+        print(f"{tramo:<10} {statistics.median(valores):>10.3f} {max(valores):>10.3f}")
+
+    peor = max(medicion["total"] for medicion in mediciones)
+    if peor > args.presupuesto:
+        print(f"\nEl arranque ({peor:.3f} s) supera el presupuesto de {args.presupuesto:.3f} s")
+        sys.exit(1)
+    print(f"\nDentro del presupuesto de {args.presupuesto:.3f} s")
+
+if __name__ == "__main__":
+    main()
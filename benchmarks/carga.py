@@ -0,0 +1,405 @@
+# Prueba de carga reproducible de la API contra el servidor SQL Server simulado
+# (servidor_simulado.py): reproduce mezclas de tráfico realistas y reporta por endpoint la
+# latencia p50/p99 y las peticiones por segundo, y por fase la memoria (RSS) del proceso.
+#
+# Escenarios (uno por fase, en el orden de --escenarios):
+#   autocompletar  ráfagas de /localidades/{texto} y /lenguas/{texto}, letra por letra
+#   registro       /alumnos/insertar con --pdfs documentos de --tamano-pdf KB
+#   revisor        documentos de un alumno registrado y vista de cada PDF (/archivos/ver)
+#   consulta       alumno por CURP y por matrícula, y la primera página de /alumnos
+#   mezcla         los anteriores al azar, con los pesos de --pesos
+#
+# Por defecto la API corre en este mismo proceso (httpx con ASGITransport, sin red) con la
+# base simulada y un almacén de documentos temporal, así que el RSS incluye al generador de
+# carga. Con --url se prueba un servidor ya levantado (su RSS se lee de --pid); --servir
+# levanta uvicorn con la base simulada para eso. Una respuesta {"error": ...} cuenta como error.
+#
+# Uso:
+#   python benchmarks/carga.py
+#   python benchmarks/carga.py --usuarios 50 --duracion 30 --latencia 5 --pdfs 4
+#   python benchmarks/carga.py --escenarios mezcla --json base.json
+#   python benchmarks/carga.py --escenarios mezcla --comparar base.json --tolerancia 0.2
+#   python benchmarks/carga.py --servir --puerto 8001 &
+#   python benchmarks/carga.py --url http://127.0.0.1:8001 --pid $!
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager, nullcontext
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+import servidor_simulado
+from formulario_alumno import FORMULARIO
+
+ESCENARIOS = ("autocompletar", "registro", "revisor", "consulta")
+
+# Memoria residente en MB de un proceso (Linux); None si no se puede leer
+def rss(pid=None):
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as archivo:
+            for linea in archivo:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def percentil(valores, porcentaje):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(porcentaje / 100 * len(ordenados)) - 1)]
+
+# Tiempos de una fase por endpoint (la plantilla de la ruta) y muestras de RSS
+class Fase:
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.tiempos = {}
+        self.errores = {}
+        self.duracion = 0.0
+        self.rss = []
+
+    def registrar(self, endpoint, duracion, error):
+        self.tiempos.setdefault(endpoint, []).append(duracion)
+        self.errores[endpoint] = self.errores.get(endpoint, 0) + error
+
+    def resumen(self):
+        peticiones = sum(len(tiempos) for tiempos in self.tiempos.values())
+        muestras = [muestra for muestra in self.rss if muestra is not None]
+        return {
+            "duracion": round(self.duracion, 2),
+            "peticiones": peticiones,
+            "por_segundo": round(peticiones / self.duracion, 1) if self.duracion else 0.0,
+            "rss_inicio_mb": round(muestras[0], 1) if muestras else None,
+            "rss_pico_mb": round(max(muestras), 1) if muestras else None,
+            "rss_fin_mb": round(muestras[-1], 1) if muestras else None,
+            "endpoints": {
+                endpoint: {
+                    "peticiones": len(tiempos),
+                    "errores": self.errores[endpoint],
+                    "por_segundo": round(len(tiempos) / self.duracion, 1) if self.duracion else 0.0,
+                    "p50_ms": round(percentil(tiempos, 50) * 1000, 2),
+                    "p99_ms": round(percentil(tiempos, 99) * 1000, 2),
+                    "max_ms": round(max(tiempos) * 1000, 2),
+                }
+                for endpoint, tiempos in sorted(self.tiempos.items())
+            },
+        }
+
+# Datos que comparten los usuarios virtuales: nombres a buscar y alumnos registrados
+class Datos:
+    def __init__(self, args):
+        self.localidades = [fila[1] for fila in servidor_simulado.localidades(args.semilla, args.localidades)]
+        self.alumnos = args.alumnos
+        self.pdfs = args.pdfs
+        self.tamano_pdf = args.tamano_pdf * 1024
+        # Las CURP de cada ejecución son distintas para poder repetir la prueba contra el mismo servidor
+        self.prefijo = uuid.uuid4().hex[:3].upper()
+        self.registros = 0
+        self.registrados = []  # Id de los alumnos registrados en la prueba (tienen documentos)
+
+# Un usuario virtual: cada petición se mide y se anota en la fase
+class Sesion:
+    def __init__(self, cliente, fase, datos, rnd):
+        self.cliente = cliente
+        self.fase = fase
+        self.datos = datos
+        self.rnd = rnd
+
+    async def pedir(self, endpoint, metodo, url, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.cliente.request(metodo, url, **kwargs)
+            error = respuesta.status_code >= 400 or (
+                respuesta.headers.get("content-type", "").startswith("application/json")
+                and respuesta.content.startswith(b'{"error"')
+            )
+        except httpx.HTTPError:
+            respuesta = None
+            error = True
+        self.fase.registrar(endpoint, time.perf_counter() - inicio, error)
+        return respuesta
+
+# PDF mínimo de una página que pasa la validación de contenido, con relleno aleatorio
+# (no comprimible, como un escaneo) hasta el tamaño pedido
+def _pdf(rnd, tamano):
+    relleno = rnd.randbytes(max(tamano - 256, 0))
+    cuerpo = (
+        b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+        b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+        b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+        + b"4 0 obj<</Length %d>>stream\n" % len(relleno) + relleno + b"\nendstream endobj\n"
+    )
+    return cuerpo + b"trailer<</Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n" % len(cuerpo)
+
+async def autocompletar(sesion):
+    nombre = sesion.rnd.choice(sesion.datos.localidades)
+    for largo in range(2, min(len(nombre), 8) + 1):
+        await sesion.pedir("GET /localidades/{localidad}", "GET", f"/localidades/{quote(nombre[:largo])}")
+    lengua = sesion.rnd.choice(servidor_simulado.LENGUAS)
+    for largo in range(2, min(len(lengua), 4) + 1):
+        await sesion.pedir("GET /lenguas/{lengua}", "GET", f"/lenguas/{quote(lengua[:largo])}")
+
+async def registro(sesion):
+    datos = sesion.datos
+    datos.registros += 1
+    numero = datos.registros
+    formulario = dict(FORMULARIO, curp=f"C{datos.prefijo}{numero:07d}HCSRRR0", matricula=f"C{datos.prefijo}{numero:07d}")
+    documentos = [
+        ("documentos", (f"documento_{posicion}.pdf", _pdf(sesion.rnd, datos.tamano_pdf), "application/pdf"))
+        for posicion in range(datos.pdfs)
+    ]
+    respuesta = await sesion.pedir(
+        "POST /alumnos/insertar", "POST", "/alumnos/insertar", data=formulario, files=documentos,
+        headers={"Idempotency-Key": str(uuid.uuid4())},
+    )
+    if respuesta is not None and respuesta.status_code == 200:
+        id_alumno = (respuesta.json().get("data") or {}).get("Id")
+        if id_alumno:
+            datos.registrados.append(id_alumno)
+
+async def revisor(sesion):
+    if not sesion.datos.registrados:
+        await registro(sesion)
+        return
+    id_alumno = sesion.rnd.choice(sesion.datos.registrados)
+    respuesta = await sesion.pedir("GET /alumnos/documentos/{id_alumno}", "GET", f"/alumnos/documentos/{id_alumno}")
+    if respuesta is None or respuesta.status_code != 200:
+        return
+    for documento in respuesta.json().get("documentos", []):
+        await sesion.pedir("GET /archivos/ver/{documento_id}", "GET", f"/archivos/ver/{documento['Id']}")
+
+async def consulta(sesion):
+    posicion = sesion.rnd.randrange(sesion.datos.alumnos)
+    await sesion.pedir("GET /alumnos/curp/{curp}", "GET", f"/alumnos/curp/{servidor_simulado.curp(posicion)}")
+    await sesion.pedir("GET /alumnos/matricula/{matricula}", "GET",
+                       f"/alumnos/matricula/{servidor_simulado.matricula(posicion)}")
+    if sesion.rnd.random() < 0.2:
+        await sesion.pedir("GET /alumnos", "GET", "/alumnos?limite=100")
+
+FUNCIONES = {"autocompletar": autocompletar, "registro": registro, "revisor": revisor, "consulta": consulta}
+
+def leer_pesos(texto):
+    pesos = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        if nombre.strip() not in FUNCIONES:
+            raise SystemExit(f"Escenario desconocido en --pesos: {nombre}")
+        pesos[nombre.strip()] = float(peso)
+    return pesos
+
+async def correr_fase(nombre, cliente, datos, args, pid=None):
+    fase = Fase(nombre)
+    pesos = leer_pesos(args.pesos)
+    fin = time.monotonic() + args.duracion
+
+    async def usuario(numero):
+        sesion = Sesion(cliente, fase, datos, random.Random(f"{args.semilla}-{nombre}-{numero}"))
+        while time.monotonic() < fin:
+            escenario = nombre
+            if nombre == "mezcla":
+                escenario = sesion.rnd.choices(list(pesos), list(pesos.values()))[0]
+            await FUNCIONES[escenario](sesion)
+
+    async def muestrear():
+        while True:
+            fase.rss.append(rss(pid))
+            await asyncio.sleep(0.1)
+
+    muestreo = asyncio.create_task(muestrear())
+    inicio = time.perf_counter()
+    try:
+        await asyncio.gather(*(usuario(numero) for numero in range(args.usuarios)))
+    finally:
+        fase.duracion = time.perf_counter() - inicio
+        muestreo.cancel()
+        fase.rss.append(rss(pid))
+    return fase
+
+# Espera a que /health/ready responda 200 (la API precarga catálogos al arrancar)
+async def esperar_listo(cliente, limite=60):
+    fin = time.monotonic() + limite
+    while True:
+        try:
+            if (await cliente.get("/health/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > fin:
+            raise SystemExit(f"La API no estuvo lista en {limite} s")
+        await asyncio.sleep(0.05)
+
+# Eventos de inicio y cierre de la aplicación (ASGITransport no los envía)
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    entrada = asyncio.Queue()
+    salida = asyncio.Queue()
+    tarea = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}, entrada.get, salida.put))
+    await entrada.put({"type": "lifespan.startup"})
+    mensaje = await salida.get()
+    if mensaje["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"La aplicación no inició: {mensaje.get('message')}")
+    try:
+        yield
+    finally:
+        await entrada.put({"type": "lifespan.shutdown"})
+        await salida.get()
+        await tarea
+
+# Base simulada y almacén temporal; debe llamarse antes de importar main
+def preparar_api_simulada(args):
+    directorio = tempfile.mkdtemp(prefix="sea-carga-")
+    os.environ.setdefault("ALMACEN_RAIZ", os.path.join(directorio, "documentos"))
+    os.environ.setdefault("IMPORTACION_DIRECTORIO", os.path.join(directorio, "importaciones"))
+    procedimientos = {}
+    for parte in args.latencia_procedimiento:
+        nombre, _, milisegundos = parte.partition("=")
+        procedimientos[nombre] = float(milisegundos) / 1000
+    base = servidor_simulado.instalar(
+        latencia=args.latencia / 1000, por_fila=args.latencia_fila / 1_000_000, variacion=args.variacion,
+        procedimientos=procedimientos, alumnos=args.alumnos, localidades_cantidad=args.localidades,
+        semilla=args.semilla,
+    )
+    return base, directorio
+
+def imprimir(fase, resumen):
+    rss_texto = "RSS no disponible"
+    if resumen["rss_inicio_mb"] is not None:
+        rss_texto = (f"RSS {resumen['rss_inicio_mb']:.1f} -> {resumen['rss_fin_mb']:.1f} MB "
+                     f"(pico {resumen['rss_pico_mb']:.1f})")
+    print(f"\n== {fase}: {resumen['peticiones']} peticiones en {resumen['duracion']:.1f} s, "
+          f"{resumen['por_segundo']:.1f}/s, {rss_texto}")
+    print(f"{'endpoint':<38} {'peticiones':>10} {'errores':>8} {'por s':>8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for endpoint, datos in resumen["endpoints"].items():
+        print(f"{endpoint:<38} {datos['peticiones']:>10} {datos['errores']:>8} {datos['por_segundo']:>8.1f} "
+              f"{datos['p50_ms']:>9.2f} {datos['p99_ms']:>9.2f} {datos['max_ms']:>9.2f}")
+
+# Regresiones respecto a un reporte anterior: p99 más alto o menos peticiones por segundo
+# que la tolerancia permitida, por fase y endpoint
+def comparar(reporte, anterior, tolerancia):
+    regresiones = []
+    for fase, resumen in reporte["fases"].items():
+        base_fase = anterior.get("fases", {}).get(fase)
+        if base_fase is None:
+            continue
+        for endpoint, datos in resumen["endpoints"].items():
+            base = base_fase["endpoints"].get(endpoint)
+            if base is None:
+                continue
+            if base["p99_ms"] and datos["p99_ms"] > base["p99_ms"] * (1 + tolerancia):
+                regresiones.append(f"{fase} {endpoint}: p99 {base['p99_ms']:.2f} -> {datos['p99_ms']:.2f} ms")
+            if base["por_segundo"] and datos["por_segundo"] < base["por_segundo"] * (1 - tolerancia):
+                regresiones.append(f"{fase} {endpoint}: {base['por_segundo']:.1f} -> {datos['por_segundo']:.1f} por s")
+    return regresiones
+
+async def probar(args):
+    datos = Datos(args)
+    base = directorio = None
+    pid = args.pid
+
+    if args.url:
+        cliente = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                    limits=httpx.Limits(max_connections=args.usuarios))
+        contexto = nullcontext()
+    else:
+        base, directorio = preparar_api_simulada(args)
+        import main
+
+        cliente = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.api), base_url="http://carga",
+                                    timeout=args.timeout)
+        contexto = ciclo_de_vida(main.api)
+
+    reporte = {"configuracion": {clave: valor for clave, valor in vars(args).items() if clave not in ("json", "comparar")},
+               "fases": {}}
+    try:
+        async with contexto, cliente:
+            await esperar_listo(cliente)
+            if args.calentamiento > 0:
+                await correr_fase("mezcla", cliente, datos, argparse.Namespace(**{**vars(args), "duracion": args.calentamiento}), pid)
+            for escenario in args.escenarios:
+                fase = await correr_fase(escenario, cliente, datos, args, pid)
+                reporte["fases"][escenario] = fase.resumen()
+                imprimir(escenario, reporte["fases"][escenario])
+    finally:
+        if directorio is not None:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    if base is not None:
+        print(f"\nServidor simulado: {base.sentencias} sentencias, {base.viajes} viajes, "
+              f"{len(base.alumnos)} alumnos, {len(base.documentos)} documentos")
+    return reporte
+
+def servir(args):
+    import uvicorn
+
+    _, directorio = preparar_api_simulada(args)
+    import main
+
+    try:
+        uvicorn.run(main.api, host=args.host, port=args.puerto, log_level="warning")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--escenarios", nargs="+", choices=ESCENARIOS + ("mezcla",), default=list(ESCENARIOS) + ["mezcla"])
+    parser.add_argument("--usuarios", type=int, default=20, help="usuarios virtuales concurrentes por fase")
+    parser.add_argument("--duracion", type=float, default=20, help="segundos por fase")
+    parser.add_argument("--calentamiento", type=float, default=3, help="segundos de mezcla sin medir antes de las fases")
+    parser.add_argument("--pesos", default="autocompletar=50,consulta=25,revisor=20,registro=5")
+    parser.add_argument("--pdfs", type=int, default=3, help="documentos por registro")
+    parser.add_argument("--tamano-pdf", type=int, default=200, help="KB por documento")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60)
+    # Servidor simulado
+    parser.add_argument("--latencia", type=float, default=2, help="ms por viaje al servidor")
+    parser.add_argument("--latencia-fila", type=float, default=0, help="µs adicionales por fila devuelta")
+    parser.add_argument("--latencia-procedimiento", nargs="*", default=[], metavar="NOMBRE=MS",
+                        help="ms adicionales por procedimiento, p. ej. InsertarAlumno=20")
+    parser.add_argument("--variacion", type=float, default=0, help="variación aleatoria de la latencia (0.2 = ±20%%)")
+    parser.add_argument("--alumnos", type=int, default=5000)
+    parser.add_argument("--localidades", type=int, default=20000)
+    # Servidor externo
+    parser.add_argument("--url", help="probar un servidor ya levantado en lugar de la API en este proceso")
+    parser.add_argument("--pid", type=int, help="proceso del servidor para medir su RSS (con --url)")
+    parser.add_argument("--servir", action="store_true", help="levantar uvicorn con la base simulada")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8001)
+    # Reportes
+    parser.add_argument("--json", help="guardar el reporte en este archivo")
+    parser.add_argument("--comparar", help="reporte anterior (--json) contra el que buscar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.servir:
+        servir(args)
+        return
+
+    reporte = asyncio.run(probar(args))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as archivo:
+            json.dump(reporte, archivo, ensure_ascii=False, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            regresiones = comparar(reporte, json.load(archivo), args.tolerancia)
+        if regresiones:
+            print(f"\nRegresiones (tolerancia {args.tolerancia:.0%}):")
+            for regresion in regresiones:
+                print(f"  {regresion}")
+            sys.exit(1)
+        print("\nSin regresiones respecto al reporte anterior")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# Compara la carga de #TempDocumentos fila por fila (un execute por documento)
+# contra insertar_documentos_temporales (fast_executemany, un solo envío).
+#
+# Cuántos viajes al servidor hace de verdad un executemany depende del driver, así que solo
+# --real los mide: paquetes que recibió el servidor en la conexión (sys.dm_exec_connections,
+# requiere VIEW SERVER STATE; sin ese permiso se muestra "-"). El servidor simulado cuenta las
+# llamadas al cursor que hace cada método, con la latencia por llamada; no supone nada sobre
+# lo que el driver hace dentro de executemany.
+#
+# Uso:
+#   python benchmarks/documentos_temporales.py                 # servidor simulado, 2 ms por llamada
+#   python benchmarks/documentos_temporales.py --latencia 5
+#   python benchmarks/documentos_temporales.py --real          # SQL Server configurado en .env
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from registro import INSERTAR_DOCUMENTO_TEMPORAL, insertar_documentos_temporales
+
+CREAR_TABLA = """
+    CREATE TABLE #TempDocumentos (
+        NombreArchivo NVARCHAR(255),
+        RutaArchivo NVARCHAR(500),
+        TamanoArchivo BIGINT,
+        FechaSubida DATETIME
+    )
+"""
+
+# Cursor que cuenta las llamadas a execute/executemany y espera `latencia` en cada una
+class CursorSimulado:
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self.llamadas = 0
+        self.fast_executemany = False
+
+    def _llamada(self):
+        self.llamadas += 1
+        time.sleep(self.latencia)
+
+    def execute(self, sql, *parametros):
+        self._llamada()
+
+    def executemany(self, sql, filas):
+        self._llamada()
+
+    def close(self):
+        pass
+
+def documentos(cantidad):
+    return [
+        {
+            "nombre_archivo": f"documento_{i}.pdf",
+            "ruta_archivo": f"uploads/documentos/{i:08d}.pdf",
+            "tamano_archivo": 250_000 + i,
+            "fecha_subida": datetime.now().replace(microsecond=0),
+        }
+        for i in range(cantidad)
+    ]
+
+def fila_por_fila(cursor, documentos_info):
+    for documento_info in documentos_info:
+        cursor.execute(
+            INSERTAR_DOCUMENTO_TEMPORAL,
+            documento_info["nombre_archivo"], documento_info["ruta_archivo"],
+            documento_info["tamano_archivo"], documento_info["fecha_subida"],
+        )
+
+# contar(cursor) devuelve un contador acumulado (llamadas o paquetes) o None si no se puede;
+# ajuste: lo que suma la propia lectura del contador
+def medir(crear_cursor, contar, ajuste, metodo, documentos_info, repeticiones):
+    tiempos = []
+    cuenta = None
+    for _ in range(repeticiones):
+        cursor, preparar, terminar = crear_cursor()
+        preparar(cursor)
+        antes = contar(cursor)
+        inicio = time.perf_counter()
+        metodo(cursor, documentos_info)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        despues = contar(cursor)
+        cuenta = despues - antes - ajuste if antes is not None and despues is not None else None
+        terminar(cursor)
+    return statistics.median(tiempos), cuenta
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latencia", type=float, default=2.0, help="ms por llamada al servidor simulado")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--documentos", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--real", action="store_true", help="usar la base de datos de .env")
+    args = parser.parse_args()
+
+    if args.real:
+        import pyodbc
+        from db import connect
+        conexion = connect()
+        columna = "paquetes"
+
+        # Paquetes recibidos por el servidor en esta conexión; cada lectura suma el de su
+        # propia consulta
+        ajuste = 1
+
+        def contar(cursor):
+            try:
+                consulta = conexion.cursor()
+                try:
+                    consulta.execute("SELECT num_reads FROM sys.dm_exec_connections WHERE session_id = @@SPID")
+                    fila = consulta.fetchone()
+                finally:
+                    consulta.close()
+            except pyodbc.Error:
+                return None
+            return fila[0] if fila else None
+
+        def crear_cursor():
+            def preparar(cursor):
+                cursor.execute("IF OBJECT_ID('tempdb..#TempDocumentos') IS NOT NULL DROP TABLE #TempDocumentos")
+                cursor.execute(CREAR_TABLA)
+
+            def terminar(cursor):
+                conexion.rollback()
+                cursor.close()
+
+            return conexion.cursor(), preparar, terminar
+    else:
+        columna = "llamadas"
+        ajuste = 0
+
+        def crear_cursor():
+            return CursorSimulado(args.latencia / 1000), lambda cursor: None, lambda cursor: None
+
+        def contar(cursor):
+            return cursor.llamadas
+
+    print(f"{'docs':>5} {'método':<18} {columna:>9} {'mediana ms':>11}")
+    for cantidad in args.documentos:
+        documentos_info = documentos(cantidad)
+        for nombre, metodo in (("fila por fila", fila_por_fila), ("fast_executemany", insertar_documentos_temporales)):
+            mediana, cuenta = medir(crear_cursor, contar, ajuste, metodo, documentos_info, args.repeticiones)
+            print(f"{cantidad:>5} {nombre:<18} {cuenta if cuenta is not None else '-':>9} {mediana:>11.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Costo de CPU por petición de validar y convertir el formulario de 37 campos de
+# /alumnos/insertar: 37 parámetros Form() con conversiones a mano (como antes) contra el
+# modelo Alumno aplicado como una sola dependencia. Se mide con TestClient, sin base de
+# datos ni archivos, así que incluye el parseo del multipart en los dos casos.
+#
+# Uso:
+#   python benchmarks/formulario_alumno.py --peticiones 2000
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi import Depends, FastAPI, Form
+from fastapi.testclient import TestClient
+from registro import Alumno, datos_alumno, formulario
+
+FORMULARIO = {
+    "curp": "AAAA000000HCSRRR09", "matricula": "2025001", "nombre": "Juan", "apellidoPaterno": "Pérez",
+    "apellidoMaterno": "López", "fechaNacimiento": "2007-03-15", "sexo": "H", "telefono": "9611234567",
+    "correo": "juan@example.com", "idSede": "1", "estadoCivil": "Soltero", "idNacionalidad": "1",
+    "hablaLengua": "1", "idLengua": "12", "tieneBeca": "0", "queBeca": "", "hijoDeTrabjador": "false",
+    "idCapturo": "admin", "fechaTramite": "2025-08-01", "fechaCaptura": "2025-08-01", "idRol": "1",
+    "tieneAlergias": "0", "alergias": "", "tipoSangre": "O+", "tieneDiscapacidad": "0", "discapacidad": "",
+    "nombreTutor": "María", "apellidoPaternoTutor": "López", "apellidoMaternoTutor": "Ruiz",
+    "telefonoTutor": "9617654321", "codigoPostal": "29000", "calle": "Central", "entreCalles": "",
+    "numeroExterior": "12", "numeroInterior": "", "idLocalidad": "B0572553-592A-4A46-B730-000022504801",
+}
+
+def app_anterior():
+    api = FastAPI()
+
+    @api.post("/")
+    def insertar(
+        id: Optional[str] = Form(None), curp: str = Form(...), matricula: Optional[str] = Form(None),
+        nombre: str = Form(...), apellidoPaterno: str = Form(...), apellidoMaterno: str = Form(...),
+        fechaNacimiento: str = Form(...), sexo: str = Form(...), telefono: str = Form(...),
+        correo: str = Form(...), idSede: int = Form(...), estadoCivil: str = Form(...),
+        idNacionalidad: int = Form(...), hablaLengua: int = Form(...), idLengua: Optional[int] = Form(None),
+        tieneBeca: int = Form(...), queBeca: Optional[str] = Form(None), hijoDeTrabjador: str = Form(...),
+        idCapturo: str = Form(...), fechaTramite: Optional[str] = Form(...), fechaCaptura: Optional[str] = Form(...),
+        idRol: Optional[int] = Form(0), tieneAlergias: int = Form(...), alergias: Optional[str] = Form(None),
+        tipoSangre: str = Form(...), tieneDiscapacidad: int = Form(...), discapacidad: Optional[str] = Form(None),
+        nombreTutor: Optional[str] = Form(None), apellidoPaternoTutor: Optional[str] = Form(None),
+        apellidoMaternoTutor: Optional[str] = Form(None), telefonoTutor: Optional[str] = Form(None),
+        codigoPostal: str = Form(...), calle: str = Form(...), entreCalles: Optional[str] = Form(None),
+        numeroExterior: str = Form(...), numeroInterior: Optional[str] = Form(None), idLocalidad: str = Form(...),
+    ):
+        vacio = lambda valor: valor if valor and valor.strip() else None
+        datos = (
+            id, curp, matricula, nombre, apellidoPaterno, apellidoMaterno,
+            datetime.strptime(fechaNacimiento, '%Y-%m-%d').date(), sexo, telefono, correo, idSede,
+            estadoCivil, idNacionalidad, hablaLengua == 1, idLengua, tieneBeca == 1, queBeca,
+            hijoDeTrabjador.lower() == "true", idCapturo, datetime.strptime(fechaTramite, '%Y-%m-%d').date(),
+            datetime.strptime(fechaCaptura, '%Y-%m-%d'), idRol, tieneAlergias == 1, alergias, tipoSangre,
+            tieneDiscapacidad == 1, vacio(discapacidad), vacio(nombreTutor), vacio(apellidoPaternoTutor),
+            vacio(apellidoMaternoTutor), vacio(telefonoTutor), codigoPostal, calle, entreCalles,
+            numeroExterior, vacio(numeroInterior), idLocalidad,
+        )
+        return {"parametros": len(datos)}
+
+    return api
+
+def app_modelo():
+    api = FastAPI()
+
+    @api.post("/")
+    def insertar(alumno: Alumno = Depends(formulario(Alumno))):
+        return {"parametros": len(datos_alumno(alumno))}
+
+    return api
+
+def medir(cliente, peticiones):
+    tiempos = []
+    for _ in range(peticiones):
+        inicio = time.process_time_ns()
+        respuesta = cliente.post("/", data=FORMULARIO)
+        tiempos.append((time.process_time_ns() - inicio) / 1000)
+        assert respuesta.status_code == 200, respuesta.text
+    return statistics.median(tiempos)
+
+def medir_validacion(peticiones):
+    tiempos = []
+    for _ in range(peticiones):
+        inicio = time.perf_counter_ns()
+        datos_alumno(Alumno.model_validate(FORMULARIO))
+        tiempos.append((time.perf_counter_ns() - inicio) / 1000)
+    return statistics.median(tiempos)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--peticiones", type=int, default=1000)
+    args = parser.parse_args()
+
+    with TestClient(app_anterior()) as anterior, TestClient(app_modelo()) as modelo:
+        # Calentamiento
+        medir(anterior, 50)
+        medir(modelo, 50)
+        tiempo_anterior = medir(anterior, args.peticiones)
+        tiempo_modelo = medir(modelo, args.peticiones)
+
+    print(f"{'camino':<28} {'µs CPU por petición (mediana)':>30}")
+    print(f"{'37 Form() + conversiones':<28} {tiempo_anterior:>30.1f}")
+    print(f"{'modelo Alumno (dependencia)':<28} {tiempo_modelo:>30.1f}")
+    print(f"{'solo model_validate + datos':<28} {medir_validacion(args.peticiones):>30.1f}")
+
+if __name__ == "__main__":
+    main()
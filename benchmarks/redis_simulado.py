@@ -0,0 +1,176 @@
+# Redis simulado para probar el cache compartido de alumnos (CacheRedis en alumnos.py) sin un
+# servidor: un ServidorRedis en memoria, que comparten varios ClienteRedis como si cada uno
+# fuera un worker, con las operaciones que usa la API (get, set con ex, setex, pipeline, sadd,
+# smembers, expire, delete). Con servidor.caido = True todas lanzan RedisError.
+#
+# Ejecutado directamente revisa que una escritura en un worker invalide las búsquedas de los
+# demás, que las entradas venzan con el TTL y que, con Redis caído, las búsquedas se resuelvan
+# en la base de datos (servidor_simulado.py) sin error:
+#   python benchmarks/redis_simulado.py
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import alumnos
+
+def _bytes(valor):
+    if isinstance(valor, bytes):
+        return valor
+    return str(valor).encode()
+
+class ServidorRedis:
+    def __init__(self):
+        self.datos = {}  # clave: (valor, vence) con valor bytes o set de bytes
+        self.caido = False
+        self.desfase = 0.0  # segundos que se adelanta el reloj, para probar el TTL
+        self.lock = threading.Lock()
+
+    def ahora(self):
+        return time.monotonic() + self.desfase
+
+    def _revisar(self):
+        if self.caido:
+            raise alumnos.ErrorRedis("[SIMULADO] Redis no responde")
+
+    def _vigente(self, clave):
+        entrada = self.datos.get(clave)
+        if entrada is not None and entrada[1] is not None and entrada[1] <= self.ahora():
+            del self.datos[clave]
+            return None
+        return entrada
+
+    def get(self, clave):
+        with self.lock:
+            self._revisar()
+            entrada = self._vigente(clave)
+            return entrada[0] if entrada else None
+
+    def set(self, clave, valor, ex=None):
+        with self.lock:
+            self._revisar()
+            self.datos[clave] = (_bytes(valor), self.ahora() + ex if ex else None)
+            return True
+
+    def sadd(self, clave, *miembros):
+        with self.lock:
+            self._revisar()
+            entrada = self._vigente(clave)
+            conjunto, vence = entrada if entrada else (set(), None)
+            nuevos = {_bytes(miembro) for miembro in miembros} - conjunto
+            self.datos[clave] = (conjunto | nuevos, vence)
+            return len(nuevos)
+
+    def smembers(self, clave):
+        with self.lock:
+            self._revisar()
+            entrada = self._vigente(clave)
+            return set(entrada[0]) if entrada else set()
+
+    def expire(self, clave, segundos):
+        with self.lock:
+            self._revisar()
+            entrada = self._vigente(clave)
+            if entrada is None:
+                return False
+            self.datos[clave] = (entrada[0], self.ahora() + segundos)
+            return True
+
+    def delete(self, *claves):
+        with self.lock:
+            self._revisar()
+            return sum(self.datos.pop(clave, None) is not None for clave in claves)
+
+# Las operaciones se ejecutan al llamar execute(), como en redis-py
+class Tuberia:
+    def __init__(self, servidor):
+        self.servidor = servidor
+        self.operaciones = []
+
+    def __getattr__(self, nombre):
+        if nombre not in ("set", "setex", "sadd", "expire", "delete", "get", "smembers"):
+            raise AttributeError(nombre)
+        def encolar(*args, **kwargs):
+            self.operaciones.append((nombre, args, kwargs))
+            return self
+        return encolar
+
+    def execute(self):
+        cliente = ClienteRedis(self.servidor)
+        operaciones, self.operaciones = self.operaciones, []
+        return [getattr(cliente, nombre)(*args, **kwargs) for nombre, args, kwargs in operaciones]
+
+class ClienteRedis:
+    def __init__(self, servidor):
+        self.servidor = servidor
+
+    def get(self, clave):
+        return self.servidor.get(clave)
+
+    def set(self, clave, valor, ex=None):
+        return self.servidor.set(clave, valor, ex=ex)
+
+    def setex(self, clave, segundos, valor):
+        return self.servidor.set(clave, valor, ex=segundos)
+
+    def sadd(self, clave, *miembros):
+        return self.servidor.sadd(clave, *miembros)
+
+    def smembers(self, clave):
+        return self.servidor.smembers(clave)
+
+    def expire(self, clave, segundos):
+        return self.servidor.expire(clave, segundos)
+
+    def delete(self, *claves):
+        return self.servidor.delete(*claves)
+
+    def pipeline(self):
+        return Tuberia(self.servidor)
+
+def revisar(condicion, descripcion):
+    print(f"{'ok   ' if condicion else 'FALLA'} {descripcion}")
+    return condicion
+
+def main():
+    import servidor_simulado
+
+    servidor_simulado.instalar(latencia=0, alumnos=10, localidades_cantidad=10)
+    servidor = ServidorRedis()
+    worker_a = alumnos.CacheRedis(ClienteRedis(servidor), ttl=30)
+    worker_b = alumnos.CacheRedis(ClienteRedis(servidor), ttl=30)
+    resultados = []
+
+    # Una búsqueda guardada por un worker la encuentra el otro
+    alumnos.cache_alumnos = worker_a
+    cuerpo = alumnos.por_matricula(servidor_simulado.matricula(3))
+    clave = f"nueva:matricula:{servidor_simulado.matricula(3).lower()}"
+    resultados.append(revisar(cuerpo is not None, "la búsqueda se resuelve en la base de datos"))
+    resultados.append(revisar(worker_b.buscar(clave) == (True, cuerpo), "el otro worker encuentra la búsqueda en Redis"))
+
+    # Una escritura en el otro worker (por CURP, otro campo de la misma fila) la invalida para todos
+    fila = json.loads(cuerpo)
+    worker_b.invalidar(alumnos.identidad(curp=fila["CURP"]))
+    resultados.append(revisar(worker_a.buscar(clave) == (False, None), "una escritura en otro worker invalida la búsqueda"))
+
+    # Las entradas vencen con el TTL
+    alumnos.por_matricula(servidor_simulado.matricula(3))
+    servidor.desfase += 31
+    resultados.append(revisar(worker_b.buscar(clave) == (False, None), "las entradas vencen con el TTL"))
+
+    # Con Redis caído se consulta la base de datos y se cuentan los errores, sin fallar la petición
+    servidor.caido = True
+    errores = worker_a.errores
+    resultados.append(revisar(alumnos.por_matricula(servidor_simulado.matricula(3)) == cuerpo,
+                              "con Redis caído la búsqueda se resuelve en la base de datos"))
+    worker_a.invalidar(alumnos.identidad(id_alumno=fila["Id"]))
+    resultados.append(revisar(worker_a.errores == errores + 3, "buscar, guardar e invalidar cuentan el error de Redis"))
+    servidor.caido = False
+
+    sys.exit(0 if all(resultados) else 1)
+
+if __name__ == "__main__":
+    main()
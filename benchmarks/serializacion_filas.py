@@ -0,0 +1,74 @@
+# Compara la conversión de filas a JSON del camino anterior (columnas desde cursor.description,
+# dict por fila, jsonable_encoder y JSONResponse) contra resultados.py (columnas en cache y
+# codificación directa a bytes con RespuestaJSON).
+#
+# Uso:
+#   python benchmarks/serializacion_filas.py
+#   python benchmarks/serializacion_filas.py --filas 1 100 1000 --columnas 60
+import argparse
+import datetime
+import decimal
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+import resultados
+
+# Cursor con el resultado ya leído, con columnas de tipos parecidos a los de sea.Alumnos
+class CursorSimulado:
+    def __init__(self, filas, columnas):
+        tipos = [
+            lambda i: f"texto {i}",
+            lambda i: i,
+            lambda i: datetime.date(2000, 1, 1) + datetime.timedelta(days=i % 5000),
+            lambda i: datetime.datetime(2024, 8, 1, 9, 30) + datetime.timedelta(minutes=i),
+            lambda i: decimal.Decimal(i) / 100,
+            lambda i: uuid.UUID(int=i),
+            lambda i: i % 2 == 0,
+            lambda i: None,
+        ]
+        self.description = [(f"Columna{c}", None, None, None, None, None, True) for c in range(columnas)]
+        self.rows = [tuple(tipos[c % len(tipos)](f) for c in range(columnas)) for f in range(filas)]
+
+def anterior(cursor):
+    columns = [column[0] for column in cursor.description]
+    filas = [dict(zip(columns, row)) for row in cursor.rows]
+    return JSONResponse(jsonable_encoder({"alumnos": filas})).body
+
+def nuevo(cursor):
+    filas = resultados.filas(cursor, "benchmark", cursor.rows)
+    return resultados.RespuestaJSON({"alumnos": filas}).body
+
+def medir(metodo, cursor, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        metodo(cursor)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--columnas", type=int, default=40)
+    parser.add_argument("--repeticiones", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"codificador: {'orjson' if resultados.orjson is not None else 'json (orjson no instalado)'}")
+    print(f"{'filas':>6} {'anterior ms':>12} {'nuevo ms':>10} {'mejora':>8}")
+    for cantidad in args.filas:
+        cursor = CursorSimulado(cantidad, args.columnas)
+        # Mismo JSON por los dos caminos (salvo espacios)
+        assert resultados.orjson is None or anterior(cursor) == nuevo(cursor)
+        tiempo_anterior = medir(anterior, cursor, args.repeticiones)
+        tiempo_nuevo = medir(nuevo, cursor, args.repeticiones)
+        print(f"{cantidad:>6} {tiempo_anterior:>12.3f} {tiempo_nuevo:>10.3f} {tiempo_anterior / tiempo_nuevo:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# Servidor SQL Server simulado para pruebas de carga: una conexión con la interfaz de
+# pyodbc (cursor, execute, fetch*, nextset, commit) que responde, con datos en memoria,
+# las sentencias que envía la API: catálogos, ObtenerAlumnos (ordenado por apellido, no por
+# Id), AlumnoConMatricula,
+# AlumnoConCurpOMatricula (también en lotes), #TempDocumentos, InsertarAlumno,
+# ActualizarAlumno y sea.Documentos (consultas y el cambio de RutaArchivo al archivar).
+# Cada viaje al servidor tarda la latencia configurada.
+#
+# No hay transacciones: los cambios se aplican al ejecutar y rollback no los deshace.
+#
+# Uso (antes de importar main):
+#   import servidor_simulado
+#   servidor_simulado.instalar(latencia=0.002, alumnos=5000)
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+import pyodbc
+
+# Columnas de sea.Alumnos, en el orden de los parámetros de InsertarAlumno/ActualizarAlumno
+COLUMNAS_ALUMNO = (
+    "Id", "CURP", "Matricula", "Nombre", "ApellidoPaterno", "ApellidoMaterno", "FechaNacimiento",
+    "Sexo", "Telefono", "Correo", "IdSede", "EstadoCivil", "IdNacionalidad", "HablaLengua",
+    "IdLengua", "TieneBeca", "QueBeca", "HijoDeTrabajador", "IdCapturo", "FechaTramite",
+    "FechaCaptura", "IdRol", "TieneAlergias", "Alergias", "TipoSangre", "TieneDiscapacidad",
+    "Discapacidad", "NombreTutor", "ApellidoPaternoTutor", "ApellidoMaternoTutor", "TelefonoTutor",
+    "CodigoPostal", "Calle", "EntreCalles", "NumeroExterior", "NumeroInterior", "IdLocalidad",
+)
+COLUMNAS_DOCUMENTO = ("Id", "IdAlumno", "NombreArchivo", "RutaArchivo", "TamanoArchivo", "FechaSubida")
+COLUMNAS_LOCALIDAD = ("Id", "NombreLocalidad", "IdMunicipio", "NombreMunicipio")
+
+LENGUAS = (
+    "Tseltal", "Tsotsil", "Ch'ol", "Zoque", "Tojolabal", "Mam", "Q'anjob'al", "Chuj", "Jakalteko",
+    "Lacandón", "Mochó", "Akateko", "Kaqchikel", "Teko", "Náhuatl", "Zapoteco", "Mixteco", "Maya",
+)
+TIPOS_SANGRE = ("A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-")
+SILABAS = ("tux", "tla", "san", "cris", "to", "bal", "chi", "co", "pa", "len", "que", "zo", "ca",
+           "ma", "ri", "ta", "o", "sin", "go", "te", "nan", "ji", "la", "pi", "jo", "ve", "nus")
+NOMBRES = ("Juan", "María", "José", "Guadalupe", "Luis", "Ana", "Pedro", "Rosa", "Miguel", "Carmen")
+APELLIDOS = ("Pérez", "López", "Gómez", "Hernández", "Díaz", "Ruiz", "Santiz", "Méndez", "Cruz", "Vázquez")
+
+# Claves de los alumnos precargados; las pruebas de carga las generan igual para consultarlas
+def curp(posicion):
+    return f"SIMA{posicion:06d}HCSRRR{posicion % 100:02d}"
+
+def matricula(posicion):
+    return f"S{posicion:07d}"
+
+def _palabra(rnd):
+    return "".join(rnd.choice(SILABAS) for _ in range(rnd.randint(2, 4))).capitalize()
+
+# Nombres de las localidades (deterministas por semilla) y su municipio
+def localidades(semilla=1, cantidad=20000, municipios=124):
+    rnd = random.Random(f"localidades-{semilla}")
+    nombres_municipios = [_palabra(rnd) for _ in range(municipios)]
+    filas = []
+    for _ in range(cantidad):
+        nombre = _palabra(rnd)
+        if rnd.random() < 0.4:
+            nombre = f"{nombre} {_palabra(rnd)}"
+        id_municipio = rnd.randrange(municipios)
+        filas.append((str(uuid.UUID(int=rnd.getrandbits(128))).upper(), nombre, id_municipio + 1,
+                      nombres_municipios[id_municipio]))
+    return filas
+
+def _alumno(rnd, posicion):
+    return (
+        str(uuid.UUID(int=rnd.getrandbits(128))).upper(), curp(posicion), matricula(posicion),
+        rnd.choice(NOMBRES), rnd.choice(APELLIDOS), rnd.choice(APELLIDOS),
+        date(2000, 1, 1) + timedelta(days=rnd.randrange(3650)), rnd.choice("HM"),
+        f"961{rnd.randrange(10 ** 7):07d}", f"alumno{posicion}@example.com", rnd.randint(1, 4), "Soltero",
+        1, False, None, False, None, False, "admin", date(2024, 8, 1), datetime(2024, 8, 1, 9, 30), 1,
+        False, None, rnd.choice(TIPOS_SANGRE), False, None, None, None, None, None,
+        "29000", "Central", None, str(rnd.randint(1, 999)), None, "B0572553-592A-4A46-B730-000022504801",
+    )
+
+def _descripcion(columnas):
+    return [(columna, None, None, None, None, None, True) for columna in columnas]
+
+# Tiempo de cada viaje al servidor: latencia fija + por fila devuelta, con variación aleatoria
+# opcional y latencia adicional por procedimiento (p. ej. {"InsertarAlumno": 0.02})
+class Latencia:
+    def __init__(self, viaje=0.002, por_fila=0.0, variacion=0.0, procedimientos=None):
+        self.viaje = viaje
+        self.por_fila = por_fila
+        self.variacion = variacion
+        self.procedimientos = procedimientos or {}
+
+    def esperar(self, filas=0, procedimiento=None):
+        tiempo = self.viaje + self.por_fila * filas + self.procedimientos.get(procedimiento, 0.0)
+        if self.variacion:
+            tiempo *= 1 + random.uniform(-self.variacion, self.variacion)
+        if tiempo > 0:
+            time.sleep(tiempo)
+
+# Datos en memoria compartidos por todas las conexiones
+class BaseSimulada:
+    def __init__(self, latencia=None, alumnos=5000, localidades_cantidad=20000, semilla=1):
+        self.latencia = latencia or Latencia()
+        self._candado = threading.Lock()
+        rnd = random.Random(f"alumnos-{semilla}")
+
+        self.alumnos = {}  # Id -> fila
+        self.por_curp = {}
+        self.por_matricula = {}
+        for posicion in range(alumnos):
+            self._guardar_alumno(_alumno(rnd, posicion))
+
+        self.documentos = {}  # Id -> fila
+        self.documentos_alumno = {}  # IdAlumno (minúsculas) -> [Id]
+        self.localidades = localidades(semilla, localidades_cantidad)
+        self.lenguas = [(posicion + 1, nombre) for posicion, nombre in enumerate(LENGUAS)]
+        self.tipos_sangre = [(posicion + 1, tipo) for posicion, tipo in enumerate(TIPOS_SANGRE)]
+
+        self.sentencias = 0
+        self.viajes = 0
+
+    def _guardar_alumno(self, fila):
+        self.alumnos[fila[0]] = fila
+        self.por_curp[fila[1]] = fila
+        if fila[2]:
+            self.por_matricula[fila[2]] = fila
+
+    def registrar_alumno(self, parametros, documentos, actualizar):
+        fila = list(parametros)
+        with self._candado:
+            if actualizar:
+                anterior = self.alumnos.get(str(fila[0]).upper())
+                if anterior is None:
+                    raise pyodbc.ProgrammingError("50000", "[SIMULADO] El alumno no existe")
+                fila[0] = anterior[0]
+            else:
+                fila[0] = str(fila[0] or uuid.uuid4()).upper()
+                if fila[0] in self.alumnos:
+                    raise pyodbc.IntegrityError("23000", "[SIMULADO] Violation of PRIMARY KEY constraint")
+            fila = tuple(fila)
+            self._guardar_alumno(fila)
+
+            for nombre, ruta, tamano, fecha in documentos:
+                id_documento = str(uuid.uuid4()).upper()
+                self.documentos[id_documento] = (id_documento, fila[0], nombre, ruta, tamano, fecha)
+                self.documentos_alumno.setdefault(fila[0].lower(), []).append(id_documento)
+        return fila
+
+    def documentos_de(self, ids_alumnos):
+        with self._candado:
+            return [
+                self.documentos[id_documento]
+                for id_alumno in ids_alumnos
+                for id_documento in self.documentos_alumno.get(str(id_alumno).lower(), ())
+            ]
+
+    def cambiar_ruta(self, nueva, anterior):
+        with self._candado:
+            for id_documento, documento in self.documentos.items():
+                if documento[3] == anterior:
+                    self.documentos[id_documento] = documento[:3] + (nueva,) + documento[4:]
+
+    def listado(self):
+        with self._candado:
+            return sorted(self.alumnos.values(), key=lambda fila: (fila[4], fila[5] or "", fila[3]))
+
+def _normalizar(sql):
+    return " ".join(sql.split())
+
+PROCEDIMIENTO_REGISTRO = re.compile(r"exec (?:dbo\.)?(InsertarAlumno|ActualizarAlumno) ", re.I)
+
+class CursorSimulado:
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.base = conexion.base
+        self.fast_executemany = False
+        self.description = None
+        self._conjuntos = []
+        self._filas = []
+
+    def _resultado(self, conjuntos):
+        self._conjuntos = list(conjuntos)
+        self._siguiente()
+
+    def _siguiente(self):
+        if not self._conjuntos:
+            self.description = None
+            self._filas = []
+            return False
+        columnas, filas = self._conjuntos.pop(0)
+        self.description = _descripcion(columnas)
+        self._filas = list(filas)
+        return True
+
+    def execute(self, sql, *parametros):
+        if len(parametros) == 1 and isinstance(parametros[0], (list, tuple)):
+            parametros = tuple(parametros[0])
+        texto = _normalizar(sql)
+        minusculas = texto.lower()
+        base = self.base
+        procedimiento = None
+
+        if minusculas == "select 1":
+            self._resultado([(("",), [(1,)])])
+        elif minusculas.endswith("from catalogos.lenguas"):
+            self._resultado([(("Id", "Nombre"), base.lenguas)])
+        elif minusculas.endswith("from sia.catalogos.tipossangres"):
+            self._resultado([(("Id", "Tipo"), base.tipos_sangre)])
+        elif minusculas.endswith("from sia.catalogos.localidades"):
+            self._resultado([(COLUMNAS_LOCALIDAD, base.localidades)])
+        elif minusculas == "exec obteneralumnos":
+            procedimiento = "ObtenerAlumnos"
+            self._resultado([(COLUMNAS_ALUMNO, base.listado())])
+        elif minusculas.startswith("exec alumnoconmatricula"):
+            procedimiento = "AlumnoConMatricula"
+            fila = base.por_matricula.get(parametros[0])
+            self._resultado([(COLUMNAS_ALUMNO, [fila] if fila else [])])
+        elif "alumnoconcurpomatricula" in minusculas:
+            # Uno o varios EXEC en la misma sentencia: un conjunto de resultados por EXEC
+            procedimiento = "AlumnoConCurpOMatricula"
+            conjuntos = []
+            for posicion in range(minusculas.count("exec alumnoconcurpomatricula")):
+                matricula_buscada, curp_buscada = self._claves(texto, parametros, posicion)
+                fila = base.por_matricula.get(matricula_buscada) if matricula_buscada else base.por_curp.get(curp_buscada)
+                conjuntos.append((COLUMNAS_ALUMNO, [fila] if fila else []))
+            self._resultado(conjuntos)
+        elif "object_id('tempdb..#tempdocumentos')" in minusculas:
+            self.conexion.temporales = None
+            self._resultado([])
+        elif minusculas.startswith("create table #tempdocumentos"):
+            self.conexion.temporales = []
+            self._resultado([])
+        elif PROCEDIMIENTO_REGISTRO.match(texto):
+            procedimiento = PROCEDIMIENTO_REGISTRO.match(texto).group(1)
+            if self.conexion.temporales is None:
+                raise pyodbc.ProgrammingError("42S02", "[SIMULADO] Invalid object name '#TempDocumentos'")
+            fila = base.registrar_alumno(parametros, self.conexion.temporales,
+                                         actualizar=procedimiento == "ActualizarAlumno")
+            self._resultado([(("Id", "CURP", "Matricula"), [fila[:3]])])
+        elif "from sea.documentos where idalumno in" in minusculas:
+            self._resultado([(COLUMNAS_DOCUMENTO, base.documentos_de(parametros))])
+        elif "from sea.documentos where id = ?" in minusculas:
+            documento = base.documentos.get(str(parametros[0]).upper())
+            self._resultado([(COLUMNAS_DOCUMENTO[1:], [documento[1:]] if documento else [])])
+        elif minusculas.startswith("update sea.documentos set rutaarchivo = ? where rutaarchivo = ?"):
+            base.cambiar_ruta(*parametros)
+            self._resultado([])
+        else:
+            raise pyodbc.ProgrammingError("42000", f"[SIMULADO] Sentencia no emulada: {texto[:200]}")
+
+        with base._candado:
+            base.sentencias += 1
+            base.viajes += 1
+        base.latencia.esperar(sum(len(filas) for _, filas in self._conjuntos) + len(self._filas), procedimiento)
+        return self
+
+    # (matricula, curp) del EXEC número posicion: cada uno tiene sus "?" o NULL en orden
+    def _claves(self, texto, parametros, posicion):
+        llamadas = re.findall(r"@Matricula = (\?|NULL), @CURP = (\?|NULL)", texto, re.I)
+        usados = sum((matricula_sql == "?") + (curp_sql == "?") for matricula_sql, curp_sql in llamadas[:posicion])
+        valores = []
+        for marcador in llamadas[posicion]:
+            if marcador == "?":
+                valores.append(parametros[usados])
+                usados += 1
+            else:
+                valores.append(None)
+        return valores
+
+    def executemany(self, sql, filas):
+        filas = list(filas)
+        if not _normalizar(sql).lower().startswith("insert into #tempdocumentos"):
+            raise pyodbc.ProgrammingError("42000", f"[SIMULADO] Sentencia no emulada: {_normalizar(sql)[:200]}")
+        if self.conexion.temporales is None:
+            raise pyodbc.ProgrammingError("42S02", "[SIMULADO] Invalid object name '#TempDocumentos'")
+        self.conexion.temporales.extend(tuple(fila) for fila in filas)
+        self.description = None
+
+        # Con fast_executemany es un solo viaje; sin él, uno por fila (como el driver real)
+        viajes = 1 if self.fast_executemany else len(filas)
+        with self.base._candado:
+            self.base.sentencias += len(filas)
+            self.base.viajes += viajes
+        for _ in range(viajes):
+            self.base.latencia.esperar()
+
+    def fetchone(self):
+        return self._filas.pop(0) if self._filas else None
+
+    def fetchall(self):
+        filas, self._filas = self._filas, []
+        return filas
+
+    def fetchmany(self, cantidad):
+        filas, self._filas = self._filas[:cantidad], self._filas[cantidad:]
+        return filas
+
+    def nextset(self):
+        return self._siguiente()
+
+    def close(self):
+        self._conjuntos = []
+        self._filas = []
+
+class ConexionSimulada:
+    def __init__(self, base):
+        self.base = base
+        self.temporales = None  # filas de #TempDocumentos de esta sesión
+
+    def cursor(self):
+        return CursorSimulado(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+base = None
+
+def connect(*args, **kwargs):
+    if base is None:
+        raise pyodbc.OperationalError("08001", "[SIMULADO] Falta llamar a servidor_simulado.instalar()")
+    base.latencia.esperar()
+    return ConexionSimulada(base)
+
+# Crea la base simulada y hace que db.connect la use (el pool abre las conexiones con db.connect)
+def instalar(latencia=0.002, por_fila=0.0, variacion=0.0, procedimientos=None,
+             alumnos=5000, localidades_cantidad=20000, semilla=1):
+    global base
+    import db
+
+    base = BaseSimulada(Latencia(latencia, por_fila, variacion, procedimientos), alumnos, localidades_cantidad, semilla)
+    db.connect = connect
+    return base
@@ -0,0 +1,73 @@
+# Costo de la validación de contenido de los PDF en la subida: recorrido por bloques con solo
+# SHA-256 (como antes) contra SHA-256 + ValidadorPDF, para PDF de varios tamaños. Los PDF
+# tienen relleno aleatorio (como un escaneo) y sus páginas en texto o en un flujo de objetos.
+#
+# Uso:
+#   python benchmarks/validacion_pdf.py
+#   python benchmarks/validacion_pdf.py --tamanos 1 5 20 --paginas 50 --objstm
+import argparse
+import hashlib
+import os
+import statistics
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import validacion_pdf
+
+BLOQUE = 1024 * 1024
+
+def crear_pdf(tamano, paginas, objstm):
+    objetos = b"".join(b"<</Type /Page /Parent 2 0 R /MediaBox [0 0 612 792]>>\n" for _ in range(paginas))
+    if objstm:
+        comprimido = zlib.compress(objetos)
+        objetos = b"3 0 obj<</Type/ObjStm/Filter/FlateDecode/Length %d>>stream\n" % len(comprimido) + comprimido + b"\nendstream endobj\n"
+    cuerpo = b"%PDF-1.5\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n" + objetos
+    relleno = os.urandom(max(tamano - len(cuerpo) - 128, 0))
+    cuerpo += b"4 0 obj<</Length %d>>stream\n" % len(relleno) + relleno + b"\nendstream endobj\n"
+    return cuerpo + b"trailer<</Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n" % len(cuerpo)
+
+def solo_hash(datos):
+    resumen = hashlib.sha256()
+    for inicio in range(0, len(datos), BLOQUE):
+        resumen.update(datos[inicio:inicio + BLOQUE])
+    return resumen.hexdigest()
+
+def hash_y_validacion(datos):
+    resumen = hashlib.sha256()
+    validador = validacion_pdf.ValidadorPDF()
+    for inicio in range(0, len(datos), BLOQUE):
+        bloque = datos[inicio:inicio + BLOQUE]
+        validador.agregar(bloque)
+        resumen.update(bloque)
+    return validador.terminar()
+
+def medir(metodo, datos, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        metodo(datos)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanos", type=float, nargs="+", default=[0.5, 5, 20], help="MB")
+    parser.add_argument("--paginas", type=int, default=10)
+    parser.add_argument("--objstm", action="store_true", help="páginas dentro de un flujo de objetos comprimido")
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'MB':>6} {'sha256 ms':>10} {'+validar ms':>12} {'MB/s validar':>13} {'páginas':>8}")
+    for megas in args.tamanos:
+        datos = crear_pdf(int(megas * 1024 * 1024), args.paginas, args.objstm)
+        paginas = hash_y_validacion(datos)
+        tiempo_hash = medir(solo_hash, datos, args.repeticiones)
+        tiempo_validar = medir(hash_y_validacion, datos, args.repeticiones)
+        velocidad = megas / max((tiempo_validar - tiempo_hash) / 1000, 1e-9)
+        print(f"{megas:>6g} {tiempo_hash:>10.2f} {tiempo_validar:>12.2f} {velocidad:>13.0f} {paginas:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+import metricas
+
+# Cache en memoria con expiración (TTL), tamaño máximo (LRU) y contadores de aciertos/fallos
+class CacheTTL:
+    def __init__(self, ttl=3600.0, maximo=256, nombre=None):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._datos = OrderedDict()  # clave -> (expira, valor)
+        self._candado = threading.Lock()
+
+        self.aciertos = 0
+        self.fallos = 0
+        if nombre:
+            metricas.registrar_cache(nombre, self)
+
+    def buscar(self, clave):
+        with self._candado:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                expira, valor = entrada
+                if time.monotonic() < expira:
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return True, valor
+                del self._datos[clave]
+            self.fallos += 1
+            return False, None
+
+    def guardar(self, clave, valor):
+        with self._candado:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    # Devuelve el valor en cache o lo carga con la función indicada
+    def obtener(self, clave, cargar):
+        encontrado, valor = self.buscar(clave)
+        if encontrado:
+            return valor
+        valor = cargar()
+        self.guardar(clave, valor)
+        return valor
+
+    def invalidar(self, clave=None):
+        with self._candado:
+            if clave is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(clave, None)
+
+    # Elimina las entradas cuyo valor cumple la condición
+    def invalidar_si(self, condicion):
+        with self._candado:
+            for clave in [clave for clave, (_, valor) in self._datos.items() if condicion(valor)]:
+                del self._datos[clave]
+
+    def estadisticas(self):
+        with self._candado:
+            return {
+                "entradas": len(self._datos),
+                "maximo": self.maximo,
+                "ttl": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+            }
@@ -0,0 +1,47 @@
+import os
+from cache import CacheTTL
+from db import consultar
+import localidades
+
+TTL = float(os.getenv("CATALOGOS_TTL", "3600"))
+MAXIMO = int(os.getenv("CATALOGOS_MAX", "1"))  # entradas por catálogo (cada uno guarda su tabla completa)
+
+# Un cache por catálogo para poder invalidarlos por separado
+caches = {
+    "lenguas": CacheTTL(ttl=TTL, maximo=MAXIMO, nombre="lenguas"),
+    "sangre": CacheTTL(ttl=TTL, maximo=MAXIMO, nombre="sangre"),
+}
+
+# Catálogos que se pueden invalidar desde /admin/cache/invalidar
+NOMBRES = ("lenguas", "sangre", "localidades")
+
+def lenguas():
+    return caches["lenguas"].obtener(
+        "todas", lambda: consultar("SELECT * FROM Catalogos.Lenguas")
+    )
+
+# Sin distinguir mayúsculas ni acentos, como el LIKE con la intercalación de la base de
+# datos: "tenek" encuentra "Tének"
+def buscar_lenguas(texto):
+    texto = localidades.normalizar(texto)
+    return [lengua for lengua in lenguas() if texto in localidades.normalizar(lengua["Nombre"])]
+
+def lengua_por_id(id_lengua):
+    return next((lengua for lengua in lenguas() if lengua["Id"] == id_lengua), None)
+
+def tipos_sangre():
+    return caches["sangre"].obtener(
+        "todos", lambda: consultar("SELECT * FROM SIA.Catalogos.TiposSangres")
+    )
+
+def invalidar(catalogo=None):
+    if catalogo in (None, "localidades"):
+        localidades.refrescar_en_segundo_plano()
+    for nombre, cache in caches.items():
+        if catalogo in (None, nombre):
+            cache.invalidar()
+
+def estadisticas():
+    estado = {nombre: cache.estadisticas() for nombre, cache in caches.items()}
+    estado["localidades"] = localidades.estadisticas()
+    return estado
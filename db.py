@@ -1,10 +1,21 @@
+import asyncio
+import contextvars
+import functools
 import pyodbc
 import dotenv
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import metricas
+import diagnostico
+import resultados
 
-def connect():
-    dotenv.load_dotenv()
+dotenv.load_dotenv()
 
+def connect():
     conexion = pyodbc.connect(
         f"DRIVER={{ODBC Driver 17 for SQL Server}};"
         f"SERVER={os.getenv('SERVER')};"
@@ -12,5 +23,324 @@ def connect():
         f"UID={os.getenv('USER')};"
         f"PWD={os.getenv('PASSWORD')};"
     )
-    
-    return conexion
\ No newline at end of file
+
+    return conexion
+
+# Conexión cuyos cursores miden cada sentencia (log de consultas lentas y perfilado)
+def conectar_instrumentada():
+    return diagnostico.ConexionInstrumentada(connect())
+
+# Error cuando no hay conexiones disponibles dentro del tiempo de espera
+class PoolAgotado(Exception):
+    pass
+
+# Pool acotado de conexiones a SQL Server
+class PoolConexiones:
+    def __init__(self, fabrica=connect, minimo=1, maximo=10, timeout=10.0,
+                 max_inactividad=300.0, verificar_tras=30.0):
+        self.fabrica = fabrica
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.max_inactividad = max_inactividad
+        self.verificar_tras = verificar_tras
+
+        self._libres = deque()  # (conexion, ultimo_uso)
+        self._total = 0
+        self._condicion = threading.Condition()
+
+        self.adquisiciones = 0
+        self.esperas_agotadas = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.descartadas = 0
+
+    def _crear(self):
+        try:
+            return self.fabrica()
+        except Exception:
+            with self._condicion:
+                self._total -= 1
+                self._condicion.notify()
+            raise
+
+    def _cerrar(self, conexion):
+        try:
+            conexion.close()
+        except Exception:
+            pass
+
+    def _sana(self, conexion):
+        try:
+            cursor = conexion.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    # Cierra las conexiones que llevan demasiado tiempo sin usarse (conservando el mínimo)
+    def _desalojar_inactivas(self, ahora):
+        desalojadas = []
+        while self._libres and self._total > self.minimo:
+            conexion, ultimo_uso = self._libres[0]
+            if ahora - ultimo_uso < self.max_inactividad:
+                break
+            self._libres.popleft()
+            self._total -= 1
+            desalojadas.append(conexion)
+        return desalojadas
+
+    def llenar(self):
+        while True:
+            with self._condicion:
+                if self._total >= self.minimo:
+                    return
+                self._total += 1
+            conexion = self._crear()
+            with self._condicion:
+                self._libres.append((conexion, time.monotonic()))
+                self._condicion.notify()
+
+    def obtener(self):
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+
+        while True:
+            conexion = None
+            ultimo_uso = None
+            crear = False
+
+            with self._condicion:
+                desalojadas = self._desalojar_inactivas(time.monotonic())
+
+                while not self._libres and self._total >= self.maximo:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self.esperas_agotadas += 1
+                        raise PoolAgotado(
+                            f"No hay conexiones disponibles después de {self.timeout} segundos"
+                        )
+                    self._condicion.wait(restante)
+
+                if self._libres:
+                    # LIFO: se reutiliza la conexión más reciente y las viejas quedan para desalojo
+                    conexion, ultimo_uso = self._libres.pop()
+                else:
+                    self._total += 1
+                    crear = True
+
+            for vieja in desalojadas:
+                self._cerrar(vieja)
+
+            if crear:
+                conexion = self._crear()
+            elif time.monotonic() - ultimo_uso >= self.verificar_tras and not self._sana(conexion):
+                self.descartar(conexion)
+                continue
+
+            espera = time.monotonic() - inicio
+            metricas.etapas.observar(espera, etapa="adquirir_conexion")
+            with self._condicion:
+                self.adquisiciones += 1
+                self.espera_total += espera
+                self.espera_maxima = max(self.espera_maxima, espera)
+            return conexion
+
+    def devolver(self, conexion):
+        try:
+            conexion.rollback()
+        except Exception:
+            self.descartar(conexion)
+            return
+
+        with self._condicion:
+            self._libres.append((conexion, time.monotonic()))
+            self._condicion.notify()
+
+    def descartar(self, conexion):
+        self._cerrar(conexion)
+        with self._condicion:
+            self._total -= 1
+            self.descartadas += 1
+            self._condicion.notify()
+
+    def cerrar(self):
+        with self._condicion:
+            libres = [conexion for conexion, _ in self._libres]
+            self._libres.clear()
+            self._total -= len(libres)
+        for conexion in libres:
+            self._cerrar(conexion)
+
+    def estadisticas(self):
+        with self._condicion:
+            return {
+                "tamano": self._total,
+                "libres": len(self._libres),
+                "en_uso": self._total - len(self._libres),
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "adquisiciones": self.adquisiciones,
+                "esperas_agotadas": self.esperas_agotadas,
+                "espera_promedio": self.espera_total / self.adquisiciones if self.adquisiciones else 0.0,
+                "espera_maxima": self.espera_maxima,
+                "descartadas": self.descartadas,
+            }
+
+pool = PoolConexiones(
+    fabrica=conectar_instrumentada,
+    minimo=int(os.getenv("DB_POOL_MIN", "1")),
+    maximo=int(os.getenv("DB_POOL_MAX", "10")),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    max_inactividad=float(os.getenv("DB_POOL_INACTIVIDAD", "300")),
+    verificar_tras=float(os.getenv("DB_POOL_VERIFICAR", "30")),
+)
+
+def _conexiones_pool():
+    estadisticas = pool.estadisticas()
+    return [(("libres",), estadisticas["libres"]), (("en_uso",), estadisticas["en_uso"])]
+
+metricas.Recolector("sea_pool_conexiones", "Conexiones del pool por estado", _conexiones_pool, ("estado",))
+metricas.Recolector("sea_pool_esperas_agotadas_total", "Veces que se agotó la espera por una conexión",
+                    lambda: pool.esperas_agotadas, tipo="counter")
+
+# Dependencia de FastAPI: presta una conexión del pool y siempre la devuelve
+def obtener_conexion():
+    conexion = pool.obtener()
+    try:
+        yield conexion
+    finally:
+        pool.devolver(conexion)
+
+# Hilos dedicados para el trabajo bloqueante de pyodbc desde rutas async,
+# del mismo tamaño que el pool para que cada hilo pueda tener su conexión
+class EjecutorBD:
+    def __init__(self, hilos):
+        self.hilos = hilos
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="bd")
+        self._candado = threading.Lock()
+
+        self.pendientes = 0
+        self.en_ejecucion = 0
+        self.tareas = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.ejecucion_total = 0.0
+
+    def _correr(self, encolada, funcion, args, kwargs):
+        inicio = time.monotonic()
+        espera = inicio - encolada
+        with self._candado:
+            self.pendientes -= 1
+            self.en_ejecucion += 1
+            self.tareas += 1
+            self.espera_total += espera
+            self.espera_maxima = max(self.espera_maxima, espera)
+        try:
+            return diagnostico.perfilado(funcion)(*args, **kwargs)
+        finally:
+            with self._candado:
+                self.en_ejecucion -= 1
+                self.ejecucion_total += time.monotonic() - inicio
+
+    async def ejecutar(self, funcion, *args, **kwargs):
+        with self._candado:
+            self.pendientes += 1
+        # Con el contexto de la petición (endpoint para el log de consultas lentas, perfil)
+        contexto = contextvars.copy_context()
+        tarea = functools.partial(contexto.run, self._correr, time.monotonic(), funcion, args, kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._ejecutor, tarea)
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=True)
+
+    def estadisticas(self):
+        with self._candado:
+            return {
+                "hilos": self.hilos,
+                "pendientes": self.pendientes,
+                "en_ejecucion": self.en_ejecucion,
+                "tareas": self.tareas,
+                "espera_promedio": self.espera_total / self.tareas if self.tareas else 0.0,
+                "espera_maxima": self.espera_maxima,
+                "ejecucion_promedio": self.ejecucion_total / self.tareas if self.tareas else 0.0,
+            }
+
+ejecutor_bd = EjecutorBD(pool.maximo)
+
+metricas.Recolector("sea_ejecutor_pendientes", "Tareas esperando un hilo del ejecutor de base de datos",
+                    lambda: ejecutor_bd.pendientes)
+
+# Los errores de la clase 08 (SQLSTATE) indican que la conexión se perdió
+def es_error_conexion(error):
+    return bool(error.args) and str(error.args[0]).startswith("08")
+
+# Conexión para consultas de solo lectura: si el servidor cierra la conexión,
+# se descarta y la consulta se repite con otra conexión del pool
+class ConexionLectura:
+    def __init__(self, pool, reintentos=1):
+        self.pool = pool
+        self.reintentos = reintentos
+        self.conexion = pool.obtener()
+
+    def cursor(self):
+        return CursorLectura(self)
+
+    def reconectar(self):
+        self.pool.descartar(self.conexion)
+        self.conexion = None
+        self.conexion = self.pool.obtener()
+
+    def devolver(self):
+        if self.conexion is not None:
+            self.pool.devolver(self.conexion)
+            self.conexion = None
+
+class CursorLectura:
+    def __init__(self, conexion):
+        self._conexion = conexion
+        self._cursor = conexion.conexion.cursor()
+
+    def execute(self, sql, *parametros):
+        intento = 0
+        while True:
+            try:
+                self._cursor.execute(sql, *parametros)
+                return self
+            except pyodbc.Error as e:
+                if intento >= self._conexion.reintentos or not es_error_conexion(e):
+                    raise
+                metricas.errores_bd.incrementar(operacion="conexion_perdida")
+                intento += 1
+                self._conexion.reconectar()
+                self._cursor = self._conexion.conexion.cursor()
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+@contextmanager
+def conexion_lectura():
+    conexion = ConexionLectura(pool)
+    try:
+        yield conexion
+    finally:
+        conexion.devolver()
+
+# Ejecuta una consulta de solo lectura y devuelve las filas como diccionarios
+def consultar(sql, *parametros):
+    with conexion_lectura() as conexion:
+        cursor = conexion.cursor()
+        try:
+            cursor.execute(sql, *parametros)
+            rows = cursor.fetchall()
+            with metricas.etapa("convertir_filas"):
+                return resultados.filas(cursor, sql, rows)
+        finally:
+            cursor.close()
+
+# Dependencia de FastAPI para endpoints de solo lectura (con reconexión transparente)
+def obtener_conexion_lectura():
+    with conexion_lectura() as conexion:
+        yield conexion
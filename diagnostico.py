@@ -0,0 +1,300 @@
+import cProfile
+import contextvars
+import functools
+import inspect
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from fastapi.routing import APIRoute
+import metricas
+
+log = logging.getLogger(__name__)
+
+# Consultas lentas: las sentencias que tardan más del umbral (ejecución + lectura de filas)
+# se escriben como una línea JSON, sin los valores de los parámetros
+UMBRAL_LENTA = float(os.getenv("CONSULTAS_LENTAS_MS", "500")) / 1000
+ARCHIVO_LENTAS = os.getenv("CONSULTAS_LENTAS_ARCHIVO")  # sin definir: al log (logger "diagnostico")
+
+# Perfilado por petición (apagado por defecto): PERFILADO=1 atiende la cabecera X-Perfilar
+# y PERFILADO_MUESTREO perfila al azar esa fracción de las peticiones
+PERFILADO = os.getenv("PERFILADO", "0") == "1"
+PERFILADO_MUESTREO = float(os.getenv("PERFILADO_MUESTREO", "0"))
+PERFILADO_DIRECTORIO = os.getenv("PERFILADO_DIRECTORIO", "perfiles")
+
+consultas_lentas = metricas.Contador("sea_consultas_lentas_total", "Sentencias SQL por encima de CONSULTAS_LENTAS_MS", ("endpoint",))
+
+# Petición en curso (el scope de ASGI) y su perfil, si se está perfilando; se propagan
+# a los hilos del threadpool y de ejecutor_bd con el contexto
+_peticion = contextvars.ContextVar("peticion", default=None)
+_perfil = contextvars.ContextVar("perfil", default=None)
+_candado_archivo = threading.Lock()
+
+def endpoint_actual():
+    scope = _peticion.get()
+    if scope is None:
+        return None
+    ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+    return f"{scope['method']} {ruta}"
+
+def _normalizar(sql):
+    return re.sub(r"\s+", " ", sql).strip()[:2000]
+
+def _escribir_lenta(registro):
+    linea = json.dumps(registro, ensure_ascii=False, default=str)
+    if not ARCHIVO_LENTAS:
+        log.warning("%s", linea)
+        return
+    with _candado_archivo, open(ARCHIVO_LENTAS, "a", encoding="utf-8") as archivo:
+        archivo.write(linea + "\n")
+
+def _terminada(sql, parametros, duracion, filas, error=None):
+    endpoint = endpoint_actual()
+    perfil = _perfil.get()
+    if perfil is not None:
+        perfil.consulta(sql, duracion, filas, error)
+    if duracion >= UMBRAL_LENTA:
+        consultas_lentas.incrementar(endpoint=endpoint or "")
+        _escribir_lenta({
+            "fecha": datetime.now().isoformat(timespec="milliseconds"),
+            "endpoint": endpoint,
+            "sql": _normalizar(sql),
+            "parametros": parametros,
+            "duracion_ms": round(duracion * 1000, 2),
+            "filas": filas,
+            "error": error,
+        })
+
+# Cursor de pyodbc que mide cada sentencia: el tiempo de execute más el de leer sus filas.
+# La sentencia se registra al ejecutar la siguiente o al cerrar el cursor.
+class CursorInstrumentado:
+    def __init__(self, cursor):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_sentencia", None)  # [sql, parametros, duracion, filas]
+
+    def _terminar(self):
+        sentencia = self._sentencia
+        if sentencia is not None:
+            object.__setattr__(self, "_sentencia", None)
+            _terminada(*sentencia)
+
+    def _medir(self, funcion, *args):
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args)
+        finally:
+            if self._sentencia is not None:
+                self._sentencia[2] += time.perf_counter() - inicio
+
+    def execute(self, sql, *parametros):
+        self._terminar()
+        inicio = time.perf_counter()
+        try:
+            self._cursor.execute(sql, *parametros)
+        except Exception as e:
+            _terminada(sql, len(parametros), time.perf_counter() - inicio, 0, type(e).__name__)
+            raise
+        object.__setattr__(self, "_sentencia", [sql, len(parametros), time.perf_counter() - inicio, 0])
+        return self
+
+    def executemany(self, sql, filas):
+        self._terminar()
+        filas = list(filas)
+        inicio = time.perf_counter()
+        error = None
+        try:
+            self._cursor.executemany(sql, filas)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _terminada(sql, len(filas[0]) if filas else 0, time.perf_counter() - inicio, len(filas), error)
+
+    def _contar(self, cantidad):
+        if self._sentencia is not None:
+            self._sentencia[3] += cantidad
+
+    def fetchone(self):
+        fila = self._medir(self._cursor.fetchone)
+        self._contar(fila is not None)
+        return fila
+
+    def fetchall(self):
+        filas = self._medir(self._cursor.fetchall)
+        self._contar(len(filas))
+        return filas
+
+    def fetchmany(self, cantidad):
+        filas = self._medir(self._cursor.fetchmany, cantidad)
+        self._contar(len(filas))
+        return filas
+
+    def nextset(self):
+        return self._medir(self._cursor.nextset)
+
+    def close(self):
+        self._terminar()
+        self._cursor.close()
+
+    def __del__(self):
+        try:
+            self._terminar()
+        except Exception:
+            pass
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def __setattr__(self, nombre, valor):
+        setattr(self._cursor, nombre, valor)
+
+class ConexionInstrumentada:
+    def __init__(self, conexion):
+        self._conexion = conexion
+
+    def cursor(self):
+        return CursorInstrumentado(self._conexion.cursor())
+
+    def __getattr__(self, nombre):
+        return getattr(self._conexion, nombre)
+
+# Perfil de una petición: cProfile del hilo del event loop y de los hilos que trabajan
+# para ella (endpoints síncronos, ejecutor_bd, subidas), más la lista de sentencias SQL.
+# Desde Python 3.12 cProfile usa sys.monitoring: admite un solo perfilador activo en el
+# proceso, pero ese ya ve todos los hilos, así que los perfiles de hilo se omiten.
+class Perfil:
+    def __init__(self, scope):
+        self.nombre = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.scope = scope
+        self.perfiles = []
+        self.consultas = []
+        self.omitidos = 0  # perfiles que no se pudieron activar (ya había uno activo)
+        self._candado = threading.Lock()
+
+    def consulta(self, sql, duracion, filas, error):
+        with self._candado:
+            self.consultas.append((_normalizar(sql)[:200], duracion, filas, error))
+
+    @contextmanager
+    def medir(self):
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # "Another profiling tool is already active" (3.12+, u otra herramienta como un
+            # depurador): la petición sigue sin este perfil
+            perfil = None
+        try:
+            yield
+        finally:
+            with self._candado:
+                if perfil is None:
+                    self.omitidos += 1
+                else:
+                    perfil.disable()
+                    self.perfiles.append(perfil)
+
+    def guardar(self, duracion):
+        os.makedirs(PERFILADO_DIRECTORIO, exist_ok=True)
+        ruta = os.path.join(PERFILADO_DIRECTORIO, self.nombre)
+        estadisticas = pstats.Stats(*self.perfiles)
+        estadisticas.dump_stats(f"{ruta}.prof")
+
+        texto = io.StringIO()
+        texto.write(f"{self.scope['method']} {getattr(self.scope.get('route'), 'path', self.scope['path'])}\n")
+        texto.write(f"Duración: {duracion * 1000:.1f} ms\n")
+        tiempo_sql = sum(consulta[1] for consulta in self.consultas)
+        texto.write(f"SQL: {len(self.consultas)} sentencias, {tiempo_sql * 1000:.1f} ms\n")
+        if self.omitidos:
+            texto.write(f"Perfiles omitidos (ya había un perfilador activo): {self.omitidos}\n")
+        texto.write("\n")
+        for sql, duracion_sql, filas, error in self.consultas:
+            texto.write(f"  {duracion_sql * 1000:8.1f} ms {filas:6} filas  {sql}{f'  [{error}]' if error else ''}\n")
+        texto.write("\n")
+        pstats.Stats(*self.perfiles, stream=texto).sort_stats("cumulative").print_stats(40)
+        with open(f"{ruta}.txt", "w", encoding="utf-8") as archivo:
+            archivo.write(texto.getvalue())
+
+# Ejecuta la función perfilando el hilo actual si la petición que la originó se está perfilando
+def perfilado(funcion):
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        perfil = _perfil.get()
+        if perfil is None:
+            return funcion(*args, **kwargs)
+        with perfil.medir():
+            return funcion(*args, **kwargs)
+    return envoltura
+
+# Ruta de FastAPI cuyos endpoints síncronos (los que corren en el threadpool) se perfilan
+# dentro del hilo que los ejecuta; sin esto el perfil solo vería el event loop
+class RutaPerfilada(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint) and not inspect.isasyncgenfunction(endpoint):
+            endpoint = perfilado(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+def ruta_perfil(nombre):
+    if not re.fullmatch(r"[0-9]{8}-[0-9]{6}-[0-9a-f]{8}", nombre):
+        return None
+    ruta = os.path.join(PERFILADO_DIRECTORIO, f"{nombre}.txt")
+    return ruta if os.path.isfile(ruta) else None
+
+# Middleware ASGI: guarda la petición en el contexto (para el log de consultas lentas) y,
+# si corresponde, la perfila. Solo se perfila una petición a la vez; el perfil del event loop
+# también incluye lo que hagan otras peticiones en ese intervalo. La respuesta lleva la
+# cabecera X-Perfil con el nombre del perfil (GET /admin/perfiles/{nombre}).
+class Diagnostico:
+    def __init__(self, app):
+        self.app = app
+        self._perfilando = threading.Lock()
+
+    def _perfilar(self, scope):
+        if PERFILADO and any(nombre == b"x-perfilar" for nombre, _ in scope.get("headers", ())):
+            return True
+        return PERFILADO_MUESTREO > 0 and random.random() < PERFILADO_MUESTREO
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _peticion.set(scope)
+        try:
+            if not self._perfilar(scope) or not self._perfilando.acquire(blocking=False):
+                await self.app(scope, receive, send)
+                return
+            try:
+                await self._perfilada(scope, receive, send)
+            finally:
+                self._perfilando.release()
+        finally:
+            _peticion.reset(token)
+
+    async def _perfilada(self, scope, receive, send):
+        perfil = Perfil(scope)
+        token = _perfil.set(perfil)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                mensaje = dict(mensaje, headers=list(mensaje.get("headers", [])) + [(b"x-perfil", perfil.nombre.encode())])
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        try:
+            with perfil.medir():
+                await self.app(scope, receive, enviar)
+        finally:
+            _perfil.reset(token)
+            try:
+                perfil.guardar(time.perf_counter() - inicio)
+            except OSError as e:
+                log.warning("No se pudo guardar el perfil %s: %s", perfil.nombre, e)
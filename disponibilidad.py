@@ -0,0 +1,134 @@
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+INTERVALO = float(os.getenv("DISPONIBILIDAD_INTERVALO", "300"))
+
+def _clave(ruta):
+    return os.path.normcase(os.path.abspath(ruta))
+
+# Índice en memoria de los archivos presentes en el almacén. Las subidas y eliminaciones
+# de este worker lo mantienen al día, las rutas que no están se confirman en el disco (las
+# de otros workers) y un reconciliador periódico lo reconstruye recorriendo el directorio
+# con os.scandir, por si algo se eliminó por fuera de este proceso.
+class IndiceDisponibilidad:
+    def __init__(self, raiz, ignorar=("tmp",)):
+        self.raiz = raiz
+        self._raiz = _clave(raiz)
+        self.ignorar = set(ignorar)
+        self._rutas = None  # None hasta la primera reconciliación
+        self._cambios = None  # cambios ocurridos durante una reconciliación en curso
+        self._candado = threading.Lock()
+        self._reconciliando = threading.Lock()
+        self._detener = threading.Event()
+
+        self.reconciliado_en = None
+        self.duracion = None
+        self.consultas = 0
+        self.respaldos = 0
+
+    def _dentro(self, clave):
+        try:
+            return os.path.commonpath([self._raiz, clave]) == self._raiz
+        except ValueError:
+            # Rutas en otra unidad (Windows)
+            return False
+
+    def _aplicar(self, rutas, clave, presente):
+        if presente:
+            rutas.add(clave)
+        else:
+            rutas.discard(clave)
+
+    def _registrar(self, ruta, presente):
+        clave = _clave(ruta)
+        with self._candado:
+            if self._rutas is not None:
+                self._aplicar(self._rutas, clave, presente)
+            if self._cambios is not None:
+                self._cambios.append((clave, presente))
+
+    def marcar(self, ruta):
+        self._registrar(ruta, True)
+
+    def desmarcar(self, ruta):
+        self._registrar(ruta, False)
+
+    # Un acierto se responde desde memoria. Un fallo se confirma en el disco, porque el índice
+    # es de este worker y el archivo pudo subirse por otro; si existe, se agrega al índice.
+    def contiene(self, ruta):
+        if not ruta:
+            return False
+        clave = _clave(ruta)
+        with self._candado:
+            self.consultas += 1
+            indexado = self._rutas is not None and self._dentro(clave)
+            if indexado and clave in self._rutas:
+                return True
+            self.respaldos += 1
+        presente = os.path.isfile(ruta)
+        if presente and indexado:
+            self._registrar(ruta, True)
+        return presente
+
+    def _recorrer(self, directorio, rutas):
+        with os.scandir(directorio) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    if entrada.name not in self.ignorar:
+                        self._recorrer(entrada.path, rutas)
+                elif entrada.is_file() and not entrada.name.endswith((".refs", ".part")):
+                    rutas.add(_clave(entrada.path))
+
+    def reconciliar(self):
+        with self._reconciliando:
+            inicio = time.monotonic()
+            with self._candado:
+                self._cambios = []
+            rutas = set()
+            try:
+                if os.path.isdir(self.raiz):
+                    self._recorrer(self.raiz, rutas)
+            except BaseException:
+                with self._candado:
+                    self._cambios = None
+                raise
+            with self._candado:
+                # Las subidas y eliminaciones que pasaron durante el recorrido
+                for clave, presente in self._cambios:
+                    self._aplicar(rutas, clave, presente)
+                self._cambios = None
+                self._rutas = rutas
+            self.reconciliado_en = time.time()
+            self.duracion = time.monotonic() - inicio
+
+    def _ciclo(self, intervalo):
+        while True:
+            try:
+                self.reconciliar()
+            except OSError as e:
+                log.warning("No se pudo reconciliar el índice de documentos: %s", e)
+            if self._detener.wait(intervalo):
+                return
+
+    # Primera reconciliación en segundo plano y luego una cada intervalo
+    def iniciar(self, intervalo=INTERVALO):
+        self._detener.clear()
+        threading.Thread(target=self._ciclo, args=(intervalo,), daemon=True).start()
+
+    def detener(self):
+        self._detener.set()
+
+    def estadisticas(self):
+        with self._candado:
+            return {
+                "archivos": len(self._rutas) if self._rutas is not None else None,
+                "reconciliado_en": self.reconciliado_en,
+                "duracion": self.duracion,
+                "consultas": self.consultas,
+                "respaldos": self.respaldos,
+                "intervalo": INTERVALO,
+            }
@@ -0,0 +1,100 @@
+import os
+import threading
+from cache import CacheTTL
+from db import consultar
+
+# Cada entrada guarda el mtime del archivo al consultarla y se revisa contra el disco en cada
+# acierto (un stat, sin ir a la base de datos): si el archivo cambió o ya no está (por ejemplo,
+# otro worker lo archivó y cambió RutaArchivo) se vuelve a consultar. El TTL solo acota
+# entradas olvidadas.
+cache_documentos = CacheTTL(
+    ttl=float(os.getenv("DOCUMENTOS_TTL", "3600")),
+    maximo=int(os.getenv("DOCUMENTOS_MAX", "10000")),
+    nombre="documentos",
+)
+
+# Consulta en curso para un documento; las peticiones simultáneas esperan su resultado
+class _Consulta:
+    def __init__(self):
+        self.terminada = threading.Event()
+        self.resultado = None
+        self.error = None
+
+_en_curso = {}
+_candado = threading.Lock()
+
+# mtime de la ruta registrada (la fría, si está archivado: no se restaura para esto)
+def _mtime(ruta):
+    try:
+        return os.stat(ruta).st_mtime if ruta else None
+    except OSError:
+        return None
+
+def _consultar(documento_id):
+    filas = consultar("""
+        SELECT IdAlumno, NombreArchivo, RutaArchivo, TamanoArchivo, FechaSubida
+        FROM sea.Documentos 
+        WHERE Id = ?
+    """, documento_id)
+    if not filas:
+        return None
+
+    fila = filas[0]
+    return {
+        "id_alumno": fila["IdAlumno"],
+        "nombre_archivo": fila["NombreArchivo"],
+        "ruta_archivo": fila["RutaArchivo"],
+        "tamano_archivo": fila["TamanoArchivo"],
+        "fecha_subida": fila["FechaSubida"],
+        "mtime": _mtime(fila["RutaArchivo"]),
+    }
+
+# Metadatos de un documento por Id (None si no existe). Las peticiones simultáneas
+# por el mismo Id comparten una sola consulta a la base de datos.
+def buscar(documento_id):
+    encontrado, documento = cache_documentos.buscar(documento_id)
+    if encontrado:
+        if documento["mtime"] == _mtime(documento["ruta_archivo"]):
+            return documento
+        cache_documentos.invalidar(documento_id)
+
+    with _candado:
+        consulta = _en_curso.get(documento_id)
+        propia = consulta is None
+        if propia:
+            consulta = _Consulta()
+            _en_curso[documento_id] = consulta
+
+    if not propia:
+        consulta.terminada.wait()
+        if consulta.error is not None:
+            raise consulta.error
+        return consulta.resultado
+
+    try:
+        consulta.resultado = _consultar(documento_id)
+        # Los que no existen no se guardan: pueden registrarse después
+        if consulta.resultado is not None:
+            cache_documentos.guardar(documento_id, consulta.resultado)
+        return consulta.resultado
+    except Exception as e:
+        consulta.error = e
+        raise
+    finally:
+        with _candado:
+            del _en_curso[documento_id]
+        consulta.terminada.set()
+
+# Se llama al insertar/actualizar un alumno, ya que sus documentos pueden haber cambiado
+def invalidar_alumno(id_alumno):
+    id_alumno = str(id_alumno).lower()
+    cache_documentos.invalidar_si(lambda documento: str(documento["id_alumno"]).lower() == id_alumno)
+
+# Se llama al archivar un documento: su RutaArchivo cambió
+def invalidar_ruta(ruta):
+    cache_documentos.invalidar_si(lambda documento: documento["ruta_archivo"] == ruta)
+
+def estadisticas():
+    estado = cache_documentos.estadisticas()
+    estado["en_curso"] = len(_en_curso)
+    return estado
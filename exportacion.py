@@ -0,0 +1,98 @@
+import os
+import zipfile
+from datetime import datetime
+from almacenamiento import almacen
+import resultados
+
+# Exportación en zip de los documentos de uno o varios alumnos. El zip se arma mientras se
+# envía: cada PDF se lee por bloques y se guarda sin comprimir (ya vienen comprimidos), así
+# que la memoria no depende del tamaño del archivo. Al final va indice.json con los metadatos
+# de cada documento, incluidos los que no se encontraron en el almacén.
+BLOQUE = int(os.getenv("EXPORTACION_BLOQUE", str(256 * 1024)))
+INDICE = "indice.json"
+
+# Destino de zipfile sin posicionamiento (se escriben descriptores de datos después de
+# cada archivo): lo escrito se acumula hasta que el generador lo entrega
+class _Salida:
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self.partes)
+        self.partes.clear()
+        return datos
+
+def _nombre_seguro(nombre):
+    nombre = os.path.basename(str(nombre or "").replace("\\", "/")).strip()
+    return nombre or "documento.pdf"
+
+# Dos documentos con el mismo nombre en la misma carpeta: "acta (2).pdf"
+def _unico(nombre, usados):
+    base, extension = os.path.splitext(nombre)
+    candidato = nombre
+    numero = 2
+    while candidato.lower() in usados:
+        candidato = f"{base} ({numero}){extension}"
+        numero += 1
+    usados.add(candidato.lower())
+    return candidato
+
+# El formato zip no admite fechas anteriores a 1980
+def _fecha(fecha_subida):
+    if not isinstance(fecha_subida, datetime) or fecha_subida.year < 1980:
+        fecha_subida = datetime.now()
+    return fecha_subida.timetuple()[:6]
+
+# Genera el zip por partes. por_alumno: {id_alumno: [documento]} como lo devuelve
+# consultar_documentos; con carpetas, los documentos de cada alumno van en {id_alumno}/
+def zip_documentos(por_alumno, carpetas=False):
+    salida = _Salida()
+    indice = []
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_STORED) as archivo_zip:
+        for id_alumno, documentos in por_alumno.items():
+            usados = set() if carpetas else {INDICE}
+            for documento in documentos:
+                nombre = _unico(_nombre_seguro(documento["NombreArchivo"]), usados)
+                if carpetas:
+                    nombre = f"{id_alumno}/{nombre}"
+                entrada = {
+                    "id": documento["Id"],
+                    "id_alumno": id_alumno,
+                    "nombre_archivo": documento["NombreArchivo"],
+                    "tamano_archivo": documento["TamanoArchivo"],
+                    "fecha_subida": documento["FechaSubida"],
+                    "archivo": nombre,
+                }
+                indice.append(entrada)
+
+                ruta = almacen.resolver(documento["RutaArchivo"])
+                try:
+                    origen = open(ruta, "rb") if ruta else None
+                except OSError:
+                    origen = None
+                if origen is None:
+                    entrada["archivo"] = None
+                    entrada["error"] = "Archivo no encontrado en el sistema"
+                    continue
+
+                with origen:
+                    info = zipfile.ZipInfo(nombre, _fecha(documento["FechaSubida"]))
+                    # Con el tamaño por adelantado zipfile decide si necesita ZIP64
+                    info.file_size = os.fstat(origen.fileno()).st_size
+                    with archivo_zip.open(info, "w") as destino:
+                        while bloque := origen.read(BLOQUE):
+                            destino.write(bloque)
+                            yield salida.vaciar()
+                datos = salida.vaciar()
+                if datos:
+                    yield datos
+
+        archivo_zip.writestr(zipfile.ZipInfo(INDICE, _fecha(None)), resultados.codificar(indice))
+    yield salida.vaciar()
@@ -0,0 +1,81 @@
+import asyncio
+import hashlib
+import os
+from fastapi import HTTPException
+from cache import CacheTTL
+import subidas
+
+# Supresión de envíos repetidos: una petición con la misma clave que otra en curso espera
+# su resultado, y las que llegan después reciben la respuesta guardada durante TTL segundos.
+# Vive en la memoria del proceso (cada worker de uvicorn tiene la suya): un reenvío que llega
+# a otro worker, en curso o ya terminado, no se reconoce.
+TTL = float(os.getenv("IDEMPOTENCIA_TTL", "600"))
+
+completadas = CacheTTL(ttl=TTL, maximo=int(os.getenv("IDEMPOTENCIA_MAX", "10000")), nombre="idempotencia")
+_en_curso = {}  # clave -> (huella, futuro); solo se usa desde el event loop
+
+# Resumen de los datos enviados: campos validados del formulario y nombre y SHA-256 del
+# contenido de cada documento, para que un PDF corregido del mismo tamaño no pase por
+# reenvío. Lee los archivos recibidos: desde rutas async se llama en el threadpool.
+def huella(alumno, documentos):
+    resumen = hashlib.sha256(alumno.model_dump_json().encode())
+    for documento in documentos:
+        contenido = hashlib.sha256()
+        documento.file.seek(0)
+        while True:
+            bloque = documento.file.read(subidas.TAMANO_BLOQUE)
+            if not bloque:
+                break
+            contenido.update(bloque)
+        documento.file.seek(0)
+        resumen.update(f"\0{documento.filename}\0{contenido.hexdigest()}".encode())
+    return resumen.hexdigest()
+
+# Con la cabecera Idempotency-Key se usa esa clave; sin ella, la CURP más la huella
+def clave(operacion, idempotency_key, curp, huella_datos):
+    if idempotency_key:
+        return f"{operacion}:clave:{idempotency_key}"
+    return f"{operacion}:curp:{curp}:{huella_datos}"
+
+def _verificar(huella_datos, huella_original):
+    if huella_datos != huella_original:
+        raise HTTPException(status_code=422, detail="La Idempotency-Key ya se usó con otros datos")
+
+# Solo se guardan las respuestas exitosas; después de un error se puede reintentar
+def _exitosa(resultado):
+    return isinstance(resultado, dict) and "error" not in resultado
+
+async def ejecutar_una_vez(clave_peticion, huella_datos, respuesta, funcion):
+    encontrado, guardado = completadas.buscar(clave_peticion)
+    if encontrado:
+        huella_original, resultado = guardado
+        _verificar(huella_datos, huella_original)
+        respuesta.headers["Idempotent-Replayed"] = "true"
+        return resultado
+
+    en_curso = _en_curso.get(clave_peticion)
+    if en_curso is not None:
+        huella_original, futuro = en_curso
+        _verificar(huella_datos, huella_original)
+        resultado = await asyncio.shield(futuro)
+        respuesta.headers["Idempotent-Replayed"] = "true"
+        return resultado
+
+    futuro = asyncio.get_running_loop().create_future()
+    _en_curso[clave_peticion] = (huella_datos, futuro)
+    try:
+        resultado = await funcion()
+    except asyncio.CancelledError:
+        futuro.cancel()
+        raise
+    except BaseException as e:
+        futuro.set_exception(e)
+        futuro.exception()  # ya se propaga aquí; evita el aviso si nadie más esperaba
+        raise
+    else:
+        futuro.set_result(resultado)
+        if _exitosa(resultado):
+            completadas.guardar(clave_peticion, (huella_datos, resultado))
+        return resultado
+    finally:
+        _en_curso.pop(clave_peticion, None)
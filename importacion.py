@@ -0,0 +1,322 @@
+import csv
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from typing import List
+import pyodbc
+from pydantic import Field, ValidationError
+from db import pool
+import subidas
+import metricas
+import documentos as metadatos_documentos
+import alumnos as cache_alumnos
+from registro import Alumno, PROCEDIMIENTO_INSERTAR, datos_alumno, ejecutar_con_documentos
+
+log = logging.getLogger(__name__)
+
+LOTE = int(os.getenv("IMPORTACION_LOTE", "50"))
+MAX_IMPORTACION = int(os.getenv("IMPORTACION_MAX", str(2 * 1024 * 1024 * 1024)))
+MAX_TRABAJOS = int(os.getenv("IMPORTACION_MAX_TRABAJOS", "100"))
+DIRECTORIO = os.getenv("IMPORTACION_DIRECTORIO", "uploads/importaciones")
+# El estado de cada trabajo se escribe en DIRECTORIO/estados/{id}.json (como mucho cada
+# ESTADO_INTERVALO segundos mientras avanza) para que cualquier worker pueda responder su
+# avance, no solo el que lo procesa. Con varios servidores, DIRECTORIO debe ser compartido.
+DIRECTORIO_ESTADOS = os.path.join(DIRECTORIO, "estados")
+ESTADO_INTERVALO = float(os.getenv("IMPORTACION_ESTADO_INTERVALO", "1"))
+
+subidas.LIMITES_POR_RUTA["/alumnos/importar"] = MAX_IMPORTACION
+
+# Mismas restricciones que el formulario de /alumnos/insertar;
+# documentos: nombres de los PDF dentro del zip (en CSV separados por ";")
+class RegistroImportacion(Alumno):
+    documentos: List[str] = Field(default_factory=list)
+
+class Trabajo:
+    def __init__(self, lote):
+        self.id = str(uuid.uuid4())
+        self.lote = lote
+        self.estado = "pendiente"
+        self.error = None
+        self.procesados = 0
+        self.insertados = 0
+        self.fallidos = 0
+        self.resultados = []
+        self.creado_en = time.time()
+        self.terminado_en = None
+        self._candado = threading.Lock()
+        self._guardado = 0.0
+
+    def cambiar_estado(self, estado, error=None):
+        self.estado = estado
+        if error is not None:
+            self.error = error
+        if estado in ("terminado", "fallido"):
+            self.terminado_en = time.time()
+        self.guardar(forzar=True)
+
+    # Escribe el estado completo para los demás workers; sin forzar, como mucho cada
+    # ESTADO_INTERVALO segundos
+    def guardar(self, forzar=False):
+        ahora = time.monotonic()
+        if not forzar and ahora - self._guardado < ESTADO_INTERVALO:
+            return
+        self._guardado = ahora
+        ruta = _ruta_estado(self.id)
+        temporal = f"{ruta}.{uuid.uuid4().hex}.part"
+        try:
+            os.makedirs(DIRECTORIO_ESTADOS, exist_ok=True)
+            with open(temporal, "w", encoding="utf-8") as archivo:
+                json.dump(self.resumen(0), archivo, ensure_ascii=False, default=str)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            log.warning("No se pudo guardar el estado de la importación %s: %s", self.id, e)
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+
+    def registrar(self, fila, curp, estado, detalle=None):
+        with self._candado:
+            self.procesados += 1
+            if estado == "insertado":
+                self.insertados += 1
+            else:
+                self.fallidos += 1
+            self.resultados.append({"fila": fila, "curp": curp, "estado": estado, "detalle": detalle})
+        self.guardar()
+
+    def resumen(self, desde=None):
+        with self._candado:
+            estado = {
+                "id": self.id,
+                "estado": self.estado,
+                "error": self.error,
+                "lote": self.lote,
+                "procesados": self.procesados,
+                "insertados": self.insertados,
+                "fallidos": self.fallidos,
+                "creado_en": self.creado_en,
+                "terminado_en": self.terminado_en,
+            }
+            if desde is not None:
+                estado["resultados"] = self.resultados[desde:]
+            return estado
+
+# Trabajo que procesa otro worker, tal como lo dejó en su archivo de estado
+class TrabajoGuardado:
+    def __init__(self, estado):
+        self.estado = estado
+
+    def resumen(self, desde=None):
+        estado = dict(self.estado)
+        resultados = estado.pop("resultados", [])
+        if desde is not None:
+            estado["resultados"] = resultados[desde:]
+        return estado
+
+_trabajos = OrderedDict()
+_candado = threading.Lock()
+
+def _ruta_estado(trabajo_id):
+    return os.path.join(DIRECTORIO_ESTADOS, f"{trabajo_id}.json")
+
+def _leer_estado(ruta):
+    try:
+        with open(ruta, "rb") as archivo:
+            return json.loads(archivo.read())
+    except (OSError, ValueError):
+        return None
+
+# Se eliminan los archivos de estado de los trabajos terminados más antiguos
+def _podar_estados():
+    try:
+        with os.scandir(DIRECTORIO_ESTADOS) as entradas:
+            archivos = sorted(
+                (entrada.stat().st_mtime, entrada.path) for entrada in entradas if entrada.name.endswith(".json")
+            )
+    except OSError:
+        return
+    for _, ruta in archivos[:-MAX_TRABAJOS]:
+        estado = _leer_estado(ruta)
+        if estado is None or estado.get("terminado_en") is not None:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+def crear_trabajo(lote=LOTE):
+    trabajo = Trabajo(lote)
+    with _candado:
+        _trabajos[trabajo.id] = trabajo
+        # Se olvidan los trabajos terminados más antiguos
+        for trabajo_id in list(_trabajos):
+            if len(_trabajos) <= MAX_TRABAJOS:
+                break
+            if _trabajos[trabajo_id].terminado_en is not None:
+                del _trabajos[trabajo_id]
+    trabajo.guardar(forzar=True)
+    _podar_estados()
+    return trabajo
+
+# El trabajo de este worker o, si lo procesa otro, su último estado guardado
+def obtener_trabajo(trabajo_id):
+    with _candado:
+        trabajo = _trabajos.get(trabajo_id)
+    if trabajo is not None:
+        return trabajo
+    try:
+        trabajo_id = str(uuid.UUID(trabajo_id))
+    except ValueError:
+        return None
+    estado = _leer_estado(_ruta_estado(trabajo_id))
+    return TrabajoGuardado(estado) if estado is not None else None
+
+def formato(nombre_archivo):
+    extension = os.path.splitext(nombre_archivo or "")[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".ndjson", ".jsonl"):
+        return "ndjson"
+    return None
+
+# Copia un archivo subido al directorio del trabajo (bloqueante, se llama en el threadpool)
+def guardar_archivo(flujo, trabajo, nombre):
+    directorio = os.path.join(DIRECTORIO, trabajo.id)
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, nombre)
+    flujo.seek(0)
+    with open(ruta, "wb") as destino:
+        shutil.copyfileobj(flujo, destino, subidas.TAMANO_BLOQUE)
+    return ruta
+
+# Registros uno a uno (sin cargar el archivo completo): (fila, dict) o (fila, error)
+def leer_registros(ruta, formato_registros):
+    with open(ruta, newline="", encoding="utf-8-sig") as archivo:
+        if formato_registros == "csv":
+            for fila, registro in enumerate(csv.DictReader(archivo), start=2):
+                # Las celdas vacías cuentan como no enviadas
+                registro = {campo: valor for campo, valor in registro.items() if campo and valor not in ("", None)}
+                if "documentos" in registro:
+                    registro["documentos"] = [nombre.strip() for nombre in registro["documentos"].split(";") if nombre.strip()]
+                yield fila, registro
+        else:
+            for fila, linea in enumerate(archivo, start=1):
+                if not linea.strip():
+                    continue
+                try:
+                    yield fila, json.loads(linea)
+                except ValueError as e:
+                    yield fila, e
+
+def _errores(error):
+    if isinstance(error, ValidationError):
+        return [f"{'.'.join(str(parte) for parte in detalle['loc'])}: {detalle['msg']}" for detalle in error.errors()]
+    return [str(error)]
+
+# Guarda en el almacén los PDF del alumno que vienen en el zip
+def _guardar_documentos(zip_documentos, nombres):
+    documentos_info = []
+    try:
+        for nombre in nombres:
+            if not nombre.lower().endswith(".pdf"):
+                raise ValueError(f"El archivo {nombre} debe ser un PDF")
+            if zip_documentos is None:
+                raise ValueError(f"No se envió el zip de documentos ({nombre})")
+            try:
+                info = zip_documentos.getinfo(nombre)
+            except KeyError:
+                raise ValueError(f"El archivo {nombre} no está en el zip")
+            with zip_documentos.open(info) as flujo:
+                documentos_info.append(subidas.guardar_flujo(flujo, os.path.basename(nombre)))
+    except BaseException:
+        subidas.liberar(documentos_info)
+        raise
+    return documentos_info
+
+def _insertado(trabajo, fila, alumno, resultado):
+    if alumno.id:
+        metadatos_documentos.invalidar_alumno(alumno.id)
+    cache_alumnos.invalidar_escritura(alumno, resultado)
+    trabajo.registrar(fila, alumno.curp, "insertado", resultado)
+
+# Inserta un lote en una sola transacción; si falla, se repite fila por fila
+# (cada una con su commit) para saber qué registros no se pudieron insertar
+def _insertar_lote(trabajo, pendientes):
+    conexion = pool.obtener()
+    try:
+        try:
+            resultados = [
+                ejecutar_con_documentos(conexion, PROCEDIMIENTO_INSERTAR, datos, documentos_info, confirmar=False)
+                for _, _, datos, documentos_info in pendientes
+            ]
+            conexion.commit()
+        except pyodbc.Error:
+            conexion.rollback()
+        else:
+            for (fila, alumno, _, _), resultado in zip(pendientes, resultados):
+                _insertado(trabajo, fila, alumno, resultado)
+            return
+
+        for fila, alumno, datos, documentos_info in pendientes:
+            try:
+                resultado = ejecutar_con_documentos(conexion, PROCEDIMIENTO_INSERTAR, datos, documentos_info)
+            except pyodbc.Error as e:
+                conexion.rollback()
+                metricas.errores_bd.incrementar(operacion="InsertarAlumno")
+                subidas.liberar(documentos_info)
+                trabajo.registrar(fila, alumno.curp, "error", [f"Error de base de datos: {e}"])
+            else:
+                _insertado(trabajo, fila, alumno, resultado)
+    finally:
+        pool.devolver(conexion)
+
+# La importación no llegó a empezar (error al recibir los archivos)
+def procesar_fallido(trabajo, error):
+    shutil.rmtree(os.path.join(DIRECTORIO, trabajo.id), ignore_errors=True)
+    trabajo.cambiar_estado("fallido", str(getattr(error, "detail", error)))
+
+# Procesa la importación en segundo plano: valida cada registro, guarda sus documentos
+# y los inserta en lotes de trabajo.lote alumnos por transacción
+def procesar(trabajo, ruta_registros, formato_registros, ruta_zip=None):
+    trabajo.cambiar_estado("en_proceso")
+    zip_documentos = None
+    pendientes = []
+    try:
+        if ruta_zip:
+            zip_documentos = zipfile.ZipFile(ruta_zip)
+
+        for fila, registro in leer_registros(ruta_registros, formato_registros):
+            curp = registro.get("curp") if isinstance(registro, dict) else None
+            try:
+                if isinstance(registro, Exception):
+                    raise registro
+                alumno = RegistroImportacion.model_validate(registro)
+                datos = datos_alumno(alumno)
+                documentos_info = _guardar_documentos(zip_documentos, alumno.documentos)
+            except (ValidationError, ValueError, subidas.ArchivoRechazado) as e:
+                trabajo.registrar(fila, curp, "error", _errores(e))
+                continue
+
+            pendientes.append((fila, alumno, datos, documentos_info))
+            if len(pendientes) >= trabajo.lote:
+                _insertar_lote(trabajo, pendientes)
+                pendientes = []
+
+        if pendientes:
+            _insertar_lote(trabajo, pendientes)
+        estado, error = "terminado", None
+    except Exception as e:
+        for _, _, _, documentos_info in pendientes:
+            subidas.liberar(documentos_info)
+        estado, error = "fallido", str(e)
+    finally:
+        if zip_documentos is not None:
+            zip_documentos.close()
+        shutil.rmtree(os.path.join(DIRECTORIO, trabajo.id), ignore_errors=True)
+    trabajo.cambiar_estado(estado, error)
@@ -0,0 +1,174 @@
+import heapq
+import logging
+import os
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from db import consultar
+
+log = logging.getLogger(__name__)
+
+CAMPO_NOMBRE = "NombreLocalidad"
+CAMPO_MUNICIPIO = os.getenv("LOCALIDADES_CAMPO_MUNICIPIO", "NombreMunicipio")
+REFRESCO = float(os.getenv("LOCALIDADES_REFRESCO", "3600"))
+
+# Minúsculas, sin acentos y con espacios simples: "Túxtla  GUTIÉRREZ" -> "tuxtla gutierrez"
+def normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+def trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+# Qué tan bien coincide la búsqueda con un texto (menor es mejor, None si no coincide)
+def _puntaje(consulta, texto):
+    if not texto:
+        return None
+    if texto == consulta:
+        return 0
+    if texto.startswith(consulta):
+        return 1
+    if f" {consulta}" in texto:
+        return 2
+    if consulta in texto:
+        return 3
+    return None
+
+# Índice en memoria por prefijo de palabra y por trigramas del nombre de la localidad;
+# los municipios son pocos y se recorren completos
+class IndiceLocalidades:
+    def __init__(self, filas):
+        self.filas = filas
+        self.nombres = []
+        self.trigramas = {}
+        self.municipios = {}  # municipio normalizado -> posiciones de sus localidades
+        palabras = []
+
+        for posicion, fila in enumerate(filas):
+            nombre = normalizar(fila.get(CAMPO_NOMBRE))
+            self.nombres.append(nombre)
+
+            for palabra in set(nombre.split()):
+                palabras.append((palabra, posicion))
+            for trigrama in trigramas(nombre):
+                self.trigramas.setdefault(trigrama, []).append(posicion)
+
+            municipio = normalizar(fila.get(CAMPO_MUNICIPIO))
+            if municipio:
+                self.municipios.setdefault(municipio, []).append(posicion)
+
+        palabras.sort()
+        self.palabras = [palabra for palabra, _ in palabras]
+        self.posiciones = [posicion for _, posicion in palabras]
+
+        # Dentro de cada municipio, las localidades ya quedan en el orden en que se muestran
+        for posiciones in self.municipios.values():
+            posiciones.sort(key=lambda posicion: (len(self.nombres[posicion]), self.nombres[posicion]))
+
+    def _por_prefijo(self, prefijo):
+        inicio = bisect_left(self.palabras, prefijo)
+        fin = inicio
+        while fin < len(self.palabras) and self.palabras[fin].startswith(prefijo):
+            fin += 1
+        return self.posiciones[inicio:fin]
+
+    def _candidatos(self, consulta):
+        if len(consulta) < 3:
+            return set(self._por_prefijo(consulta))
+        # La lista de trigramas más corta acota los candidatos; la coincidencia se verifica después
+        listas = [self.trigramas.get(trigrama, []) for trigrama in trigramas(consulta)]
+        return set(min(listas, key=len))
+
+    def buscar(self, texto, limite=20):
+        consulta = normalizar(texto)
+        if not consulta:
+            return []
+
+        resultados = []
+        for posicion in self._candidatos(consulta):
+            nombre = self.nombres[posicion]
+            puntaje = _puntaje(consulta, nombre)
+            if puntaje is not None:
+                resultados.append((puntaje, len(nombre), nombre, posicion))
+        encontradas = heapq.nsmallest(limite, resultados)
+
+        # Las coincidencias por municipio van después de las de la localidad
+        if len(encontradas) < limite:
+            vistas = {posicion for *_, posicion in encontradas}
+            municipios = []
+            for municipio, posiciones in self.municipios.items():
+                puntaje = _puntaje(consulta, municipio)
+                if puntaje is not None:
+                    municipios.append((puntaje, len(municipio), municipio, posiciones))
+            for puntaje, _, _, posiciones in sorted(municipios):
+                for posicion in posiciones:
+                    if len(encontradas) >= limite:
+                        break
+                    if posicion not in vistas:
+                        vistas.add(posicion)
+                        encontradas.append((puntaje + 4, 0, "", posicion))
+
+        return [self.filas[posicion] for *_, posicion in encontradas]
+
+_indice = None
+_cargado_en = None
+_busquedas = 0
+_candado = threading.Lock()
+_refrescando = threading.Lock()
+_detener = threading.Event()
+
+def cargar():
+    global _indice, _cargado_en
+    filas = consultar("SELECT * FROM SIA.Catalogos.Localidades")
+    nuevo = IndiceLocalidades(filas)
+    with _candado:
+        _indice = nuevo
+        _cargado_en = time.time()
+
+def indice():
+    if _indice is None:
+        with _refrescando:
+            if _indice is None:
+                cargar()
+    return _indice
+
+def buscar(texto, limite=20):
+    global _busquedas
+    _busquedas += 1
+    return indice().buscar(texto, limite)
+
+def _refrescar():
+    # Si ya hay una recarga en curso no se inicia otra
+    if not _refrescando.acquire(blocking=False):
+        return
+    try:
+        cargar()
+    except Exception:
+        log.exception("No se pudo refrescar el índice de localidades")
+    finally:
+        _refrescando.release()
+
+def refrescar_en_segundo_plano():
+    threading.Thread(target=_refrescar, daemon=True).start()
+
+def _ciclo_refresco(intervalo):
+    while not _detener.wait(intervalo):
+        _refrescar()
+
+def iniciar_refresco(intervalo=REFRESCO):
+    _detener.clear()
+    threading.Thread(target=_ciclo_refresco, args=(intervalo,), daemon=True).start()
+
+def detener_refresco():
+    _detener.set()
+
+def estadisticas():
+    actual = _indice
+    return {
+        "localidades": len(actual.filas) if actual else 0,
+        "cargado_en": _cargado_en,
+        "busquedas": _busquedas,
+        "refresco": REFRESCO,
+    }
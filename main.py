@@ -1,20 +1,65 @@
 from typing import Union
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Query, Request, BackgroundTasks, Header, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, FileResponse
 import pyodbc
-from pydantic import BaseModel
 from pydantic import BaseModel, Field
 from datetime import date, datetime
 from typing import Optional, List
-from db import connect
+from db import obtener_conexion, obtener_conexion_lectura, conexion_lectura, pool, ejecutor_bd, PoolAgotado
 from pydantic import field_validator, ConfigDict
 import fastapi_swagger_dark as fsd
 from fastapi import APIRouter
 import os
-import uuid
+import zipfile
+from contextlib import asynccontextmanager
+import catalogos
+import localidades as indice_localidades
+import paginacion
+import subidas
+from almacenamiento import almacen
+import archivos
+from registro import Alumno, ActualizarAlumno, registrar, datos_alumno, formulario, documentos_formulario, esquema_formulario, PROCEDIMIENTO_INSERTAR, PROCEDIMIENTO_ACTUALIZAR
+import documentos as metadatos_documentos
+import importacion
+import metricas
+import diagnostico
+import resultados
+import idempotencia
+import alumnos as cache_alumnos
+import arranque
+import archivado
+import exportacion
 
-api = FastAPI()
-api = FastAPI(docs_url=None)
+# Preparación en segundo plano al arrancar (ver arranque.py): el pool se llena y los
+# catálogos se precargan a la vez, sin bloquear el inicio del worker
+arranque.registrar_paso("pool", pool.llenar)
+arranque.registrar_paso("lenguas", catalogos.lenguas)
+arranque.registrar_paso("sangre", catalogos.tipos_sangre)
+arranque.registrar_paso("localidades", indice_localidades.cargar)
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    arranque.iniciar()
+    indice_localidades.iniciar_refresco()
+    almacen.disponibles.iniciar()
+    almacen.disponibles_frio.iniciar()
+    archivado.iniciar()
+    try:
+        yield
+    finally:
+        await arranque.detener()
+        indice_localidades.detener_refresco()
+        almacen.disponibles.detener()
+        almacen.disponibles_frio.detener()
+        archivado.detener()
+        ejecutor_bd.cerrar()
+        pool.cerrar()
+
+api = FastAPI(docs_url=None, default_response_class=resultados.RespuestaJSON, lifespan=ciclo_de_vida)
+# Los endpoints síncronos se perfilan en su hilo del threadpool (ver diagnostico.py)
+api.router.route_class = diagnostico.RutaPerfilada
 router = APIRouter()
 fsd.install(router)
 api.include_router(router)
@@ -32,257 +77,366 @@ api.add_middleware(
     allow_headers=["*"],
 )
 
-conexion = connect()
+api.middleware("http")(subidas.limitar_peticion)
+api.add_middleware(diagnostico.Diagnostico)
+api.add_middleware(metricas.MedirPeticiones)
+
+@api.exception_handler(PoolAgotado)
+def pool_agotado(request, exc):
+    return JSONResponse(status_code=503, content={"error": f"Servicio saturado: {exc}"})
+
+# Sondas del orquestador. Son async para responder en el event loop aunque el threadpool
+# esté ocupado. live: el proceso atiende; ready: terminó la preparación de arranque
+@api.get("/health/live", include_in_schema=False)
+async def salud_vivo():
+    return {"estado": "vivo"}
+
+@api.get("/health/ready", include_in_schema=False)
+async def salud_listo():
+    estado = arranque.estado()
+    return resultados.RespuestaJSON(estado, status_code=200 if estado["listo"] else 503)
+
+# Métricas en formato de texto de Prometheus
+@api.get("/metrics", include_in_schema=False)
+def exponer_metricas():
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4")
+
+# Resumen de un perfil de petición (nombre de la cabecera X-Perfil)
+@api.get("/admin/perfiles/{nombre}", include_in_schema=False)
+def obtener_perfil(nombre: str):
+    ruta = diagnostico.ruta_perfil(nombre)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(ruta, media_type="text/plain; charset=utf-8")
+
+# Estado del pool de conexiones
+@api.get("/estado/pool")
+def estado_pool():
+    return pool.estadisticas()
+
+# Estado del ejecutor de base de datos (cola y tiempos de espera)
+@api.get("/estado/ejecutor")
+def estado_ejecutor():
+    return ejecutor_bd.estadisticas()
+
+CONSULTA_DOCUMENTOS = """
+    SELECT 
+        Id,
+        IdAlumno,
+        NombreArchivo,
+        RutaArchivo,
+        TamanoArchivo,
+        FechaSubida
+    FROM sea.Documentos 
+    WHERE IdAlumno IN ({})
+"""
+
+MAX_ALUMNOS_DOCUMENTOS = int(os.getenv("DOCUMENTOS_MAX_ALUMNOS", "200"))
+
+# Documentos de varios alumnos en una sola consulta, agrupados por IdAlumno
+def consultar_documentos(cursor, ids_alumnos):
+    with metricas.etapa("consulta", "sea.Documentos"):
+        cursor.execute(CONSULTA_DOCUMENTOS.format(", ".join("?" * len(ids_alumnos))), *ids_alumnos)
+        rows = cursor.fetchall()
+    columns = resultados.columnas(cursor, CONSULTA_DOCUMENTOS)
+    
+    por_alumno = {id_alumno.lower(): [] for id_alumno in ids_alumnos}
+    for row in rows:
+        documento_dict = dict(zip(columns, row))
+        id_alumno = str(documento_dict.pop('IdAlumno')).lower()
+        
+        # Generar URL para acceder al archivo
+        documento_dict['url'] = f"/archivos/{documento_dict['Id']}"
+        
+        # Disponibilidad desde el índice en memoria del almacén
+        documento_dict['disponible'] = almacen.existe(documento_dict['RutaArchivo'])
+        
+        por_alumno.setdefault(id_alumno, []).append(documento_dict)
+    
+    return {id_alumno: por_alumno[id_alumno.lower()] for id_alumno in ids_alumnos}
 
 # Obtener archivos de un alumno por ID
 @api.get("/alumnos/documentos/{id_alumno}")
-def obtener_documentos_alumno(id_alumno: str):
-    conexion = connect()
+def obtener_documentos_alumno(id_alumno: str, conexion=Depends(obtener_conexion)):
     cursor = conexion.cursor()
     
     try:
         # Consultar los documentos asociados al alumno
-        cursor.execute("""
-            SELECT 
-                Id,
-                NombreArchivo,
-                RutaArchivo,
-                TamanoArchivo,
-                FechaSubida
-            FROM sea.Documentos 
-            WHERE IdAlumno = ?
-        """, id_alumno)
-        
-        rows = cursor.fetchall()
+        documentos = consultar_documentos(cursor, [id_alumno])[id_alumno]
         
-        if not rows:
+        if not documentos:
             return {"message": "No se encontraron documentos para este alumno", "documentos": []}
         
-        columns = [column[0] for column in cursor.description]
-        documentos = []
-        
-        for row in rows:
-            documento_dict = dict(zip(columns, row))
-            
-            # Generar URL para acceder al archivo
-            documento_dict['url'] = f"/archivos/{documento_dict['Id']}"
-            
-            # Verificar si el archivo existe físicamente
-            if os.path.exists(documento_dict['RutaArchivo']):
-                documento_dict['disponible'] = True
-            else:
-                documento_dict['disponible'] = False
-                
-            documentos.append(documento_dict)
-        
-        return {
+        return resultados.RespuestaJSON({
             "id_alumno": id_alumno,
             "total_documentos": len(documentos),
             "documentos": documentos
-        }
+        })
         
     except pyodbc.Error as e:
+        metricas.errores_bd.incrementar(operacion="sea.Documentos")
         return {"error": f"Error al consultar los documentos: {e}"}
     except Exception as e:
         return {"error": f"Error inesperado: {e}"}
     finally:
         cursor.close()
 
-# Endpoint para servir archivos
-@api.get("/archivos/{documento_id}")
-def mostrar_archivo(documento_id: str):
-    from fastapi.responses import FileResponse
-    
-    conexion = connect()
+class ConsultaDocumentos(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=MAX_ALUMNOS_DOCUMENTOS)
+
+# Obtener archivos de varios alumnos en una sola consulta
+@api.post("/alumnos/documentos")
+def obtener_documentos_alumnos(consulta: ConsultaDocumentos, conexion=Depends(obtener_conexion)):
     cursor = conexion.cursor()
     
     try:
-        # Obtener información del archivo
-        cursor.execute("""
-            SELECT NombreArchivo, RutaArchivo 
-            FROM sea.Documentos 
-            WHERE Id = ?
-        """, documento_id)
-        
-        row = cursor.fetchone()
-        
-        if not row:
-            raise HTTPException(status_code=404, detail="Documento no encontrado")
-        
-        nombre_archivo, ruta_archivo = row
-        
-        # Verificar si el archivo existe
-        if not os.path.exists(ruta_archivo):
-            raise HTTPException(status_code=404, detail="Archivo no encontrado en el sistema")
-        
-        # Devolver el archivo
-        return FileResponse(
-            path=ruta_archivo,
-            filename=nombre_archivo,
-            media_type='application/pdf'
-        )
+        # Sin repetidos (los Id no distinguen mayúsculas)
+        unicos = {}
+        for id_alumno in consulta.ids:
+            unicos.setdefault(id_alumno.lower(), id_alumno)
+        ids_alumnos = list(unicos.values())
+        por_alumno = consultar_documentos(cursor, ids_alumnos)
+        
+        return resultados.RespuestaJSON({
+            "alumnos": [
+                {
+                    "id_alumno": id_alumno,
+                    "total_documentos": len(documentos),
+                    "documentos": documentos
+                }
+                for id_alumno, documentos in por_alumno.items()
+            ]
+        })
         
     except pyodbc.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error de base de datos: {e}")
+        metricas.errores_bd.incrementar(operacion="sea.Documentos")
+        return {"error": f"Error al consultar los documentos: {e}"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error inesperado: {e}")
+        return {"error": f"Error inesperado: {e}"}
     finally:
         cursor.close()
 
-# Endpoint para visualizar archivos en el navegador (blob)
-@api.get("/archivos/ver/{documento_id}")
-def ver_archivo(documento_id: str):
-    from fastapi.responses import FileResponse
-    
-    conexion = connect()
-    cursor = conexion.cursor()
-    
+# Zip con los documentos de los alumnos, armado mientras se envía. La consulta se hace
+# antes de empezar, con una conexión que se devuelve al pool sin esperar al envío.
+def respuesta_zip(ids_alumnos, nombre_zip):
     try:
-        # Obtener información del archivo
-        cursor.execute("""
-            SELECT NombreArchivo, RutaArchivo 
-            FROM sea.Documentos 
-            WHERE Id = ?
-        """, documento_id)
-        
-        row = cursor.fetchone()
-        
-        if not row:
-            raise HTTPException(status_code=404, detail="Documento no encontrado")
-        
-        nombre_archivo, ruta_archivo = row
-        
-        # Verificar si el archivo existe
-        if not os.path.exists(ruta_archivo):
-            raise HTTPException(status_code=404, detail="Archivo no encontrado en el sistema")
-        
-        # Devolver el archivo para visualización inline (blob)
-        return FileResponse(
-            path=ruta_archivo,
-            filename=nombre_archivo,
-            media_type='application/pdf',
-            headers={
-                "Content-Disposition": f"inline; filename={nombre_archivo}"
-            }
-        )
-        
+        with conexion_lectura() as conexion:
+            cursor = conexion.cursor()
+            try:
+                por_alumno = consultar_documentos(cursor, ids_alumnos)
+            finally:
+                cursor.close()
     except pyodbc.Error as e:
-        raise HTTPException(status_code=500, detail=f"Error de base de datos: {e}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error inesperado: {e}")
-    finally:
-        cursor.close()
-        conexion.close()
+        metricas.errores_bd.incrementar(operacion="sea.Documentos")
+        return {"error": f"Error al consultar los documentos: {e}"}
 
-# Endpoint para descargar archivos
-@api.get("/archivos/descargar/{documento_id}")
-def descargar_archivo(documento_id: str):
-    from fastapi.responses import FileResponse
-    
-    conexion = connect()
-    cursor = conexion.cursor()
-    
+    if not any(por_alumno.values()):
+        raise HTTPException(status_code=404, detail="No se encontraron documentos")
+
+    return StreamingResponse(
+        exportacion.zip_documentos(por_alumno, carpetas=len(ids_alumnos) > 1),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{nombre_zip}"'},
+    )
+
+# Descargar todos los documentos de un alumno en un zip
+@api.get("/alumnos/documentos/{id_alumno}/zip")
+def descargar_documentos_alumno(id_alumno: str):
+    nombre = "".join(c for c in id_alumno if c.isalnum() or c == "-")
+    return respuesta_zip([id_alumno], f"documentos-{nombre}.zip")
+
+# Descargar los documentos de varios alumnos en un zip (una carpeta por alumno)
+@api.post("/alumnos/documentos/zip")
+def descargar_documentos_alumnos(consulta: ConsultaDocumentos):
+    unicos = {}
+    for id_alumno in consulta.ids:
+        unicos.setdefault(id_alumno.lower(), id_alumno)
+    return respuesta_zip(list(unicos.values()), "documentos.zip")
+
+# Estado del índice de disponibilidad de documentos
+@api.get("/estado/documentos")
+def estado_documentos():
+    return almacen.disponibles.estadisticas()
+
+# Estado del nivel frío: índice, copias restauradas y última pasada del archivador
+@api.get("/estado/archivo")
+def estado_archivo():
+    return archivado.estadisticas()
+
+# Buscar el documento y responder con el archivo (o 304 si el cliente ya lo tiene);
+# los metadatos salen del cache de documentos, sin consultar la base de datos si ya están
+def servir_documento(request, documento_id, disposicion):
     try:
-        # Obtener información del archivo
-        cursor.execute("""
-            SELECT NombreArchivo, RutaArchivo 
-            FROM sea.Documentos 
-            WHERE Id = ?
-        """, documento_id)
-        
-        row = cursor.fetchone()
-        
-        if not row:
-            raise HTTPException(status_code=404, detail="Documento no encontrado")
-        
-        nombre_archivo, ruta_archivo = row
-        
-        # Verificar si el archivo existe
-        if not os.path.exists(ruta_archivo):
-            raise HTTPException(status_code=404, detail="Archivo no encontrado en el sistema")
-        
-        # Devolver el archivo para descarga forzada
-        return FileResponse(
-            path=ruta_archivo,
-            filename=nombre_archivo,
-            media_type='application/pdf',
-            headers={
-                "Content-Disposition": f"attachment; filename={nombre_archivo}"
-            }
-        )
-        
+        documento = metadatos_documentos.buscar(documento_id)
     except pyodbc.Error as e:
+        metricas.errores_bd.incrementar(operacion="sea.Documentos")
         raise HTTPException(status_code=500, detail=f"Error de base de datos: {e}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error inesperado: {e}")
-    finally:
-        cursor.close()
-        conexion.close()
+    
+    if documento is None:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    
+    return archivos.respuesta(
+        request, documento_id, documento['nombre_archivo'], documento['ruta_archivo'],
+        documento['tamano_archivo'], documento['fecha_subida'], disposicion
+    )
 
-# Obtener todos los alumnos
+# Endpoint para servir archivos
+@api.get("/archivos/{documento_id}")
+def mostrar_archivo(documento_id: str, request: Request):
+    return servir_documento(request, documento_id, "attachment")
+
+# Endpoint para visualizar archivos en el navegador (blob)
+@api.get("/archivos/ver/{documento_id}")
+def ver_archivo(documento_id: str, request: Request):
+    return servir_documento(request, documento_id, "inline")
+
+# Endpoint para descargar archivos
+@api.get("/archivos/descargar/{documento_id}")
+def descargar_archivo(documento_id: str, request: Request):
+    return servir_documento(request, documento_id, "attachment")
+
+# Obtener todos los alumnos (ObtenerAlumnos). Con "limit", "after" o formato=json se responde
+# por páginas ({alumnos, siguiente}, 100 por defecto); con formato=ndjson, un alumno por línea
 @api.get("/alumnos")
-def leer_alumnos():
-    cursor = conexion.cursor()
+def leer_alumnos(
+    limite: Optional[int] = Query(None, ge=1, le=1000, alias="limit"),
+    despues: Optional[str] = Query(None, alias="after"),
+    campos: Optional[str] = None,
+    formato: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+):
     try:
-        rows = cursor.execute("exec ObtenerAlumnos").fetchall()
-        if not rows:
+        if formato == "ndjson":
+            if despues:
+                raise paginacion.ParametroInvalido("after solo aplica a las páginas; ndjson exporta todos los alumnos")
+            seleccion, lotes = paginacion.abrir(campos)
+            return StreamingResponse(paginacion.flujo(seleccion, lotes), media_type="application/x-ndjson")
+        
+        if formato == "json" or limite or despues:
+            clave = paginacion.decodificar_cursor(despues) if despues else None
+            alumnos, siguiente = paginacion.pagina(campos, clave, limite or 100)
+            if not alumnos and clave is None:
+                return {"error": "No se encontraron alumnos"}
+            return resultados.RespuestaJSON({"alumnos": alumnos, "siguiente": siguiente})
+        
+        # Sin parámetros de paginación: la lista completa, como siempre, pero por lotes
+        seleccion, lotes = paginacion.abrir(campos)
+        primero = next(lotes, None)
+        if primero is None:
             return {"error": "No se encontraron alumnos"}
-        
-        columns = [column[0] for column in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+        return StreamingResponse(paginacion.arreglo(seleccion, primero, lotes), media_type="application/json")
+    except paginacion.ParametroInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PoolAgotado:
+        raise
+    except paginacion.ResultadoInesperado as e:
+        print(f"Error en /alumnos: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         return {"error": f"Ocurrió un error: {e}"}
 
 # Obtener los datos del alumno con matrícula (en la nueva base de datos)
+# (las tres búsquedas por alumno pasan por el cache de alumnos.py y solo toman una
+# conexión del pool si no está en cache)
 @api.get("/alumnos/{matricula}")
 def leer_alumno(matricula: str):
-    cursor = conexion.cursor()
     try:
-        row = cursor.execute("exec AlumnoConMatricula ?", matricula).fetchone()
-        if row is None:
+        cuerpo = cache_alumnos.por_matricula(matricula)
+        if cuerpo is None:
             return {"error": "Alumno no encontrado"}
-        columns = [column[0] for column in cursor.description]
-        return dict(zip(columns, row))
+        return Response(cuerpo, media_type="application/json")
+    except PoolAgotado:
+        raise
+    except pyodbc.Error as e:
+        metricas.errores_bd.incrementar(operacion="AlumnoConMatricula")
+        return {"error": f"Ocurrió un error: {e}"}
     except Exception as e:
         return {"error": f"Ocurrió un error: {e}"}
 
 # Obtener los datos del alumno con CURP o matrícula (en la base de datos SIA)
 @api.get("/alumnos/matricula/{matricula}")
 def buscar_por_matricula(matricula: str):
-    conexion = connect()
-    cursor = conexion.cursor()
     try:
-        cursor.execute("EXEC AlumnoConCurpOMatricula @Matricula = ?, @CURP = NULL", matricula)
-        row = cursor.fetchone()
+        cuerpo = cache_alumnos.por_matricula_sia(matricula)
         
-        if row is None:
+        if cuerpo is None:
             return {"error": "Alumno no encontrado con esa matrícula"}
             
-        columns = [column[0] for column in cursor.description]
-        return dict(zip(columns, row))
+        return Response(cuerpo, media_type="application/json")
         
     except pyodbc.Error as e:
+        metricas.errores_bd.incrementar(operacion="AlumnoConCurpOMatricula")
         return {"error": f"Error al consultar el alumno: {e}"}
 
 @api.get("/alumnos/curp/{curp}")
 def buscar_por_curp(curp: str):
-    conexion = connect()
-    cursor = conexion.cursor()
     try:
-        cursor.execute("EXEC AlumnoConCurpOMatricula @Matricula = NULL, @CURP = ?", curp)
-        row = cursor.fetchone()
+        cuerpo = cache_alumnos.por_curp_sia(curp)
         
-        if row is None:
+        if cuerpo is None:
             return {"error": "Alumno no encontrado con esa CURP"}
             
-        columns = [column[0] for column in cursor.description]
-        return dict(zip(columns, row))
+        return Response(cuerpo, media_type="application/json")
         
     except pyodbc.Error as e:
+        metricas.errores_bd.incrementar(operacion="AlumnoConCurpOMatricula")
         return {"error": f"Error al consultar el alumno: {e}"}
+
+MAX_BUSQUEDA = int(os.getenv("BUSQUEDA_MAX", "1000"))
+LOTE_BUSQUEDA = int(os.getenv("BUSQUEDA_LOTE", "100"))
+
+class BusquedaAlumnos(BaseModel):
+    curps: List[str] = Field(default_factory=list)
+    matriculas: List[str] = Field(default_factory=list)
+
+# Ejecuta AlumnoConCurpOMatricula para muchas claves enviando un lote de EXEC por viaje
+# al servidor; cada EXEC devuelve su propio conjunto de resultados (nextset)
+def buscar_alumnos_por_lotes(cursor, claves):
+    busquedas = []
+    for inicio in range(0, len(claves), LOTE_BUSQUEDA):
+        lote = claves[inicio:inicio + LOTE_BUSQUEDA]
+        sql = "SET NOCOUNT ON;\n" + "\n".join(
+            "EXEC AlumnoConCurpOMatricula @Matricula = ?, @CURP = ?;" for _ in lote
+        )
+        parametros = []
+        for tipo, valor in lote:
+            parametros.extend((valor, None) if tipo == "matricula" else (None, valor))
+        
+        with metricas.etapa("procedimiento", "AlumnoConCurpOMatricula"):
+            cursor.execute(sql, *parametros)
+        for posicion, (tipo, valor) in enumerate(lote):
+            if posicion > 0:
+                cursor.nextset()
+            row = cursor.fetchone() if cursor.description else None
+            alumno = None
+            if row is not None:
+                alumno = resultados.fila(cursor, "AlumnoConCurpOMatricula", row)
+            busquedas.append({"tipo": tipo, "valor": valor, "encontrado": alumno is not None, "alumno": alumno})
+    return busquedas
+
+# Buscar muchos alumnos por CURP y/o matrícula (en la base de datos SIA) en una sola petición
+@api.post("/alumnos/buscar")
+def buscar_alumnos(busqueda: BusquedaAlumnos, conexion=Depends(obtener_conexion_lectura)):
+    claves = [("curp", curp) for curp in busqueda.curps]
+    claves += [("matricula", matricula) for matricula in busqueda.matriculas]
+    
+    if not claves:
+        raise HTTPException(status_code=400, detail="Se requiere al menos una CURP o matrícula")
+    if len(claves) > MAX_BUSQUEDA:
+        raise HTTPException(status_code=400, detail=f"Se permiten como máximo {MAX_BUSQUEDA} claves por búsqueda")
+    
+    cursor = conexion.cursor()
+    try:
+        busquedas = buscar_alumnos_por_lotes(cursor, claves)
+        return resultados.RespuestaJSON({
+            "total": len(busquedas),
+            "encontrados": sum(1 for busqueda in busquedas if busqueda["encontrado"]),
+            "resultados": busquedas
+        })
+    except pyodbc.Error as e:
+        metricas.errores_bd.incrementar(operacion="AlumnoConCurpOMatricula")
+        return {"error": f"Error al consultar los alumnos: {e}"}
     finally:
         cursor.close()
-        conexion.close()
 
 # Crear un nuevo alumno
 
@@ -292,49 +446,9 @@ class DocumentoInfo(BaseModel):
     tamano_archivo: int
     fecha_subida: datetime
 
-@api.post("/alumnos/insertar")
-async def insertar_alumno(
-    id: Optional[str] = Form(None),
-    curp: str = Form(...),
-    matricula: Optional[str] = Form(None),
-    nombre: str = Form(...),
-    apellidoPaterno: str = Form(...),
-    apellidoMaterno: str = Form(...),
-    fechaNacimiento: str = Form(...),
-    sexo: str = Form(...),
-    telefono: str = Form(...),
-    correo: str = Form(...),
-    idSede: int = Form(...),
-    estadoCivil: str = Form(...),
-    idNacionalidad: int = Form(...),
-    hablaLengua: int = Form(...),
-    idLengua: Optional[int] = Form(None),
-    tieneBeca: int = Form(...),
-    queBeca: Optional[str] = Form(None),
-    hijoDeTrabjador: str = Form(...),
-    idCapturo: str = Form(...),
-    fechaTramite: Optional[str] = Form(...),
-    fechaCaptura: Optional[str] = Form(...),
-    idRol: Optional[int] = Form(0),
-    tieneAlergias: int = Form(...),
-    alergias: Optional[str] = Form(None),
-    tipoSangre: str = Form(...),
-    tieneDiscapacidad: int = Form(...),
-    discapacidad: Optional[str] = Form(None),
-    nombreTutor: Optional[str] = Form(None),
-    apellidoPaternoTutor: Optional[str] = Form(None),
-    apellidoMaternoTutor: Optional[str] = Form(None),
-    telefonoTutor: Optional[str] = Form(None),
-    codigoPostal: str = Form(...),
-    calle: str = Form(...),
-    entreCalles: Optional[str] = Form(None),
-    numeroExterior: str = Form(...),
-    numeroInterior: Optional[str] = Form(None),
-    idLocalidad: str = Form(...),
-    documentos: List[UploadFile] = File(...)
-):
-    conexion = connect()
-    cursor = conexion.cursor()
+# Guarda los documentos y ejecuta InsertarAlumno
+async def registrar_alumno(alumno, documentos):
+    documentos_info = []
     
     try:
         # Validar que los archivos sean PDF
@@ -342,216 +456,65 @@ async def insertar_alumno(
             if not documento.filename.lower().endswith('.pdf'):
                 raise HTTPException(status_code=400, detail=f"El archivo {documento.filename} debe ser un PDF")
         
-        # Crear directorio para almacenar archivos si no existe
-        upload_dir = "uploads/documentos"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Crear tabla temporal para documentos
-        cursor.execute("""
-            CREATE TABLE #TempDocumentos (
-                NombreArchivo NVARCHAR(255),
-                RutaArchivo NVARCHAR(500),
-                TamanoArchivo BIGINT,
-                FechaSubida DATETIME,
-            )
-        """)
-        
-        # Procesar y guardar archivos
-        documentos_info = []
-        for documento in documentos:
-            # Generar nombre único para el archivo
-            file_extension = os.path.splitext(documento.filename)[1]
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
-            file_path = os.path.join(upload_dir, unique_filename)
-            
-            # Guardar archivo en el sistema de archivos
-            content = await documento.read()
-            with open(file_path, "wb") as buffer:
-                buffer.write(content)
-            
-            # Insertar información del documento en tabla temporal
-            cursor.execute("""
-                INSERT INTO #TempDocumentos (NombreArchivo, RutaArchivo, TamanoArchivo, FechaSubida)
-                VALUES (?, ?, ?, ?)
-            """, documento.filename, file_path, len(content), datetime.now())
-        
-        # Convertir valores int a boolean donde sea necesario
-        habla_lengua_bool = hablaLengua == 1
-        tiene_beca_bool = tieneBeca == 1
-        hijo_trabajador_bool = hijoDeTrabjador.lower() == "true"
-        tiene_alergias_bool = tieneAlergias == 1
-        tiene_discapacidad_bool = tieneDiscapacidad == 1
-        
-        # Manejar campos vacíos
-        discapacidad_valor = discapacidad if discapacidad and discapacidad.strip() else None
-        
-        # Manejar campos de tutor vacíos
-        nombre_tutor_valor = nombreTutor if nombreTutor and nombreTutor.strip() else None
-        apellido_paterno_tutor_valor = apellidoPaternoTutor if apellidoPaternoTutor and apellidoPaternoTutor.strip() else None
-        apellido_materno_tutor_valor = apellidoMaternoTutor if apellidoMaternoTutor and apellidoMaternoTutor.strip() else None
-        telefono_tutor_valor = telefonoTutor if telefonoTutor and telefonoTutor.strip() else None
-        
-        # Convertir fechas desde strings
-        fecha_nacimiento = datetime.strptime(fechaNacimiento, '%Y-%m-%d').date()
-        fecha_tramite = datetime.strptime(fechaTramite, '%Y-%m-%d').date()
-        fecha_captura = datetime.strptime(fechaCaptura, '%Y-%m-%d')
-        
-        datos = (
-            id,                                 # @IdAlumno
-            curp,                              # @CURP
-            matricula,                         # @Matricula
-            nombre,                            # @Nombre
-            apellidoPaterno,                   # @ApellidoPaterno
-            apellidoMaterno,                   # @ApellidoMaterno
-            fecha_nacimiento,                  # @FechaNacimiento
-            sexo,                              # @Sexo
-            telefono,                          # @Telefono
-            correo,                            # @Correo
-            idSede,                            # @IdSede
-            estadoCivil,                       # @EstadoCivil
-            idNacionalidad,                    # @IdNacionalidad
-            habla_lengua_bool,                 # @HablaLengua
-            idLengua,                          # @IdLengua
-            tiene_beca_bool,                   # @TieneBeca
-            queBeca,                           # @QueBeca
-            hijo_trabajador_bool,              # @HijoDeTrabajador
-            idCapturo,                         # @IdCapturo
-            fecha_tramite,                     # @FechaTramite
-            fecha_captura,                     # @FechaCaptura
-            idRol,                             # @IdRol
-            tiene_alergias_bool,               # @TieneAlergias
-            alergias,                          # @Alergias
-            tipoSangre,                        # @TipoSangre
-            tiene_discapacidad_bool,           # @TieneDiscapacidad
-            discapacidad_valor,                # @Discapacidad
-            nombre_tutor_valor,                # @NombreTutor
-            apellido_paterno_tutor_valor,      # @ApellidoPaternoTutor
-            apellido_materno_tutor_valor,      # @ApellidoMaternoTutor
-            telefono_tutor_valor,              # @TelefonoTutor
-            codigoPostal,                      # @CodigoPostal
-            calle,                             # @Calle
-            entreCalles,                       # @EntreCalles
-            numeroExterior,                    # @NumeroExterior
-            numeroInterior if numeroInterior and numeroInterior.strip() else None,  # @NumeroInterior
-            idLocalidad                        # @IdLocalidad
-        )
+        # Guardar archivos en disco por bloques, fuera del event loop
+        documentos_info = await subidas.guardar_todos(documentos)
         
-        cursor.execute(
-            "exec InsertarAlumno ?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?",
-            *datos
+        result_dict = await ejecutor_bd.ejecutar(
+            registrar, PROCEDIMIENTO_INSERTAR, datos_alumno(alumno), documentos_info
         )
         
-        result = cursor.fetchone()
-        conexion.commit()
+        if alumno.id:
+            metadatos_documentos.invalidar_alumno(alumno.id)
+        await run_in_threadpool(cache_alumnos.invalidar_escritura, alumno, result_dict)
         
-        if result:
-            columns = [column[0] for column in cursor.description]
-            result_dict = dict(zip(columns, result))
+        if result_dict:
             return {"data": result_dict}
         
         return {"message": "Alumno insertado correctamente"}
 
+    except HTTPException:
+        raise
+    except PoolAgotado:
+        # Lo responde el manejador con 503, para que el cliente reintente más tarde
+        await subidas.eliminar(documentos_info)
+        raise
+    except subidas.ArchivoRechazado as e:
+        raise HTTPException(status_code=e.estado, detail=str(e))
     except pyodbc.Error as e:
         print(f"Error de base de datos: {e}")
-        conexion.rollback()
+        metricas.errores_bd.incrementar(operacion="InsertarAlumno")
         # Eliminar archivos subidos en caso de error
-        for documento_info in documentos_info:
-            if os.path.exists(documento_info['ruta_archivo']):
-                os.remove(documento_info['ruta_archivo'])
+        await subidas.eliminar(documentos_info)
         return {"error": f"Error al crear el alumno: {e}"}
     except Exception as e:
         print(f"Error general: {e}")
-        conexion.rollback()
+        await subidas.eliminar(documentos_info)
         return {"error": f"Error inesperado: {e}"}
-    finally:
-        cursor.close()
-        conexion.close()
+
+# Crear un alumno. Los reenvíos (misma Idempotency-Key, o misma CURP y datos si no se envía)
+# esperan a la petición en curso o reciben la respuesta ya guardada, sin volver a guardar
+# archivos ni ejecutar el procedimiento
+@api.post("/alumnos/insertar", openapi_extra=esquema_formulario(Alumno, documentos_requeridos=True))
+async def insertar_alumno(
+    response: Response,
+    alumno: Alumno = Depends(formulario(Alumno)),
+    documentos: List[UploadFile] = Depends(documentos_formulario(requeridos=True)),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
+    huella = await run_in_threadpool(diagnostico.perfilado(idempotencia.huella), alumno, documentos)
+    clave = idempotencia.clave("insertar", idempotency_key, alumno.curp, huella)
+    return await idempotencia.ejecutar_una_vez(
+        clave, huella, response, lambda: registrar_alumno(alumno, documentos)
+    )
 
 # Actualizar un alumno
-# Modelo para actualizar un alumno
-class ActualizarAlumno(BaseModel):
-    id: str
-    curp: str = Field(max_length=18, min_length=18)
-    matricula: Optional[str] = Field(default=None, max_length=15)
-    nombre: str = Field(max_length=80)
-    apellidoPaterno: str = Field(max_length=50)
-    apellidoMaterno: str = Field(max_length=50)
-    fechaNacimiento: str
-    sexo: str = Field(max_length=1, min_length=1, pattern="^[HM]$")
-    telefono: str = Field(max_length=15, min_length=10, pattern=r"^\d+$")
-    correo: str = Field(max_length=80, pattern=r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
-    idSede: int = Field(gt=0, lt=5)
-    estadoCivil: str = Field(max_length=20)
-    idNacionalidad: int = Field(gt=0, lt=5)
-    hablaLengua: int = Field(ge=0, le=1)
-    idLengua: Optional[int] = Field(gt=0, lt=68)
-    tieneBeca: int = Field(ge=0, le=1)
-    queBeca: Optional[str] = Field(default=None, max_length=50)
-    hijoDeTrabjador: str = Field(max_length=5, pattern="^(true|false)$")
-    idCapturo: str
-    fechaTramite: str
-    fechaCaptura: str
-    idRol: int
-    tieneAlergias: int = Field(ge=0, le=1)
-    alergias: Optional[str] = Field(default=None, max_length=20)
-    tipoSangre: str = Field(max_length=3, pattern="^(A|B|AB|O)[+-]$")
-    tieneDiscapacidad: int = Field(ge=0, le=1)
-    discapacidad: Optional[str] = Field(default=None, max_length=200)
-    nombreTutor: Optional[str] = Field(default=None, max_length=80)
-    apellidoPaternoTutor: Optional[str] = Field(default=None, max_length=50)
-    apellidoMaternoTutor: Optional[str] = Field(default=None, max_length=50)
-    telefonoTutor: Optional[str] = Field(default=None, max_length=15)
-    codigoPostal: str = Field(max_length=10, min_length=5, pattern=r"^\d{5,10}$")
-    calle: str = Field(max_length=100)
-    entreCalles: Optional[str] = Field(default=None, max_length=100)
-    numeroExterior: str = Field(max_length=10, min_length=1, pattern=r"^\d+$")
-    numeroInterior: Optional[str] = Field(default=None, max_length=10)
-    idLocalidad: str = Field(default="B0572553-592A-4A46-B730-000022504801")
-
-@api.put("/alumnos/actualizar")
+@api.put("/alumnos/actualizar", openapi_extra=esquema_formulario(ActualizarAlumno, documentos_requeridos=False))
 async def actualizar_alumno(
-    id: str = Form(...),
-    curp: str = Form(...),
-    matricula: Optional[str] = Form(None),
-    nombre: str = Form(...),
-    apellidoPaterno: str = Form(...),
-    apellidoMaterno: str = Form(...),
-    fechaNacimiento: str = Form(...),  # 👈 Este viene como string
-    sexo: str = Form(...),
-    telefono: str = Form(...),
-    correo: str = Form(...),
-    idSede: int = Form(...),
-    estadoCivil: str = Form(...),
-    idNacionalidad: int = Form(...),
-    hablaLengua: int = Form(...),
-    idLengua: Optional[int] = Form(None),
-    tieneBeca: int = Form(...),
-    queBeca: Optional[str] = Form(None),
-    hijoDeTrabjador: str = Form(...),
-    idCapturo: str = Form(...),
-    fechaTramite: Optional[str] = Form(...),  # 👈 Cambiar a str
-    fechaCaptura: Optional[str] = Form(...),  # 👈 Cambiar a str
-    idRol: int = Form(...),
-    tieneAlergias: int = Form(...),
-    alergias: Optional[str] = Form(None),
-    tipoSangre: str = Form(...),
-    tieneDiscapacidad: int = Form(...),
-    discapacidad: Optional[str] = Form(None),
-    nombreTutor: Optional[str] = Form(None),
-    apellidoPaternoTutor: Optional[str] = Form(None),
-    apellidoMaternoTutor: Optional[str] = Form(None),
-    telefonoTutor: Optional[str] = Form(None),
-    codigoPostal: str = Form(...),
-    calle: str = Form(...),
-    entreCalles: Optional[str] = Form(None),
-    numeroExterior: str = Form(...),
-    numeroInterior: Optional[str] = Form(None),
-    idLocalidad: str = Form(default="B0572553-592A-4A46-B730-000022504801"),
+    alumno: ActualizarAlumno = Depends(formulario(ActualizarAlumno)),
     # Archivos PDF opcionales para actualización
-    documentos: Optional[List[UploadFile]] = File(None)
+    documentos: List[UploadFile] = Depends(documentos_formulario(requeridos=False)),
 ):
-    conexion = connect()
-    cursor = conexion.cursor()
+    documentos_info = []
     
     try:
         # Si hay documentos nuevos, validar que sean PDF
@@ -560,174 +523,153 @@ async def actualizar_alumno(
                 if not documento.filename.lower().endswith('.pdf'):
                     raise HTTPException(status_code=400, detail=f"El archivo {documento.filename} debe ser un PDF")
         
-        # Crear directorio para almacenar archivos si no existe
-        upload_dir = "uploads/documentos"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Crear tabla temporal para documentos (solo si hay documentos nuevos)
+        # Guardar archivos nuevos en disco por bloques, fuera del event loop
         if documentos:
-            cursor.execute("""
-                CREATE TABLE #TempDocumentos (
-                    NombreArchivo NVARCHAR(255),
-                    RutaArchivo NVARCHAR(500),
-                    TamanoArchivo BIGINT,
-                    FechaSubida DATETIME
-                )
-            """)
-            
-            # Procesar y guardar archivos nuevos
-            for documento in documentos:
-                file_extension = os.path.splitext(documento.filename)[1]
-                unique_filename = f"{uuid.uuid4()}{file_extension}"
-                file_path = os.path.join(upload_dir, unique_filename)
-                
-                content = await documento.read()
-                with open(file_path, "wb") as buffer:
-                    buffer.write(content)
-                
-                cursor.execute("""
-                    INSERT INTO #TempDocumentos (NombreArchivo, RutaArchivo, TamanoArchivo, FechaSubida)
-                    VALUES (?, ?, ?, ?)
-                """, documento.filename, file_path, len(content), datetime.now())
-        else:
-            # Crear tabla temporal vacía si no hay documentos
-            cursor.execute("""
-                CREATE TABLE #TempDocumentos (
-                    NombreArchivo NVARCHAR(255),
-                    RutaArchivo NVARCHAR(500),
-                    TamanoArchivo BIGINT,
-                    FechaSubida DATETIME
-                )
-            """)
-        
-        # Resto de la lógica de actualización (misma que antes)
-        habla_lengua_bool = hablaLengua == 1
-        tiene_beca_bool = tieneBeca == 1
-        hijo_trabajador_bool = hijoDeTrabjador.lower() == "true"
-        tiene_alergias_bool = tieneAlergias == 1
-        tiene_discapacidad_bool = tieneDiscapacidad == 1
-        
-        discapacidad_valor = discapacidad if discapacidad and discapacidad.strip() else None
-        nombre_tutor_valor = nombreTutor if nombreTutor and nombreTutor.strip() else None
-        apellido_paterno_tutor_valor = apellidoPaternoTutor if apellidoPaternoTutor and apellidoPaternoTutor.strip() else None
-        apellido_materno_tutor_valor = apellidoMaternoTutor if apellidoMaternoTutor and apellidoMaternoTutor.strip() else None
-        telefono_tutor_valor = telefonoTutor if telefonoTutor and telefonoTutor.strip() else None
-        
-        # ✅ CORRECCIÓN: Convertir fechas desde strings con validación
-        fecha_nacimiento = datetime.strptime(fechaNacimiento, '%Y-%m-%d').date()
-        
-        # Manejar fechaTramite que puede ser None
-        if fechaTramite:
-            fecha_tramite = datetime.strptime(fechaTramite, '%Y-%m-%d').date()
-        else:
-            fecha_tramite = None
-            
-        # Manejar fechaCaptura que puede ser None  
-        if fechaCaptura:
-            fecha_captura = datetime.strptime(fechaCaptura, '%Y-%m-%d')
-        else:
-            fecha_captura = None
-        
-        datos = (
-            id, curp, matricula, nombre, apellidoPaterno, apellidoMaterno,
-            fecha_nacimiento, sexo, telefono, correo, idSede, estadoCivil,
-            idNacionalidad, habla_lengua_bool, idLengua, tiene_beca_bool,
-            queBeca, hijo_trabajador_bool, idCapturo, fecha_tramite,
-            fecha_captura, idRol, tiene_alergias_bool, alergias, tipoSangre,
-            tiene_discapacidad_bool, discapacidad_valor, nombre_tutor_valor,
-            apellido_paterno_tutor_valor, apellido_materno_tutor_valor,
-            telefono_tutor_valor, codigoPostal, calle, entreCalles,
-            numeroExterior, numeroInterior if numeroInterior and numeroInterior.strip() else None,
-            idLocalidad
-        )
+            documentos_info = await subidas.guardar_todos(documentos)
         
-        cursor.execute(
-            "exec dbo.ActualizarAlumno ?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?",
-            *datos
+        result_dict = await ejecutor_bd.ejecutar(
+            registrar, PROCEDIMIENTO_ACTUALIZAR, datos_alumno(alumno), documentos_info
         )
         
-        result = cursor.fetchone()
-        conexion.commit()
+        metadatos_documentos.invalidar_alumno(alumno.id)
+        await run_in_threadpool(cache_alumnos.invalidar_escritura, alumno, result_dict)
         
-        if result:
-            columns = [column[0] for column in cursor.description]
-            result_dict = dict(zip(columns, result))
+        if result_dict:
             return {"data": result_dict, "message": "Alumno actualizado correctamente"}
         
         return {"message": "Alumno actualizado correctamente"}
 
+    except HTTPException:
+        raise
+    except PoolAgotado:
+        # Lo responde el manejador con 503, para que el cliente reintente más tarde
+        await subidas.eliminar(documentos_info)
+        raise
+    except subidas.ArchivoRechazado as e:
+        raise HTTPException(status_code=e.estado, detail=str(e))
     except pyodbc.Error as e:
         print(f"Error de base de datos: {e}")
-        conexion.rollback()
+        metricas.errores_bd.incrementar(operacion="ActualizarAlumno")
+        # Eliminar archivos subidos en caso de error
+        await subidas.eliminar(documentos_info)
         return {"error": f"Error al actualizar el alumno: {e}"}
     except Exception as e:
         print(f"Error general: {e}")
-        conexion.rollback()
+        await subidas.eliminar(documentos_info)
         return {"error": f"Error inesperado: {e}"}
-    finally:
-        cursor.close()
-        conexion.close()
-        
+
+# Importación masiva: un CSV o NDJSON con un alumno por fila y, opcionalmente, un zip con
+# sus PDF. Se procesa en segundo plano; el avance se consulta con el id del trabajo
+@api.post("/alumnos/importar", status_code=202)
+async def importar_alumnos(
+    background_tasks: BackgroundTasks,
+    registros: UploadFile = File(...),
+    documentos: Optional[UploadFile] = File(None),
+    lote: int = Form(importacion.LOTE, ge=1, le=1000),
+):
+    formato = importacion.formato(registros.filename)
+    if formato is None:
+        raise HTTPException(status_code=400, detail="Los registros deben ser un archivo .csv o .ndjson")
+
+    trabajo = importacion.crear_trabajo(lote)
+    try:
+        ruta_registros = await run_in_threadpool(importacion.guardar_archivo, registros.file, trabajo, "registros")
+        ruta_zip = None
+        if documentos is not None and documentos.filename:
+            ruta_zip = await run_in_threadpool(importacion.guardar_archivo, documentos.file, trabajo, "documentos.zip")
+            if not await run_in_threadpool(zipfile.is_zipfile, ruta_zip):
+                raise HTTPException(status_code=400, detail="Los documentos deben enviarse en un archivo .zip")
+    except BaseException as e:
+        await run_in_threadpool(importacion.procesar_fallido, trabajo, e)
+        raise
+
+    background_tasks.add_task(importacion.procesar, trabajo, ruta_registros, formato, ruta_zip)
+    return {**trabajo.resumen(), "url": f"/alumnos/importar/{trabajo.id}"}
+
+# Avance de una importación; desde= devuelve los resultados por fila a partir de esa posición
+@api.get("/alumnos/importar/{trabajo_id}")
+def estado_importacion(trabajo_id: str, desde: int = Query(0, ge=0)):
+    trabajo = importacion.obtener_trabajo(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    return trabajo.resumen(desde)
+
 # Obtener lengua ingresada
 @api.get("/lenguas/{lengua}")
 def obtener_lenguas(lengua: str):
-    cursor = conexion.cursor()
     try:
-        cursor.execute("SELECT * FROM Catalogos.Lenguas WHERE Nombre LIKE ?", f"%{lengua}%")
-        rows = cursor.fetchall()
+        lenguas = catalogos.buscar_lenguas(lengua)
         
-        if not rows:
+        if not lenguas:
             return {"error": "No se encontraron lenguas"}
         
-        columns = [column[0] for column in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+        return lenguas
     except pyodbc.Error as e:
+        metricas.errores_bd.incrementar(operacion="catalogos")
         return {"error": f"Error al consultar las lenguas: {e}"}
        
 # Obtener lengua por id
 @api.get("/lenguas/id/{id_lengua}")
 def obtener_lengua_por_id(id_lengua: int):
-    cursor = conexion.cursor()
     try:
-        cursor.execute("SELECT * FROM Catalogos.Lenguas WHERE Id = ?", id_lengua)
-        row = cursor.fetchone()
+        lengua = catalogos.lengua_por_id(id_lengua)
         
-        if row is None:
+        if lengua is None:
             return {"error": "Lengua no encontrada"}
         
-        columns = [column[0] for column in cursor.description]
-        return dict(zip(columns, row))
+        return lengua
     except pyodbc.Error as e:
+        metricas.errores_bd.incrementar(operacion="catalogos")
         return {"error": f"Error al consultar la lengua: {e}"}
 
-# Obtener localidades
+# Obtener localidades (por nombre de localidad o de municipio)
 @api.get("/localidades/{localidad}")
-def obtener_localidad(localidad: str):
-    cursor = conexion.cursor()
+def obtener_localidad(localidad: str, limite: int = Query(20, ge=1, le=100)):
     try:
-        cursor.execute("SELECT * FROM SIA.Catalogos.Localidades WHERE NombreLocalidad LIKE ?", f"%{localidad}%")
-        rows = cursor.fetchall()
+        localidades = indice_localidades.buscar(localidad, limite)
         
-        if not rows:
+        if not localidades:
             return {"error": "No se encontraron localidades"}
         
-        columns = [column[0] for column in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+        return localidades
     except pyodbc.Error as e:
+        metricas.errores_bd.incrementar(operacion="catalogos")
         return {"error": f"Error al consultar las localidades: {e}"}
 
 # Obtener sangre
 @api.get("/sangre")
 def obtener_sangre():
-    cursor = conexion.cursor()
     try:
-        cursor.execute("SELECT * FROM SIA.Catalogos.TiposSangres")
-        rows = cursor.fetchall()
+        tipos = catalogos.tipos_sangre()
         
-        if not rows:
+        if not tipos:
             return {"error": "No se encontraron tipos de sangre"}
         
-        columns = [column[0] for column in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
+        return tipos
     except pyodbc.Error as e:
-        return {"error": f"Error al consultar los tipos de sangre: {e}"}
\ No newline at end of file
+        metricas.errores_bd.incrementar(operacion="catalogos")
+        return {"error": f"Error al consultar los tipos de sangre: {e}"}
+
+# Estado de los caches de catálogos y de documentos
+@api.get("/admin/cache")
+def estado_cache():
+    estado = catalogos.estadisticas()
+    estado["documentos"] = metadatos_documentos.estadisticas()
+    estado["alumnos"] = cache_alumnos.estadisticas()
+    return estado
+
+# Archivar ahora un lote de documentos antiguos, sin esperar al intervalo del archivador
+@api.post("/admin/archivado")
+async def archivar_ahora(dias: Optional[float] = Query(None, gt=0), limite: int = Query(archivado.LOTE, ge=1)):
+    dias = dias or archivado.DIAS
+    if dias <= 0:
+        raise HTTPException(status_code=400, detail="Indique dias (ARCHIVADO_DIAS no está configurado)")
+    return await ejecutor_bd.ejecutar(archivado.archivar_antiguos, dias, limite)
+
+# Invalidar los caches de catálogos (todos o uno en particular)
+@api.post("/admin/cache/invalidar")
+def invalidar_cache(catalogo: Optional[str] = None):
+    if catalogo is not None and catalogo not in catalogos.NOMBRES:
+        raise HTTPException(status_code=404, detail=f"Catálogo desconocido: {catalogo}")
+    catalogos.invalidar(catalogo)
+    return {"message": "Cache invalidado", "catalogo": catalogo or "todos"}
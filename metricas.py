@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# Métricas en memoria del proceso, expuestas en formato de texto de Prometheus en /metrics.
+# Cada worker de uvicorn tiene las suyas (Prometheus las suma por instancia).
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _etiquetas(nombres, valores, extra=()):
+    pares = list(zip(nombres, valores)) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + "}"
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+_registradas = []
+
+class Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._candado = threading.Lock()
+        _registradas.append(self)
+
+    def _clave(self, valores):
+        return tuple(str(valores.get(etiqueta, "")) for etiqueta in self.etiquetas)
+
+    def muestras(self):
+        raise NotImplementedError
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for nombre, etiquetas, valor in self.muestras():
+            lineas.append(f"{nombre}{etiquetas} {_numero(valor)}")
+        return lineas
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores = {}
+
+    def incrementar(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._candado:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def muestras(self):
+        with self._candado:
+            valores = list(self._valores.items())
+        for clave, valor in valores:
+            yield self.nombre, _etiquetas(self.etiquetas, clave), valor
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+        self._series = {}  # clave -> [cuentas por bucket, suma, cuenta]
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._candado:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * len(self.buckets), 0.0, 0]
+            for posicion, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][posicion] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def muestras(self):
+        with self._candado:
+            series = [(clave, list(cuentas), suma, cuenta) for clave, (cuentas, suma, cuenta) in self._series.items()]
+        for clave, cuentas, suma, cuenta in series:
+            acumulado = 0
+            for limite, cantidad in zip(self.buckets, cuentas):
+                acumulado += cantidad
+                yield f"{self.nombre}_bucket", _etiquetas(self.etiquetas, clave, [("le", _numero(limite))]), acumulado
+            yield f"{self.nombre}_bucket", _etiquetas(self.etiquetas, clave, [("le", "+Inf")]), cuenta
+            yield f"{self.nombre}_sum", _etiquetas(self.etiquetas, clave), suma
+            yield f"{self.nombre}_count", _etiquetas(self.etiquetas, clave), cuenta
+
+# Valores que ya lleva otro componente (pool, ejecutor, caches): se leen al exponer.
+# La función devuelve un número o una lista de (valores de etiquetas, número).
+class Recolector(Metrica):
+    def __init__(self, nombre, ayuda, funcion, etiquetas=(), tipo="gauge"):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+        self.tipo = tipo
+
+    def muestras(self):
+        valores = self.funcion()
+        if not isinstance(valores, list):
+            valores = [((), valores)]
+        for clave, valor in valores:
+            if valor is not None:
+                yield self.nombre, _etiquetas(self.etiquetas, clave), valor
+
+def exponer():
+    lineas = []
+    for metrica in list(_registradas):
+        try:
+            lineas.extend(metrica.exponer())
+        except Exception:
+            log.exception("No se pudo exponer la métrica %s", metrica.nombre)
+    return "\n".join(lineas) + "\n"
+
+peticiones = Histograma(
+    "sea_peticion_segundos", "Duración de las peticiones HTTP (hasta enviar el último byte)",
+    ("metodo", "ruta"),
+)
+respuestas = Contador("sea_peticiones_total", "Peticiones HTTP por ruta y código de estado", ("metodo", "ruta", "estado"))
+etapas = Histograma(
+    "sea_etapa_segundos",
+    "Duración de las etapas internas (adquirir_conexion, procedimiento, consulta, convertir_filas, escribir_archivo, validar_pdf, servir_archivo, restaurar_archivo)",
+    ("etapa", "operacion"),
+)
+errores_bd = Contador("sea_errores_bd_total", "Errores de pyodbc por operación", ("operacion",))
+bytes_subidos = Contador("sea_subidas_bytes_total", "Bytes de documentos recibidos")
+archivos_subidos = Contador("sea_subidas_archivos_total", "Documentos recibidos")
+
+_caches = {}
+
+# Las caches con nombre exponen sus aciertos y fallos
+def registrar_cache(nombre, cache):
+    _caches[nombre] = cache
+
+def _contadores_cache(atributo):
+    return lambda: [((nombre,), getattr(cache, atributo)) for nombre, cache in list(_caches.items())]
+
+Recolector("sea_cache_aciertos_total", "Aciertos de las caches en memoria", _contadores_cache("aciertos"), ("cache",), "counter")
+Recolector("sea_cache_fallos_total", "Fallos de las caches en memoria", _contadores_cache("fallos"), ("cache",), "counter")
+
+# Mide un bloque de código como etapa (el tiempo se registra aunque falle)
+@contextmanager
+def etapa(nombre, operacion=""):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        etapas.observar(time.perf_counter() - inicio, etapa=nombre, operacion=operacion)
+
+# Middleware ASGI: la duración llega hasta el último fragmento del cuerpo, así que incluye
+# el envío de archivos y respuestas en streaming. La ruta es la plantilla ("/alumnos/{matricula}")
+# para no crear una serie por cada valor.
+class MedirPeticiones:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        estado = {"codigo": 500, "registrado": False}
+
+        def registrar():
+            if estado["registrado"]:
+                return
+            estado["registrado"] = True
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            peticiones.observar(time.perf_counter() - inicio, metodo=scope["method"], ruta=ruta)
+            respuestas.incrementar(metodo=scope["method"], ruta=ruta, estado=estado["codigo"])
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+            await send(mensaje)
+            if mensaje["type"] == "http.response.body" and not mensaje.get("more_body", False):
+                registrar()
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            registrar()
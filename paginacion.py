@@ -0,0 +1,127 @@
+import base64
+import heapq
+import json
+import os
+import resultados
+from db import conexion_lectura
+import metricas
+
+# /alumnos sale siempre de ObtenerAlumnos, así que la lista completa, las páginas y la
+# exportación NDJSON tienen las mismas filas y columnas. El procedimiento no puede continuar
+# desde una clave: cada página lo ejecuta, lee su resultado por lotes con fetchmany y se
+# queda con las `limite` filas de menor Id después del cursor (la memoria depende de
+# `limite`, no del número de alumnos).
+PROCEDIMIENTO = "ObtenerAlumnos"
+CLAVE = "Id"
+LOTE = int(os.getenv("ALUMNOS_LOTE", "500"))
+
+# Error en los parámetros de paginación (cursor o campos)
+class ParametroInvalido(ValueError):
+    pass
+
+# ObtenerAlumnos no devolvió lo que se necesita (sin columnas, o sin Id para paginar)
+class ResultadoInesperado(RuntimeError):
+    pass
+
+# El cursor es opaco para el cliente: la clave de la última fila en base64
+def codificar_cursor(valor):
+    texto = json.dumps({"id": str(valor)})
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor):
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(cursor + relleno))["id"]
+    except Exception:
+        raise ParametroInvalido("Cursor de paginación inválido")
+
+# Columnas a devolver de entre las del procedimiento; la clave siempre se incluye porque
+# de ella sale el cursor
+def proyeccion(campos, disponibles):
+    disponibles = {columna.lower(): columna for columna in disponibles}
+    if not campos:
+        return list(disponibles.values())
+
+    seleccion = [disponibles[CLAVE.lower()]] if CLAVE.lower() in disponibles else []
+    for campo in campos.split(","):
+        campo = campo.strip()
+        if not campo:
+            continue
+        columna = disponibles.get(campo.lower())
+        if columna is None:
+            raise ParametroInvalido(f"Campo desconocido: {campo}")
+        if columna not in seleccion:
+            seleccion.append(columna)
+    return seleccion
+
+def _lotes(campos):
+    with conexion_lectura() as conexion:
+        cursor = conexion.cursor()
+        try:
+            with metricas.etapa("procedimiento", PROCEDIMIENTO):
+                cursor.execute(f"exec {PROCEDIMIENTO}")
+            nombres = resultados.columnas(cursor, PROCEDIMIENTO) if cursor.description else ()
+            if not nombres:
+                raise ResultadoInesperado(f"{PROCEDIMIENTO} no devolvió columnas")
+            seleccion = proyeccion(campos, nombres)
+            posiciones = [nombres.index(columna) for columna in seleccion]
+            yield seleccion
+            while True:
+                rows = cursor.fetchmany(LOTE)
+                if not rows:
+                    break
+                yield [tuple(row[posicion] for posicion in posiciones) for row in rows]
+        finally:
+            cursor.close()
+
+# Ejecuta ObtenerAlumnos y devuelve (columnas, lotes de filas). Los errores del procedimiento
+# y de `campos` se lanzan aquí, antes de empezar la respuesta; la conexión vuelve al pool
+# cuando se terminan de leer los lotes (o se cierra el generador).
+def abrir(campos=None):
+    lotes = _lotes(campos)
+    return next(lotes), lotes
+
+# Una página de alumnos y el cursor de la siguiente (None si es la última)
+def pagina(campos=None, despues=None, limite=100):
+    seleccion, lotes = abrir(campos)
+    try:
+        if CLAVE not in seleccion:
+            raise ResultadoInesperado(f"{PROCEDIMIENTO} no devuelve la columna {CLAVE} para paginar")
+        posicion = seleccion.index(CLAVE)
+        desde = str(despues).upper() if despues is not None else None
+        candidatos = 0
+
+        def posteriores():
+            nonlocal candidatos
+            for rows in lotes:
+                for row in rows:
+                    clave = str(row[posicion]).upper()
+                    if desde is None or clave > desde:
+                        candidatos += 1
+                        yield clave, row
+
+        with metricas.etapa("consulta", PROCEDIMIENTO):
+            elegidas = heapq.nsmallest(limite, posteriores(), key=lambda elegida: elegida[0])
+    finally:
+        lotes.close()
+
+    with metricas.etapa("convertir_filas", PROCEDIMIENTO):
+        filas = [dict(zip(seleccion, row)) for _, row in elegidas]
+    siguiente = codificar_cursor(filas[-1][CLAVE]) if candidatos > limite else None
+    return filas, siguiente
+
+# Todas las filas como NDJSON, un objeto por línea
+def flujo(seleccion, lotes):
+    for rows in lotes:
+        yield b"".join(resultados.codificar_linea(dict(zip(seleccion, row))) for row in rows)
+
+# Todas las filas como un arreglo JSON (la respuesta de /alumnos sin paginar), por lotes;
+# primero: el primer lote, ya leído para saber si hay alumnos
+def arreglo(seleccion, primero, lotes):
+    def codificar(rows):
+        return b",".join(resultados.codificar(dict(zip(seleccion, row))) for row in rows)
+
+    yield b"[" + codificar(primero)
+    for rows in lotes:
+        yield b"," + codificar(rows)
+    yield b"]"
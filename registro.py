@@ -0,0 +1,223 @@
+from datetime import date, datetime
+from typing import Annotated, Optional
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import AfterValidator, BaseModel, BeforeValidator, Field, ValidationError
+from db import pool
+import metricas
+
+PROCEDIMIENTO_INSERTAR = "exec InsertarAlumno ?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?"
+PROCEDIMIENTO_ACTUALIZAR = "exec dbo.ActualizarAlumno ?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?"
+
+# "exec dbo.ActualizarAlumno ?,..." -> "ActualizarAlumno" (etiqueta de las métricas)
+def nombre_procedimiento(sql):
+    return sql.split()[1].split(".")[-1]
+
+INSERTAR_DOCUMENTO_TEMPORAL = """
+    INSERT INTO #TempDocumentos (NombreArchivo, RutaArchivo, TamanoArchivo, FechaSubida)
+    VALUES (?, ?, ?, ?)
+"""
+
+# Inserta las filas de #TempDocumentos con fast_executemany: el driver envía todos los
+# parámetros en un arreglo y se hace un solo viaje al servidor en lugar de uno por documento
+def insertar_documentos_temporales(cursor, documentos_info):
+    cursor.fast_executemany = True
+    cursor.executemany(INSERTAR_DOCUMENTO_TEMPORAL, [
+        (
+            documento_info['nombre_archivo'],
+            documento_info['ruta_archivo'],
+            documento_info['tamano_archivo'],
+            documento_info['fecha_subida'],
+        )
+        for documento_info in documentos_info
+    ])
+
+# Trabajo bloqueante de insertar/actualizar (se ejecuta en ejecutor_bd): tabla temporal
+# de documentos, procedimiento almacenado y commit (salvo confirmar=False, para lotes).
+# Devuelve la fila resultante o None.
+def ejecutar_con_documentos(conexion, procedimiento, datos, documentos_info, confirmar=True):
+    cursor = conexion.cursor()
+    try:
+        # La sesión puede venir reutilizada del pool
+        cursor.execute("IF OBJECT_ID('tempdb..#TempDocumentos') IS NOT NULL DROP TABLE #TempDocumentos")
+        cursor.execute("""
+            CREATE TABLE #TempDocumentos (
+                NombreArchivo NVARCHAR(255),
+                RutaArchivo NVARCHAR(500),
+                TamanoArchivo BIGINT,
+                FechaSubida DATETIME
+            )
+        """)
+        
+        # Todos los documentos en un solo envío (si no hay documentos nuevos la tabla queda vacía)
+        if documentos_info:
+            insertar_documentos_temporales(cursor, documentos_info)
+        
+        with metricas.etapa("procedimiento", nombre_procedimiento(procedimiento)):
+            cursor.execute(procedimiento, *datos)
+            result = cursor.fetchone()
+            if confirmar:
+                conexion.commit()
+        
+        if result:
+            with metricas.etapa("convertir_filas", nombre_procedimiento(procedimiento)):
+                columns = [column[0] for column in cursor.description]
+                return dict(zip(columns, result))
+        return None
+    finally:
+        cursor.close()
+
+# Obtiene una conexión del pool solo para la transacción (no mientras se reciben los
+# archivos); lo que no se confirmó se deshace al devolverla
+def registrar(procedimiento, datos, documentos_info):
+    conexion = pool.obtener()
+    try:
+        return ejecutar_con_documentos(conexion, procedimiento, datos, documentos_info)
+    finally:
+        pool.devolver(conexion)
+
+# Conversiones por campo: se hacen al validar, una sola vez, en lugar de en cada ruta
+def _vacio_a_none(valor):
+    if isinstance(valor, str) and not valor.strip():
+        return None
+    return valor
+
+def _texto_booleano(valor):
+    if isinstance(valor, str) and valor.lower() in ("true", "false"):
+        return valor.lower() == "true"
+    if isinstance(valor, bool):
+        return valor
+    raise ValueError("debe ser true o false")
+
+# 0/1 en el formulario, bool para el procedimiento
+Bandera = Annotated[int, Field(ge=0, le=1), AfterValidator(lambda valor: valor == 1)]
+# Texto opcional: una cadena en blanco cuenta como no enviada
+Opcional = Annotated[Optional[str], BeforeValidator(_vacio_a_none)]
+FechaOpcional = Annotated[Optional[date], BeforeValidator(_vacio_a_none)]
+FechaHoraOpcional = Annotated[Optional[datetime], BeforeValidator(_vacio_a_none)]
+
+# Datos de un alumno para InsertarAlumno/ActualizarAlumno, ya convertidos a los tipos del procedimiento
+class Alumno(BaseModel):
+    id: Optional[str] = None
+    curp: str = Field(max_length=18, min_length=18)
+    matricula: Optional[str] = Field(default=None, max_length=15)
+    nombre: str = Field(max_length=80)
+    apellidoPaterno: str = Field(max_length=50)
+    apellidoMaterno: str = Field(max_length=50)
+    fechaNacimiento: date
+    sexo: str = Field(max_length=1, min_length=1, pattern="^[HM]$")
+    telefono: str = Field(max_length=15, min_length=10, pattern=r"^\d+$")
+    correo: str = Field(max_length=80, pattern=r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+    idSede: int = Field(gt=0, lt=5)
+    estadoCivil: str = Field(max_length=20)
+    idNacionalidad: int = Field(gt=0, lt=5)
+    hablaLengua: Bandera
+    idLengua: Optional[int] = Field(default=None, gt=0, lt=68)
+    tieneBeca: Bandera
+    queBeca: Optional[str] = Field(default=None, max_length=50)
+    hijoDeTrabjador: Annotated[bool, BeforeValidator(_texto_booleano)]
+    idCapturo: str
+    fechaTramite: FechaOpcional = None
+    fechaCaptura: FechaHoraOpcional = None
+    idRol: int = 0
+    tieneAlergias: Bandera
+    alergias: Optional[str] = Field(default=None, max_length=20)
+    tipoSangre: str = Field(max_length=3, pattern="^(A|B|AB|O)[+-]$")
+    tieneDiscapacidad: Bandera
+    discapacidad: Opcional = Field(default=None, max_length=200)
+    nombreTutor: Opcional = Field(default=None, max_length=80)
+    apellidoPaternoTutor: Opcional = Field(default=None, max_length=50)
+    apellidoMaternoTutor: Opcional = Field(default=None, max_length=50)
+    telefonoTutor: Opcional = Field(default=None, max_length=15)
+    codigoPostal: str = Field(max_length=10, min_length=5, pattern=r"^\d{5,10}$")
+    calle: str = Field(max_length=100)
+    entreCalles: Optional[str] = Field(default=None, max_length=100)
+    numeroExterior: str = Field(max_length=10, min_length=1, pattern=r"^\d+$")
+    numeroInterior: Opcional = Field(default=None, max_length=10)
+    idLocalidad: str = Field(default="B0572553-592A-4A46-B730-000022504801")
+
+# Modelo para actualizar un alumno
+class ActualizarAlumno(Alumno):
+    id: str
+    idRol: int
+
+# Parámetros de InsertarAlumno/ActualizarAlumno (en orden) a partir de un alumno validado
+def datos_alumno(alumno):
+    return (
+        alumno.id,                      # @IdAlumno
+        alumno.curp,                    # @CURP
+        alumno.matricula,               # @Matricula
+        alumno.nombre,                  # @Nombre
+        alumno.apellidoPaterno,         # @ApellidoPaterno
+        alumno.apellidoMaterno,         # @ApellidoMaterno
+        alumno.fechaNacimiento,         # @FechaNacimiento
+        alumno.sexo,                    # @Sexo
+        alumno.telefono,                # @Telefono
+        alumno.correo,                  # @Correo
+        alumno.idSede,                  # @IdSede
+        alumno.estadoCivil,             # @EstadoCivil
+        alumno.idNacionalidad,          # @IdNacionalidad
+        alumno.hablaLengua,             # @HablaLengua
+        alumno.idLengua,                # @IdLengua
+        alumno.tieneBeca,               # @TieneBeca
+        alumno.queBeca,                 # @QueBeca
+        alumno.hijoDeTrabjador,         # @HijoDeTrabajador
+        alumno.idCapturo,               # @IdCapturo
+        alumno.fechaTramite,            # @FechaTramite
+        alumno.fechaCaptura,            # @FechaCaptura
+        alumno.idRol,                   # @IdRol
+        alumno.tieneAlergias,           # @TieneAlergias
+        alumno.alergias,                # @Alergias
+        alumno.tipoSangre,              # @TipoSangre
+        alumno.tieneDiscapacidad,       # @TieneDiscapacidad
+        alumno.discapacidad,            # @Discapacidad
+        alumno.nombreTutor,             # @NombreTutor
+        alumno.apellidoPaternoTutor,    # @ApellidoPaternoTutor
+        alumno.apellidoMaternoTutor,    # @ApellidoMaternoTutor
+        alumno.telefonoTutor,           # @TelefonoTutor
+        alumno.codigoPostal,            # @CodigoPostal
+        alumno.calle,                   # @Calle
+        alumno.entreCalles,             # @EntreCalles
+        alumno.numeroExterior,          # @NumeroExterior
+        alumno.numeroInterior,          # @NumeroInterior
+        alumno.idLocalidad              # @IdLocalidad
+    )
+
+# Dependencia de FastAPI: valida los campos de texto del formulario multipart con el modelo
+# en un solo paso. Un formulario inválido se rechaza con 422 antes de guardar archivos u
+# obtener una conexión. (Los archivos se declaran aparte en la ruta.) Como con Form(None),
+# un campo vacío cuenta como no enviado: los opcionales quedan en None (NULL en el
+# procedimiento) y los obligatorios responden "Field required".
+def formulario(modelo):
+    async def validar(request: Request):
+        campos = {
+            campo: valor for campo, valor in (await request.form()).items()
+            if isinstance(valor, str) and valor != ""
+        }
+        try:
+            return modelo.model_validate(campos)
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+            )
+    return validar
+
+# Dependencia de FastAPI: los PDF del campo "documentos" del mismo formulario
+def documentos_formulario(requeridos):
+    async def leer(request: Request):
+        documentos = [valor for valor in (await request.form()).getlist("documentos") if not isinstance(valor, str)]
+        if requeridos and not documentos:
+            raise RequestValidationError(
+                [{"type": "missing", "loc": ("body", "documentos"), "msg": "Field required", "input": None}]
+            )
+        return documentos
+    return leer
+
+# Esquema OpenAPI del formulario (campos del modelo + documentos), porque la ruta ya no
+# declara cada campo con Form()
+def esquema_formulario(modelo, documentos_requeridos):
+    esquema = modelo.model_json_schema(mode="validation")
+    esquema["properties"]["documentos"] = {"type": "array", "items": {"type": "string", "format": "binary"}}
+    if documentos_requeridos:
+        esquema.setdefault("required", []).append("documentos")
+    return {"requestBody": {"content": {"multipart/form-data": {"schema": esquema}}, "required": True}}
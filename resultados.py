@@ -0,0 +1,77 @@
+import datetime
+import decimal
+import json
+import threading
+import uuid
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Conversión de filas de pyodbc a JSON sin pasar por jsonable_encoder: las columnas de cada
+# sentencia se calculan una vez y las filas se codifican directamente a bytes (orjson si
+# está instalado). Los valores quedan igual que con jsonable_encoder: fechas en ISO 8601,
+# Decimal como número y uuid como texto.
+
+_columnas = {}
+_candado = threading.Lock()
+
+# Nombres de las columnas del resultado actual, en cache por sentencia
+def columnas(cursor, sentencia):
+    descripcion = cursor.description
+    nombres = _columnas.get(sentencia)
+    if nombres is None or len(nombres) != len(descripcion):
+        nombres = tuple(columna[0] for columna in descripcion)
+        with _candado:
+            _columnas[sentencia] = nombres
+    return nombres
+
+def fila(cursor, sentencia, row):
+    return dict(zip(columnas(cursor, sentencia), row))
+
+def filas(cursor, sentencia, rows):
+    nombres = columnas(cursor, sentencia)
+    return [dict(zip(nombres, row)) for row in rows]
+
+def _decimal(valor):
+    # Igual que pydantic: entero si no tiene parte decimal
+    if valor.as_tuple().exponent >= 0:
+        return int(valor)
+    return float(valor)
+
+def _por_defecto(valor):
+    if isinstance(valor, decimal.Decimal):
+        return _decimal(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode(errors="replace")
+    if isinstance(valor, (set, frozenset)):
+        return list(valor)
+    if isinstance(valor, (datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, uuid.UUID):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable a JSON: {type(valor).__name__}")
+
+if orjson is not None:
+    def codificar(contenido):
+        return orjson.dumps(contenido, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS)
+
+    def codificar_linea(contenido):
+        return orjson.dumps(contenido, default=_por_defecto, option=orjson.OPT_APPEND_NEWLINE)
+else:
+    def codificar(contenido):
+        return json.dumps(contenido, default=_por_defecto, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def codificar_linea(contenido):
+        return codificar(contenido) + b"\n"
+
+# Respuesta JSON que codifica el contenido directamente. Devolverla desde un endpoint
+# evita el recorrido de jsonable_encoder; como response_class por defecto solo cambia
+# el codificador final.
+class RespuestaJSON(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return codificar(content)
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import uuid
+from datetime import datetime
+from almacenamiento import almacen
+import metricas
+import diagnostico
+import validacion_pdf
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+TAMANO_BLOQUE = int(os.getenv("SUBIDA_BLOQUE", str(1024 * 1024)))
+MAX_ARCHIVO = int(os.getenv("SUBIDA_MAX_ARCHIVO", str(20 * 1024 * 1024)))
+MAX_PETICION = int(os.getenv("SUBIDA_MAX_PETICION", str(100 * 1024 * 1024)))
+
+# Archivo rechazado durante la subida; estado es el código HTTP a responder
+class ArchivoRechazado(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+def _eliminar_temporal(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+def _excede(nombre_archivo):
+    return ArchivoRechazado(413, f"El archivo {nombre_archivo} excede el tamaño permitido")
+
+# Copia un archivo abierto a disco por bloques, calculando tamaño y SHA-256 y validando el
+# contenido del PDF (validacion_pdf.py) en el mismo recorrido: cada bloque se revisa antes de
+# escribirlo, así que un archivo que no es PDF se rechaza sin llegar al disco, y uno dañado
+# antes de entrar al almacén y a la base de datos. Se escribe en un archivo temporal que al
+# terminar se entrega al almacén, que lo guarda por contenido (si ya existía un documento
+# idéntico no se duplica). Es bloqueante: desde rutas async se llama con guardar().
+def guardar_flujo(flujo, nombre_archivo, disponible=MAX_PETICION):
+    extension = os.path.splitext(nombre_archivo)[1]
+    temporal = os.path.join(almacen.directorio_temporal(), f"{uuid.uuid4()}.part")
+
+    resumen = hashlib.sha256()
+    validador = validacion_pdf.ValidadorPDF()
+    tamano = 0
+    try:
+        with metricas.etapa("escribir_archivo"), open(temporal, "wb") as archivo:
+            while True:
+                bloque = flujo.read(TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                tamano += len(bloque)
+                if tamano > MAX_ARCHIVO or tamano > disponible:
+                    raise _excede(nombre_archivo)
+                validador.agregar(bloque)
+                resumen.update(bloque)
+                archivo.write(bloque)
+            paginas = validador.terminar()
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        sha256 = resumen.hexdigest()
+        ruta = almacen.guardar(temporal, sha256, extension)
+    except validacion_pdf.PDFInvalido as e:
+        _eliminar_temporal(temporal)
+        raise ArchivoRechazado(400, f"El archivo {nombre_archivo} no es un PDF válido: {e}")
+    except BaseException:
+        _eliminar_temporal(temporal)
+        raise
+
+    metricas.bytes_subidos.incrementar(tamano)
+    metricas.archivos_subidos.incrementar()
+    return {
+        "nombre_archivo": nombre_archivo,
+        "ruta_archivo": ruta,
+        "tamano_archivo": tamano,
+        "paginas": paginas,
+        "sha256": sha256,
+        "fecha_subida": datetime.now(),
+    }
+
+# Guarda un UploadFile sin bloquear el event loop (la copia corre en el threadpool)
+async def guardar(documento, disponible=MAX_PETICION):
+    if documento.size is not None and documento.size > min(MAX_ARCHIVO, disponible):
+        raise _excede(documento.filename)
+
+    await documento.seek(0)
+    return await run_in_threadpool(diagnostico.perfilado(guardar_flujo), documento.file, documento.filename, disponible)
+
+# Guarda todos los documentos de una petición respetando el límite total;
+# si alguno falla se eliminan los que ya se habían guardado
+async def guardar_todos(documentos):
+    guardados = []
+    disponible = MAX_PETICION
+    try:
+        for documento in documentos:
+            info = await guardar(documento, disponible)
+            disponible -= info["tamano_archivo"]
+            guardados.append(info)
+    except BaseException:
+        await eliminar(guardados)
+        raise
+    return guardados
+
+# Deshace las subidas de una petición fallida (quita la referencia en el almacén)
+def liberar(documentos_info):
+    for documento_info in documentos_info:
+        almacen.liberar(documento_info["ruta_archivo"])
+
+async def eliminar(documentos_info):
+    await run_in_threadpool(liberar, documentos_info)
+
+# Rutas con un límite por petición distinto de MAX_PETICION (p. ej. importaciones)
+LIMITES_POR_RUTA = {}
+
+# Middleware: rechaza por Content-Length antes de leer el cuerpo de la petición
+async def limitar_peticion(request, call_next):
+    if request.method in ("POST", "PUT"):
+        limite = LIMITES_POR_RUTA.get(request.url.path, MAX_PETICION)
+        longitud = request.headers.get("content-length")
+        if longitud and longitud.isdigit() and int(longitud) > limite:
+            return JSONResponse(status_code=413, content={"error": "La petición excede el tamaño permitido"})
+    return await call_next(request)
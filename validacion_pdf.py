@@ -0,0 +1,182 @@
+import os
+import re
+import time
+import zlib
+import metricas
+
+# Validación del contenido de los PDF subidos, por bloques a medida que llegan (sin leer el
+# archivo completo en memoria ni otra vez del disco):
+#   firma       "%PDF-x.y" en los primeros 1024 bytes; se revisa con el primer bloque,
+#               antes de escribir nada en disco
+#   estructura  "startxref" con un desplazamiento dentro del archivo y "%%EOF" en los
+#               últimos 1024 bytes
+#   paginas     objetos /Type /Page (también dentro de flujos de objetos /ObjStm
+#               comprimidos con Flate) o, si no aparecen, el /Count del árbol de páginas
+# El tamaño máximo lo aplica subidas.py (SUBIDA_MAX_ARCHIVO).
+MAX_PAGINAS = int(os.getenv("PDF_MAX_PAGINAS", "500"))  # 0: sin límite
+# Tope de lo que se descomprime de los flujos de objetos, contra archivos diseñados para inflarse
+MAX_DESCOMPRIMIDO = int(os.getenv("PDF_MAX_DESCOMPRIMIDO", str(16 * 1024 * 1024)))
+
+CABECERA = 1024
+COLA = 1024
+MARGEN = 64  # bytes que se guardan entre bloques para no cortar una marca a la mitad
+
+FIRMA = re.compile(rb"%PDF-\d\.\d")
+STARTXREF = re.compile(rb"startxref\s+(\d+)\s+%%EOF", re.S)
+MARCAS = re.compile(rb"/Type\s*/(Pages|Page|ObjStm)(?![A-Za-z])|/Count\s+(\d+)|s(?<![A-Za-z]s)tream\r?\n")
+PREFIJOS = (b"/Type", b"/Count", b"stream")
+
+rechazados = metricas.Contador("sea_pdf_rechazados_total", "PDF rechazados por la validación de contenido", ("motivo",))
+
+# Marcas que empiezan antes de limite, en orden. Se ubican con bytes.find (mucho más rápido
+# que recorrer con re los datos binarios de imágenes) y re solo revisa esas posiciones.
+def _marcas(datos, limite):
+    if limite <= 0:
+        return
+    posiciones = []
+    for prefijo in PREFIJOS:
+        posicion = datos.find(prefijo, 0, limite + len(prefijo) - 1)
+        while posicion >= 0:
+            posiciones.append(posicion)
+            posicion = datos.find(prefijo, posicion + 1, limite + len(prefijo) - 1)
+    for posicion in sorted(posiciones):
+        marca = MARCAS.match(datos, posicion)
+        if marca is not None:
+            yield marca
+
+class PDFInvalido(Exception):
+    def __init__(self, motivo, mensaje):
+        super().__init__(mensaje)
+        self.motivo = motivo
+
+# Se alimenta con agregar(bloque) y se cierra con terminar(), que devuelve el número de
+# páginas (None si no se pudo determinar). Cualquiera de los dos lanza PDFInvalido.
+class ValidadorPDF:
+    def __init__(self):
+        self.tamano = 0
+        self.cabecera = b""
+        self.firma = False
+        self.cola = b""
+        self.paginas = 0
+        self.conteo = None  # mayor /Count encontrado
+        self.flujos_objetos = False
+        self._pendiente = b""
+        self._objstm = False  # hubo /Type /ObjStm y falta su "stream"
+        self._inflador = None
+        self._inflado = []
+        self._descomprimido = 0
+        self.tiempos = {"firma": 0.0, "estructura": 0.0, "paginas": 0.0}
+
+    def _observar(self):
+        for revision, segundos in self.tiempos.items():
+            metricas.etapas.observar(segundos, etapa="validar_pdf", operacion=revision)
+
+    def _rechazar(self, motivo, mensaje):
+        self._observar()
+        rechazados.incrementar(motivo=motivo)
+        raise PDFInvalido(motivo, mensaje)
+
+    def _revisar_firma(self, final=False):
+        inicio = time.perf_counter()
+        if FIRMA.search(self.cabecera):
+            self.firma = True
+        elif final or len(self.cabecera) >= CABECERA:
+            self._rechazar("firma", "no tiene la firma %PDF- de un PDF")
+        self.tiempos["firma"] += time.perf_counter() - inicio
+
+    def agregar(self, bloque):
+        self.tamano += len(bloque)
+        if not self.firma:
+            self.cabecera += bloque[:CABECERA - len(self.cabecera)]
+            self._revisar_firma()
+
+        inicio = time.perf_counter()
+        self.cola = (self.cola + bloque[-COLA:])[-COLA:]
+        self.tiempos["estructura"] += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        self._recorrer(self._pendiente + bloque, final=False)
+        self.tiempos["paginas"] += time.perf_counter() - inicio
+
+    def _recorrer(self, datos, final):
+        while datos:
+            if self._inflador is not None:
+                datos = self._inflar(datos)
+                continue
+
+            # Las marcas que empiezan en los últimos MARGEN bytes esperan al siguiente bloque
+            limite = len(datos) if final else len(datos) - MARGEN
+            fin = 0
+            for marca in _marcas(datos, limite):
+                fin = marca.end()
+                tipo, cuenta = marca.group(1), marca.group(2)
+                if tipo == b"Page":
+                    self.paginas += 1
+                elif tipo == b"ObjStm":
+                    self._objstm = True
+                    self.flujos_objetos = True
+                elif cuenta is not None:
+                    self.conteo = max(self.conteo or 0, int(cuenta))
+                elif tipo is None and self._objstm:
+                    # Empieza el contenido comprimido de un flujo de objetos
+                    self._objstm = False
+                    self._inflador = zlib.decompressobj()
+                    self._inflado = []
+                    break
+            if self._inflador is None:
+                self._pendiente = datos[max(fin, limite, 0):]
+                return
+            datos = datos[fin:]
+        self._pendiente = b""
+
+    def _inflar(self, datos):
+        try:
+            salida = self._inflador.decompress(datos, max(MAX_DESCOMPRIMIDO - self._descomprimido, 1))
+        except zlib.error:
+            # Otro filtro o datos dañados: se sigue sin contar lo que hay dentro
+            self._inflador = None
+            return datos
+        self._descomprimido += len(salida)
+        self._inflado.append(salida)
+        if self._descomprimido >= MAX_DESCOMPRIMIDO:
+            self._rechazar("descomprimido", "sus flujos de objetos exceden el tamaño permitido al descomprimirse")
+        if not self._inflador.eof:
+            return b""
+        resto = self._inflador.unused_data
+        self._inflador = None
+        inflado = b"".join(self._inflado)
+        for marca in _marcas(inflado, len(inflado)):
+            if marca.group(1) == b"Page":
+                self.paginas += 1
+            elif marca.group(2) is not None:
+                self.conteo = max(self.conteo or 0, int(marca.group(2)))
+        self._inflado = []
+        return resto
+
+    def terminar(self):
+        if not self.firma:
+            self._revisar_firma(final=True)
+
+        inicio = time.perf_counter()
+        marca = None
+        for marca in STARTXREF.finditer(self.cola):
+            pass
+        # Los lectores aceptan relleno después de %%EOF: basta con que esté en los últimos COLA bytes
+        if marca is None:
+            self._rechazar("estructura", "está incompleto o dañado (falta startxref o %%EOF al final)")
+        if int(marca.group(1)) >= self.tamano:
+            self._rechazar("estructura", "está dañado (startxref apunta fuera del archivo)")
+        self.tiempos["estructura"] += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        self._recorrer(self._pendiente, final=True)
+        paginas = self.paginas or self.conteo
+        self.tiempos["paginas"] += time.perf_counter() - inicio
+
+        if not paginas and not self.flujos_objetos:
+            self._rechazar("paginas", "no tiene páginas")
+        if MAX_PAGINAS and paginas and paginas > MAX_PAGINAS:
+            self._rechazar("paginas", f"tiene {paginas} páginas (máximo {MAX_PAGINAS})")
+        self._observar()
+        # None: flujos de objetos con otro filtro, no se pudieron contar
+        return paginas or None